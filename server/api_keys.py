@@ -0,0 +1,156 @@
+"""
+API Keys - multiple API keys with per-key quotas
+
+Keys are stored hashed (SHA-256) in a JSON file (API_KEYS_FILE) that is
+re-read whenever it changes, so keys can be added or revoked without a
+restart:
+
+{
+  "keys": [
+    {"name": "team-a", "sha256": "<hex digest>", "rate_limit_per_minute": 120, "max_running_scripts": 2},
+    {"name": "ci", "sha256": "<hex digest>"}
+  ]
+}
+
+Omitted limits fall back to the global rate limit and no script quota;
+a limit of 0 allows no requests or no running scripts.
+Create a key and its file entry with:
+  python api_keys.py generate team-a
+"""
+import hashlib
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def hash_key(key: str) -> str:
+    """Hex SHA-256 of a presented API key"""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class ApiKey:
+    """Identity and quotas of one API key"""
+
+    __slots__ = ('name', 'rate_limit_per_minute', 'max_running_scripts')
+
+    def __init__(self, name: str, rate_limit_per_minute: int = None, max_running_scripts: int = None):
+        self.name = name
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.max_running_scripts = max_running_scripts
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'rate_limit_per_minute': self.rate_limit_per_minute,
+            'max_running_scripts': self.max_running_scripts,
+        }
+
+
+class ApiKeyStore:
+    """Hashed key lookup, hot-reloaded from a JSON file"""
+
+    def __init__(self, path: str = None, default_key: str = None, reload_interval: float = 2.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        # The single API_KEY from the environment keeps working as "default"
+        self._default = {hash_key(default_key): ApiKey('default')} if default_key else {}
+        self._keys: Dict[str, ApiKey] = dict(self._default)
+        self._file_state = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    @property
+    def configured(self) -> bool:
+        """True if at least one key exists"""
+        self._maybe_reload()
+        return bool(self._keys)
+
+    def lookup(self, key: str) -> Optional[ApiKey]:
+        """Identity for a presented key, None if unknown"""
+        self._maybe_reload()
+        return self._keys.get(hash_key(key))
+
+    def get(self, name: str) -> Optional[ApiKey]:
+        """Key by name with its current quotas, None if it no longer exists"""
+        self._maybe_reload()
+        return next((k for k in self._keys.values() if k.name == name), None)
+
+    def list_keys(self) -> List[Dict]:
+        self._maybe_reload()
+        return sorted((k.to_dict() for k in self._keys.values()), key=lambda k: k['name'])
+
+    def _maybe_reload(self, force: bool = False):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            try:
+                stat = os.stat(self.path)
+                state = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                state = None
+            if state == self._file_state:
+                return
+            self._file_state = state
+            if state is None:
+                if len(self._keys) != len(self._default):
+                    logger.warning(f"API key file {self.path} removed, only the default key remains")
+                self._keys = dict(self._default)
+                return
+            try:
+                self._keys = {**self._default, **self._load()}
+                logger.info(f"Loaded {len(self._keys)} API key(s) from {self.path}")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Keep serving the previous keys rather than locking everyone out
+                logger.error(f"Invalid API key file {self.path}, keeping previous keys: {e}")
+
+    def _load(self) -> Dict[str, ApiKey]:
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        keys = {}
+        for entry in data.get('keys', []):
+            digest = entry['sha256'].lower()
+            if len(digest) != 64:
+                raise ValueError(f"sha256 of key {entry['name']!r} is not a hex SHA-256 digest")
+            keys[digest] = ApiKey(
+                str(entry['name']),
+                rate_limit_per_minute=_optional_int(entry, 'rate_limit_per_minute'),
+                max_running_scripts=_optional_int(entry, 'max_running_scripts'),
+            )
+        return keys
+
+
+def _optional_int(entry: Dict, field: str) -> Optional[int]:
+    """The field as int, None if omitted (0 is a limit of zero, not unlimited)"""
+    return int(entry[field]) if entry.get(field) is not None else None
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ('generate', 'hash'):
+        print("Usage: python api_keys.py generate <name> | hash <key>")
+        sys.exit(1)
+    if sys.argv[1] == 'hash':
+        print(hash_key(sys.argv[2]))
+        return
+    key = secrets.token_hex(32)
+    print(f"API key (give this to the client): {key}")
+    print("Entry for the API key file:")
+    print(json.dumps({'name': sys.argv[2], 'sha256': hash_key(key)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 from automation_manager import AutomationManager
-from script_manager import ScriptManager
+from script_manager import ScriptManager, QuotaExceededError
+from forkserver import ForkServer
+from script_directives import ResourceLimits
+from script_cache import ScriptResultCache
 from docker_manager import DockerManager
+from profiler import SamplingProfiler
+from socketio_queue import create_client_manager
+from cluster import AutomationCoordinator
+from scheduler import HeapScheduler
+from events import CONTAINER_DIED, EVENT_TYPES, bus
+from hooks import HookRegistry
+from rules import RuleEngine
+from automations.base import AutomationAlreadyRunningError
+from automations.process_pool import ProcessPoolFullError, configure_process_pool
+from automations.notifications import EmailChannel, PushChannel, dispatcher
+from automations.logs import log_sink
+from automations.news_items import seen_items
+from automations.scheduling import request_budget
+from automations.snapshots import snapshot_store
+from automations.ticket_providers import query_cache
+from api_keys import ApiKeyStore
+from audit import audit_trail
 from config import (
-    Config, require_api_key, rate_limit, audit_log,
+    Config, RouteGuard, public, audit_log,
     validate_input, sanitize_string
 )
 import logging
+import os
+import time
+import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -26,29 +49,155 @@ app.config['SECRET_KEY'] = Config.SECRET_KEY
 cors_origins = Config.CORS_ORIGINS if Config.CORS_ORIGINS != ['*'] else "*"
 CORS(app, origins=cors_origins, supports_credentials=True)
 
-# Initialize SocketIO with restricted origins
+# Initialize SocketIO with restricted origins. With a message queue configured,
+# emits are shared with every server process so all clients get every update.
+socketio_options = {}
+client_manager = create_client_manager(Config.SOCKETIO_MESSAGE_QUEUE, channel=Config.SOCKETIO_CHANNEL)
+if client_manager is not None:
+    socketio_options['client_manager'] = client_manager
+elif Config.SOCKETIO_MESSAGE_QUEUE:
+    socketio_options['message_queue'] = Config.SOCKETIO_MESSAGE_QUEUE
+    socketio_options['channel'] = Config.SOCKETIO_CHANNEL
+
 socketio = SocketIO(
     app,
-    cors_allowed_origins=cors_origins if cors_origins != "*" else "*"
+    cors_allowed_origins=cors_origins if cors_origins != "*" else "*",
+    **socketio_options
+)
+
+# Automation logs are kept in memory and appended to DATA_DIR/automation-logs
+log_sink.configure(os.path.join(Config.DATA_DIR, 'automation-logs'), buffer_size=Config.AUTOMATION_LOG_BUFFER)
+seen_items.configure(os.path.join(Config.DATA_DIR, 'news-seen'))
+snapshot_store.configure(
+    os.path.join(Config.DATA_DIR, 'snapshots'),
+    max_versions=Config.SNAPSHOT_MAX_VERSIONS,
+    max_age_days=Config.SNAPSHOT_MAX_AGE_DAYS
+)
+audit_trail.configure(
+    os.path.join(Config.DATA_DIR, 'audit', 'audit.jsonl'),
+    max_bytes=Config.AUDIT_LOG_MAX_BYTES,
+    backup_count=Config.AUDIT_LOG_BACKUPS
+)
+configure_process_pool(Config.AUTOMATION_PROCESS_POOL_SIZE)
+request_budget.configure(Config.MONITOR_MAX_RPS, Config.MONITOR_BURST)
+query_cache.configure(Config.TICKET_CACHE_TTL)
+dispatcher.configure(
+    [
+        EmailChannel(
+            host=Config.NOTIFY_SMTP_HOST,
+            port=Config.NOTIFY_SMTP_PORT,
+            username=Config.NOTIFY_SMTP_USER,
+            password=Config.NOTIFY_SMTP_PASSWORD,
+            use_tls=Config.NOTIFY_SMTP_TLS,
+            sender=Config.NOTIFY_EMAIL_FROM,
+            recipients=Config.NOTIFY_EMAIL_TO
+        ),
+        PushChannel(url=Config.NOTIFY_PUSH_URL, token=Config.NOTIFY_PUSH_TOKEN),
+    ],
+    queue_size=Config.NOTIFY_QUEUE_SIZE,
+    batch_window=Config.NOTIFY_BATCH_WINDOW,
+    dedup_window=Config.NOTIFY_DEDUP_WINDOW,
+    max_retries=Config.NOTIFY_MAX_RETRIES
 )
 
 # Initialize Managers
-manager = AutomationManager()
-script_manager = ScriptManager()
+coordinator = None
+if Config.CLUSTER_MODE == 'coordinator':
+    coordinator = AutomationCoordinator(
+        lease_ttl=Config.CLUSTER_LEASE_TTL,
+        heartbeat_interval=Config.CLUSTER_HEARTBEAT_INTERVAL
+    )
+# One timer thread serves every schedule
+scheduler = HeapScheduler()
+manager = AutomationManager(coordinator=coordinator, scheduler=scheduler)
+forkserver = None
+if Config.SCRIPT_FORKSERVER:
+    if ForkServer.supported():
+        forkserver = ForkServer(preload=Config.SCRIPT_FORKSERVER_PRELOAD)
+    else:
+        logger.warning("SCRIPT_FORKSERVER needs fork() and Unix sockets, running scripts without it")
+script_manager = ScriptManager(
+    scheduler=scheduler,
+    schedules_path=os.path.join(Config.DATA_DIR, 'script_schedules.json'),
+    forkserver=forkserver,
+    limits=ResourceLimits.parse(Config.SCRIPT_LIMITS),
+    cache=ScriptResultCache(os.path.join(Config.DATA_DIR, 'script-cache'), max_bytes=Config.SCRIPT_CACHE_MAX_BYTES)
+)
 docker_manager = DockerManager()
+# Shared by the route guard and by hooks/rules, which look up their owner's current quota
+api_key_store = ApiKeyStore(Config.API_KEYS_FILE, default_key=Config.API_KEY)
+hooks = HookRegistry(
+    os.path.join(Config.DATA_DIR, 'hooks.json'), manager, script_manager,
+    bus=bus,
+    payload_dir=os.path.join(Config.DATA_DIR, 'hook-payloads'),
+    queue_size=Config.HOOK_QUEUE_SIZE,
+    key_store=api_key_store
+)
+rules = RuleEngine(
+    os.path.join(Config.DATA_DIR, 'rules.json'), manager, script_manager, docker_manager,
+    bus=bus, notifier=dispatcher, queue_size=Config.RULE_QUEUE_SIZE, key_store=api_key_store
+)
+if docker_manager.is_docker_available():
+    docker_manager.watch_container_deaths(
+        lambda payload: bus.publish(CONTAINER_DIED, payload, source='docker')
+    )
+profiler = SamplingProfiler(
+    sample_rate=Config.PROFILE_SAMPLE_RATE,
+    interval_ms=Config.PROFILE_INTERVAL_MS,
+    allow_header=Config.PROFILE_ALLOW_HEADER
+)
+
+# Metrics
+REQUEST_DURATION = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route',
+    ('route', 'method', 'status')
+)
+SOCKETIO_CLIENTS = metrics.gauge('socketio_connected_clients', 'Connected Socket.IO clients')
+SOCKETIO_EMITS = metrics.counter('socketio_emits_total', 'Socket.IO events emitted', ('event',))
+metrics.gauge_function(
+    'scripts_running', 'Scripts currently running',
+    lambda: len(script_manager.get_running_scripts())
+)
+metrics.register_collector(manager.render_metrics)
+
+
+@app.before_request
+def start_request_timer():
+    """Remember when the request started for latency metrics"""
+    g.request_started = time.perf_counter()
+
+
+@app.before_request
+def start_request_profiling():
+    """Sample this request's stacks if selected for profiling"""
+    if profiler.should_profile(request.headers.get('X-Profile')):
+        profiler.begin(request.endpoint or 'unmatched')
+        g.profiling = True
+
+
+@app.teardown_request
+def stop_request_profiling(exc):
+    """Stop sampling the request thread"""
+    if g.get('profiling'):
+        profiler.end()
 
 
 @app.after_request
-def add_security_headers(response):
-    """Add security headers to all responses"""
-    for header, value in Config.SECURITY_HEADERS.items():
-        response.headers[header] = value
+def record_request_metrics(response):
+    """Record request latency per route"""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_DURATION.observe(
+            time.perf_counter() - started, route, request.method, response.status_code
+        )
     return response
 
 
 def broadcast_status_update(status):
     """Broadcast status update via WebSocket"""
-    socketio.emit('status_update', status, broadcast=True)
+    SOCKETIO_EMITS.inc('status_update')
+    socketio.emit('status_update', status)
 
 
 # Set status callback
@@ -58,8 +207,6 @@ manager.set_status_callback(broadcast_status_update)
 # REST API Endpoints
 
 @app.route('/api/automations/types', methods=['GET'])
-@rate_limit
-@require_api_key
 def get_automation_types():
     """Get available automation types"""
     try:
@@ -71,8 +218,6 @@ def get_automation_types():
 
 
 @app.route('/api/automations', methods=['GET'])
-@rate_limit
-@require_api_key
 def list_automations():
     """List all automation instances"""
     try:
@@ -84,8 +229,6 @@ def list_automations():
 
 
 @app.route('/api/automations', methods=['POST'])
-@rate_limit
-@require_api_key
 def create_automation():
     """Create a new automation instance"""
     try:
@@ -109,8 +252,6 @@ def create_automation():
 
 
 @app.route('/api/automations/<automation_id>', methods=['GET'])
-@rate_limit
-@require_api_key
 def get_automation_status(automation_id):
     """Get automation status"""
     try:
@@ -126,9 +267,25 @@ def get_automation_status(automation_id):
         return jsonify({"success": False, "error": "Internal server error"}), 500
 
 
+@app.route('/api/automations/<automation_id>/logs', methods=['GET'])
+def get_automation_logs(automation_id):
+    """Get automation log records after the ?since= cursor"""
+    try:
+        if not validate_input(automation_id, 'uuid'):
+            return jsonify({"success": False, "error": "Invalid automation ID format"}), 400
+
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', 200, type=int), 1000)
+        logs = manager.get_logs(automation_id, since, limit)
+        return jsonify({"success": True, "data": logs})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error getting automation logs: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
 @app.route('/api/automations/<automation_id>/start', methods=['POST'])
-@rate_limit
-@require_api_key
 def start_automation(automation_id):
     """Start an automation"""
     try:
@@ -141,6 +298,10 @@ def start_automation(automation_id):
         audit_log("START_AUTOMATION", f"id={automation_id}")
         status = manager.start_automation(automation_id, config)
         return jsonify({"success": True, "data": status})
+    except AutomationAlreadyRunningError as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+    except ProcessPoolFullError as e:
+        return jsonify({"success": False, "error": str(e)}), 503
     except ValueError as e:
         return jsonify({"success": False, "error": str(e)}), 404
     except Exception as e:
@@ -149,8 +310,6 @@ def start_automation(automation_id):
 
 
 @app.route('/api/automations/<automation_id>/stop', methods=['POST'])
-@rate_limit
-@require_api_key
 def stop_automation(automation_id):
     """Stop an automation"""
     try:
@@ -167,9 +326,55 @@ def stop_automation(automation_id):
         return jsonify({"success": False, "error": "Internal server error"}), 500
 
 
+@app.route('/api/automations/<automation_id>/schedule', methods=['POST'])
+def schedule_automation(automation_id):
+    """Run an automation on a cron or one-shot schedule"""
+    try:
+        if not validate_input(automation_id, 'uuid'):
+            return jsonify({"success": False, "error": "Invalid automation ID format"}), 400
+
+        data = request.json or {}
+        spec = {
+            'cron': sanitize_string(data.get('cron') or '', 100) or None,
+            'at': sanitize_string(data.get('at') or '', 40) or None,
+            'duration': data.get('duration'),
+        }
+        if 'config' in data:
+            spec['config'] = data['config']
+
+        try:
+            manager.get_automation(automation_id)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 404
+
+        audit_log("SCHEDULE_AUTOMATION", f"id={automation_id} cron={spec['cron']} at={spec['at']}")
+        status = manager.schedule_automation(automation_id, spec)
+        return jsonify({"success": True, "data": status})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error scheduling automation: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/automations/<automation_id>/schedule', methods=['DELETE'])
+def unschedule_automation(automation_id):
+    """Remove an automation's schedule"""
+    try:
+        if not validate_input(automation_id, 'uuid'):
+            return jsonify({"success": False, "error": "Invalid automation ID format"}), 400
+
+        audit_log("UNSCHEDULE_AUTOMATION", f"id={automation_id}")
+        status = manager.unschedule_automation(automation_id)
+        return jsonify({"success": True, "data": status})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error unscheduling automation: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
 @app.route('/api/automations/<automation_id>', methods=['DELETE'])
-@rate_limit
-@require_api_key
 def delete_automation(automation_id):
     """Delete an automation"""
     try:
@@ -188,8 +393,6 @@ def delete_automation(automation_id):
 # ============== SCRIPTS API ==============
 
 @app.route('/api/scripts', methods=['GET'])
-@rate_limit
-@require_api_key
 def list_scripts():
     """List all available scripts in scripts/ directory"""
     try:
@@ -201,17 +404,27 @@ def list_scripts():
 
 
 @app.route('/api/scripts/<filename>/run', methods=['POST'])
-@rate_limit
-@require_api_key
 def run_script(filename):
     """Run a script by filename"""
     try:
         if not validate_input(filename, 'filename'):
             return jsonify({"success": False, "error": "Invalid filename format"}), 400
 
-        audit_log("RUN_SCRIPT", f"filename={filename}")
-        result = script_manager.run_script(filename)
+        # Body is optional: {"args": [...], "env": {...}, "cache": false}
+        data = request.get_json(silent=True) or {}
+        audit_log("RUN_SCRIPT", f"filename={filename} args={len(data.get('args') or [])}")
+        api_key = g.get('api_key')
+        result = script_manager.run_script(
+            filename,
+            owner=api_key.name if api_key else None,
+            max_running=api_key.max_running_scripts if api_key else None,
+            args=data.get('args'),
+            env=data.get('env'),
+            use_cache=data.get('cache', True) is not False
+        )
         return jsonify({"success": True, "data": result})
+    except QuotaExceededError as e:
+        return jsonify({"success": False, "error": str(e)}), 429
     except FileNotFoundError as e:
         return jsonify({"success": False, "error": str(e)}), 404
     except ValueError as e:
@@ -221,9 +434,83 @@ def run_script(filename):
         return jsonify({"success": False, "error": "Internal server error"}), 500
 
 
+@app.route('/api/scripts/<filename>/batch', methods=['POST'])
+def run_script_batch(filename):
+    """Run a script once per parameter set on a bounded pool"""
+    try:
+        if not validate_input(filename, 'filename'):
+            return jsonify({"success": False, "error": "Invalid filename format"}), 400
+
+        data = request.json or {}
+        params = data.get('params')
+        audit_log("RUN_SCRIPT_BATCH", f"filename={filename} runs={len(params) if isinstance(params, list) else 0}")
+        api_key = g.get('api_key')
+        batch = script_manager.run_batch(
+            filename, params,
+            concurrency=data.get('concurrency', 4),
+            owner=api_key.name if api_key else None,
+            max_running=api_key.max_running_scripts if api_key else None
+        )
+        return jsonify({"success": True, "data": batch})
+    except QuotaExceededError as e:
+        return jsonify({"success": False, "error": str(e)}), 429
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error running script batch: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/scripts/batches/<batch_id>', methods=['GET'])
+def get_script_batch(batch_id):
+    """Get progress and results of a batch"""
+    try:
+        if not validate_input(batch_id, 'uuid'):
+            return jsonify({"success": False, "error": "Invalid batch ID format"}), 400
+
+        batch = script_manager.get_batch(batch_id)
+        return jsonify({"success": True, "data": batch})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error getting script batch: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/scripts/batches/<batch_id>/stop', methods=['POST'])
+def stop_script_batch(batch_id):
+    """Cancel pending runs of a batch and stop running ones"""
+    try:
+        if not validate_input(batch_id, 'uuid'):
+            return jsonify({"success": False, "error": "Invalid batch ID format"}), 400
+
+        audit_log("STOP_SCRIPT_BATCH", f"batch_id={batch_id}")
+        batch = script_manager.stop_batch(batch_id)
+        return jsonify({"success": True, "data": batch})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error stopping script batch: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/scripts/cache', methods=['GET'])
+def get_script_cache():
+    """Size and hit rate of the script result cache"""
+    return jsonify({"success": True, "data": script_manager.cache.stats()})
+
+
+@app.route('/api/scripts/cache', methods=['DELETE'])
+def clear_script_cache():
+    """Drop all cached script results"""
+    audit_log("CLEAR_SCRIPT_CACHE")
+    script_manager.cache.clear()
+    return jsonify({"success": True})
+
+
 @app.route('/api/scripts/running', methods=['GET'])
-@rate_limit
-@require_api_key
 def get_running_scripts():
     """Get all currently running scripts"""
     try:
@@ -235,8 +522,6 @@ def get_running_scripts():
 
 
 @app.route('/api/scripts/status/<run_id>', methods=['GET'])
-@rate_limit
-@require_api_key
 def get_script_status(run_id):
     """Get status of a script execution"""
     try:
@@ -253,8 +538,6 @@ def get_script_status(run_id):
 
 
 @app.route('/api/scripts/stop/<run_id>', methods=['POST'])
-@rate_limit
-@require_api_key
 def stop_script(run_id):
     """Stop a running script"""
     try:
@@ -271,11 +554,242 @@ def stop_script(run_id):
         return jsonify({"success": False, "error": "Internal server error"}), 500
 
 
+@app.route('/api/scripts/schedules', methods=['GET'])
+def list_script_schedules():
+    """List script schedules"""
+    try:
+        schedules = script_manager.list_schedules()
+        return jsonify({"success": True, "data": schedules})
+    except Exception as e:
+        logger.error(f"Error listing script schedules: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/scripts/<filename>/schedules', methods=['POST'])
+def add_script_schedule(filename):
+    """Run a script on a cron schedule"""
+    try:
+        if not validate_input(filename, 'filename'):
+            return jsonify({"success": False, "error": "Invalid filename format"}), 400
+
+        data = request.json or {}
+        cron = sanitize_string(data.get('cron') or '', 100)
+        overlap = sanitize_string(data.get('overlap') or 'skip', 10)
+        api_key = g.get('api_key')
+
+        audit_log("SCHEDULE_SCRIPT", f"filename={filename} cron={cron} overlap={overlap}")
+        schedule = script_manager.add_schedule(
+            filename, cron,
+            overlap=overlap,
+            catch_up=bool(data.get('catch_up', False)),
+            owner=api_key.name if api_key else None,
+            max_running=api_key.max_running_scripts if api_key else None
+        )
+        return jsonify({"success": True, "data": schedule}), 201
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error scheduling script: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/scripts/schedules/<schedule_id>', methods=['DELETE'])
+def delete_script_schedule(schedule_id):
+    """Delete a script schedule"""
+    try:
+        if not validate_input(schedule_id, 'uuid'):
+            return jsonify({"success": False, "error": "Invalid schedule ID format"}), 400
+
+        audit_log("UNSCHEDULE_SCRIPT", f"schedule_id={schedule_id}")
+        script_manager.remove_schedule(schedule_id)
+        return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error deleting script schedule: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+# ============== HOOKS API ==============
+
+@app.route('/api/hooks/<name>', methods=['POST'])
+@public
+def receive_hook(name):
+    """Webhook from an upstream system, authenticated by the hook's own token"""
+    g.client_ip = route_guard.client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'))
+    token = request.headers.get('X-Hook-Token')
+    authorization = request.headers.get('Authorization', '')
+    if not token and authorization.startswith('Bearer '):
+        token = authorization[7:]
+    if not hooks.authenticate(name, token):
+        # Failed attempts count against the client IP, like invalid API keys
+        if route_guard.rate_limit_enabled and not route_guard.limiter.is_allowed(g.client_ip):
+            return jsonify({"success": False, "error": "Rate limit exceeded"}), 429
+        security_logger.warning(f"Invalid hook token for {name[:64]!r} from {g.client_ip}")
+        return jsonify({"success": False, "error": "Invalid hook or token"}), 401
+    if (request.content_length or 0) > Config.HOOK_MAX_PAYLOAD_BYTES:
+        return jsonify({"success": False, "error": "Payload too large"}), 413
+
+    body = request.get_json(silent=True)
+    if body is None:
+        data = request.get_data(cache=False)
+        if len(data) > Config.HOOK_MAX_PAYLOAD_BYTES:
+            return jsonify({"success": False, "error": "Payload too large"}), 413
+        body = request.form.to_dict() if request.form else {'raw': data.decode('utf-8', errors='replace')}
+
+    audit_log("RECEIVE_HOOK", f"name={name}")
+    try:
+        result = hooks.receive(name, body)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    if result['dropped']:
+        response = jsonify({"success": False, "error": "Hook queue is full, retry later"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return jsonify({"success": True, "data": {"event": result['event']}}), 202
+
+
+@app.route('/api/hooks', methods=['GET'])
+def list_hooks():
+    """List webhook definitions and their delivery counters"""
+    return jsonify({"success": True, "data": hooks.list_hooks()})
+
+
+@app.route('/api/hooks/<name>', methods=['PUT'])
+def define_hook(name):
+    """Create or replace a webhook; the token is only returned when issued"""
+    try:
+        data = request.json or {}
+        target = data.get('automation') or data.get('script')
+        audit_log("DEFINE_HOOK", f"name={sanitize_string(name, 64)} target={target}")
+        api_key = g.get('api_key')
+        hook, token = hooks.define(name, data, owner=api_key.name if api_key else None)
+        if token:
+            hook = {**hook, 'token': token}
+        return jsonify({"success": True, "data": hook})
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error defining hook: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/hooks/<name>', methods=['DELETE'])
+def delete_hook(name):
+    """Delete a webhook"""
+    try:
+        audit_log("DELETE_HOOK", f"name={sanitize_string(name, 64)}")
+        hooks.remove(name)
+        return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+
+
+@app.route('/api/events', methods=['GET'])
+def get_event_stats():
+    """Event types, and bus subscribers with their queue depth and drop counts"""
+    return jsonify({"success": True, "data": {
+        **bus.stats(),
+        'types': {event_type: list(fields) for event_type, fields in EVENT_TYPES.items()},
+    }})
+
+
+# ============== RULES API ==============
+
+@app.route('/api/rules', methods=['GET'])
+def list_rules():
+    """List event rules with their fire counts"""
+    return jsonify({"success": True, "data": rules.list_rules()})
+
+
+@app.route('/api/rules/<name>', methods=['PUT'])
+def define_rule(name):
+    """Create or replace a rule connecting an event to an action"""
+    try:
+        data = request.json or {}
+        audit_log("DEFINE_RULE", f"name={sanitize_string(name, 64)} on={sanitize_string(str(data.get('on')), 128)}")
+        api_key = g.get('api_key')
+        rule = rules.define(name, data, owner=api_key.name if api_key else None)
+        return jsonify({"success": True, "data": rule})
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error defining rule: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/rules/<name>', methods=['DELETE'])
+def delete_rule(name):
+    """Delete a rule"""
+    try:
+        audit_log("DELETE_RULE", f"name={sanitize_string(name, 64)}")
+        rules.remove(name)
+        return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+
+
+# ============== SNAPSHOTS API ==============
+
+@app.route('/api/snapshots', methods=['GET'])
+def list_snapshot_pages():
+    """Monitored pages with a version history"""
+    return jsonify({"success": True, "data": snapshot_store.list_pages()})
+
+
+@app.route('/api/snapshots/<key>', methods=['GET'])
+def list_snapshots(key):
+    """Stored versions of one page"""
+    try:
+        return jsonify({"success": True, "data": snapshot_store.list_versions(key)})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+
+
+@app.route('/api/snapshots/<key>/<int:version_id>', methods=['GET'])
+def get_snapshot(key, version_id):
+    """Content of one page version, always served as plain text"""
+    try:
+        content = snapshot_store.get(key, version_id)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error reading snapshot: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+    # Never render stored pages as HTML from this origin
+    response = Response(content, mimetype='text/plain')
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Disposition'] = f'inline; filename="{key}-{version_id}.txt"'
+    return response
+
+
+@app.route('/api/snapshots/<key>/diff', methods=['GET'])
+def diff_snapshots(key):
+    """Unified diff between two versions: ?from=<id>&to=<id>"""
+    from_id = request.args.get('from', type=int)
+    to_id = request.args.get('to', type=int)
+    if from_id is None or to_id is None:
+        return jsonify({"success": False, "error": "'from' and 'to' version IDs are required"}), 400
+    context = min(max(request.args.get('context', 3, type=int), 0), 20)
+    try:
+        diff = snapshot_store.diff(key, from_id, to_id, context)
+        return jsonify({"success": True, "data": {"from": from_id, "to": to_id, "diff": diff}})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error diffing snapshots: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
 # ============== DOCKER API ==============
 
 @app.route('/api/docker/status', methods=['GET'])
-@rate_limit
-@require_api_key
 def docker_status():
     """Check if Docker is available"""
     try:
@@ -286,8 +800,6 @@ def docker_status():
 
 
 @app.route('/api/docker/containers', methods=['GET'])
-@rate_limit
-@require_api_key
 def list_containers():
     """List all Docker containers"""
     try:
@@ -300,8 +812,6 @@ def list_containers():
 
 
 @app.route('/api/docker/containers/<container_id>/start', methods=['POST'])
-@rate_limit
-@require_api_key
 def start_container(container_id):
     """Start a Docker container"""
     try:
@@ -317,8 +827,6 @@ def start_container(container_id):
 
 
 @app.route('/api/docker/containers/<container_id>/stop', methods=['POST'])
-@rate_limit
-@require_api_key
 def stop_container(container_id):
     """Stop a Docker container"""
     try:
@@ -334,8 +842,6 @@ def stop_container(container_id):
 
 
 @app.route('/api/docker/containers/<container_id>/restart', methods=['POST'])
-@rate_limit
-@require_api_key
 def restart_container(container_id):
     """Restart a Docker container"""
     try:
@@ -351,8 +857,6 @@ def restart_container(container_id):
 
 
 @app.route('/api/docker/containers/<container_id>/logs', methods=['GET'])
-@rate_limit
-@require_api_key
 def get_container_logs(container_id):
     """Get container logs"""
     try:
@@ -372,12 +876,113 @@ def get_container_logs(container_id):
         return jsonify({"success": False, "error": "Internal server error"}), 500
 
 
+# ============== CLUSTER API ==============
+
+@app.route('/api/cluster/heartbeat', methods=['POST'])
+def cluster_heartbeat():
+    """Worker heartbeat: renews leases, returns assignments and revocations"""
+    if coordinator is None:
+        return jsonify({"success": False, "error": "Cluster mode is not enabled"}), 404
+    try:
+        data = request.json or {}
+        worker_id = sanitize_string(data.get('worker_id', ''), max_length=128)
+        running = data.get('running', {})
+        if not worker_id or not isinstance(running, dict):
+            return jsonify({"success": False, "error": "Invalid heartbeat"}), 400
+
+        plan = coordinator.heartbeat(
+            worker_id,
+            capacity=int(data.get('capacity', 0)),
+            running=running,
+            host=sanitize_string(data.get('host', ''), max_length=255)
+        )
+        return jsonify({"success": True, "data": plan})
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "Invalid heartbeat"}), 400
+    except Exception as e:
+        logger.error(f"Error handling heartbeat: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/cluster/workers', methods=['GET'])
+def list_cluster_workers():
+    """List worker nodes and their load"""
+    if coordinator is None:
+        return jsonify({"success": True, "data": []})
+    return jsonify({"success": True, "data": coordinator.list_workers()})
+
+
+# ============== ADMIN API ==============
+
+@app.route('/api/audit', methods=['GET'])
+def query_audit_log():
+    """Query audit events, newest first"""
+    try:
+        action = request.args.get('action')
+        if action is not None and not validate_input(action, 'audit_action', max_length=64):
+            return jsonify({"success": False, "error": "Invalid action"}), 400
+
+        events = audit_trail.query(
+            action=action,
+            ip=sanitize_string(request.args.get('ip', ''), 64) or None,
+            since=request.args.get('since', type=float),
+            limit=min(request.args.get('limit', 100, type=int), 1000)
+        )
+        return jsonify({"success": True, "data": events})
+    except Exception as e:
+        logger.error(f"Error querying audit log: {e}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+
+@app.route('/api/admin/profile', methods=['GET'])
+def get_profile_status():
+    """Get profiler settings and per-endpoint sample counts"""
+    return jsonify({"success": True, "data": profiler.get_status()})
+
+
+@app.route('/api/admin/profile', methods=['POST'])
+def configure_profiler():
+    """Change profiler settings at runtime"""
+    try:
+        data = request.json or {}
+        allow_header = data.get('allow_header')
+        if allow_header is not None and not isinstance(allow_header, bool):
+            return jsonify({"success": False, "error": "allow_header must be a boolean"}), 400
+
+        audit_log("CONFIGURE_PROFILER", f"settings={data}")
+        profiler.configure(
+            sample_rate=data.get('sample_rate'),
+            interval_ms=data.get('interval_ms'),
+            allow_header=allow_header
+        )
+        return jsonify({"success": True, "data": profiler.get_status()})
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "Invalid profiler settings"}), 400
+
+
+@app.route('/api/admin/profile', methods=['DELETE'])
+def reset_profiler():
+    """Drop collected profiling samples"""
+    audit_log("RESET_PROFILER")
+    profiler.reset()
+    return jsonify({"success": True})
+
+
+@app.route('/api/admin/profile/collapsed', methods=['GET'])
+def get_collapsed_stacks():
+    """Collapsed stacks for flamegraph.pl / speedscope, optionally for one endpoint"""
+    endpoint = sanitize_string(request.args.get('endpoint', '')) or None
+    return Response(profiler.collapsed(endpoint), mimetype='text/plain')
+
+
 # WebSocket Events
 
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
     logger.info(f"Client connected from {request.remote_addr}")
+    SOCKETIO_CLIENTS.inc()
+    SOCKETIO_EMITS.inc('connected')
     emit('connected', {'message': 'Connected to automation server'})
 
 
@@ -385,6 +990,7 @@ def handle_connect():
 def handle_disconnect():
     """Handle client disconnection"""
     logger.info(f"Client disconnected from {request.remote_addr}")
+    SOCKETIO_CLIENTS.dec()
 
 
 @socketio.on('request_status')
@@ -399,9 +1005,11 @@ def handle_status_request(data):
                 emit('error', {'message': 'Invalid automation ID format'})
                 return
             status = manager.get_status(automation_id)
+            SOCKETIO_EMITS.inc('status_update')
             emit('status_update', status)
         else:
             statuses = manager.list_automations()
+            SOCKETIO_EMITS.inc('status_update')
             emit('status_update', statuses)
     except ValueError as e:
         emit('error', {'message': str(e)})
@@ -409,18 +1017,34 @@ def handle_status_request(data):
         emit('error', {'message': 'Internal server error'})
 
 
+# Prometheus metrics endpoint (api_key may be passed as a query parameter)
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose server and automation metrics in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 # Health check endpoint (no auth required)
 @app.route('/health', methods=['GET'])
+@public
 def health_check():
     """Health check endpoint for load balancers"""
     return jsonify({"status": "healthy"}), 200
 
 
+# Rate limiting, API key check and security headers for every request
+# except to the @public routes above, compiled once at startup
+route_guard = RouteGuard(key_store=api_key_store)
+route_guard.install(app)
+
+
 if __name__ == '__main__':
     logger.info("Starting Automation Server...")
     logger.info(f"HTTPS Enabled: {Config.HTTPS_ENABLED}")
     logger.info(f"API Key Required: {Config.API_KEY_REQUIRED}")
     logger.info(f"Rate Limiting: {Config.RATE_LIMIT_ENABLED}")
+    logger.info(f"Trusted Proxies: {', '.join(Config.TRUSTED_PROXIES) or 'none'}")
+    logger.info(f"Cluster Mode: {Config.CLUSTER_MODE}")
 
     ssl_context = None
     if Config.HTTPS_ENABLED:
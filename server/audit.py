@@ -0,0 +1,207 @@
+"""
+Audit Log - non-blocking audit trail of security-relevant actions
+
+Request threads only put a log record on an in-memory queue. A background
+QueueListener writes the records as JSON lines to an append-only file
+(rotated by size), flushing in batches, and echoes them to the 'security'
+logger. The file can be queried via GET /api/audit.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, List, Optional
+
+
+security_logger = logging.getLogger('security')
+
+
+def _lines_backwards(path: str, block_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Non-empty lines of a file, last first, read in blocks from the end"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        partial = b''
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + partial).split(b'\n')
+            partial = lines.pop(0)  # may continue in the previous block
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if partial:
+            yield partial
+
+
+class _AuditQueueHandler(QueueHandler):
+    """Enqueue the record as-is; formatting happens in the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+class _BatchingListener(QueueListener):
+    """QueueListener that flushes its handlers whenever the queue runs dry"""
+
+    def __init__(self, q, *handlers, flush_interval: float = 1.0):
+        super().__init__(q, *handlers)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+    def handle(self, record):
+        done = getattr(record, 'flush_event', None)
+        if done is not None:
+            for handler in self.handlers:
+                handler.flush()
+            done.set()
+            return
+        super().handle(record)
+
+
+class JsonlAuditHandler(logging.Handler):
+    """Buffers audit events and appends them to a size-rotated JSONL file"""
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                 batch_size: int = 100):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self._buffer: List[str] = []
+        os.makedirs(os.path.dirname(path) or '.', mode=0o755, exist_ok=True)
+
+    def emit(self, record):
+        try:
+            self._buffer.append(json.dumps(record.audit, default=str))
+            if len(self._buffer) >= self.batch_size:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def _rotate(self):
+        """audit.jsonl -> audit.jsonl.1 -> ... -> audit.jsonl.<backup_count>"""
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def files(self) -> List[str]:
+        """Existing log files, newest first"""
+        candidates = [self.path] + [f"{self.path}.{i}" for i in range(1, self.backup_count + 1)]
+        return [path for path in candidates if os.path.exists(path)]
+
+
+class _SecurityEchoHandler(logging.Handler):
+    """Mirrors audit events to the 'security' logger (console)"""
+
+    def emit(self, record):
+        event = record.audit
+        security_logger.info(f"AUDIT: {event['action']} | IP: {event['ip']} | {event['details']}")
+
+
+class AuditLog:
+    """Queue-backed audit trail"""
+
+    def __init__(self, flush_interval: float = 1.0):
+        self.flush_interval = flush_interval
+        self.file_handler: Optional[JsonlAuditHandler] = None
+        self._queue = queue.SimpleQueue()
+        self._logger = logging.getLogger('security.audit')
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(_AuditQueueHandler(self._queue))
+        self._listener = None
+        self._lock = threading.Lock()
+        self._start([_SecurityEchoHandler()])
+
+    def configure(self, path: Optional[str], max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        """Write events to path from now on (None: console only)"""
+        handlers: List[logging.Handler] = [_SecurityEchoHandler()]
+        file_handler = None
+        if path:
+            file_handler = JsonlAuditHandler(path, max_bytes=max_bytes, backup_count=backup_count)
+            handlers.insert(0, file_handler)
+        self._start(handlers)
+        self.file_handler = file_handler
+
+    def _start(self, handlers: List[logging.Handler]):
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()  # drains and flushes the queue
+            self._listener = _BatchingListener(self._queue, *handlers, flush_interval=self.flush_interval)
+            self._listener.start()
+
+    def record(self, action: str, details: str = "", ip: str = None, **fields):
+        """Queue an audit event; returns without doing any I/O"""
+        now = time.time()
+        event = {
+            'time': datetime.fromtimestamp(now).isoformat(timespec='milliseconds'),
+            'ts': now,
+            'action': action,
+            'ip': ip,
+            'details': details,
+            **fields,
+        }
+        self._logger.info(action, extra={'audit': event})
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until all queued events are written"""
+        done = threading.Event()
+        record = logging.makeLogRecord({'flush_event': done})
+        self._queue.put_nowait(record)
+        return done.wait(timeout)
+
+    def query(self, action: str = None, ip: str = None, since: float = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """Matching events from the audit file(s), newest first"""
+        if self.file_handler is None:
+            return []
+        self.flush()
+        results: List[Dict[str, Any]] = []
+        for path in self.file_handler.files():
+            for line in _lines_backwards(path):
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if since is not None and event.get('ts', 0) <= since:
+                    # Files are append-only, nothing older can match
+                    return results
+                if action and event.get('action') != action:
+                    continue
+                if ip and event.get('ip') != ip:
+                    continue
+                results.append(event)
+                if len(results) >= limit:
+                    return results
+        return results
+
+
+# Shared by the whole server; app.py points it at DATA_DIR/audit
+audit_trail = AuditLog()
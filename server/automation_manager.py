@@ -1,15 +1,34 @@
+import logging
+from datetime import datetime
 from typing import Dict, List, Any
 from automations import AVAILABLE_AUTOMATIONS
-from automations.base import BaseAutomation
+from automations.base import AutomationAlreadyRunningError, BaseAutomation, AutomationStatus
+from automations.metrics import render_prometheus
+from events import AUTOMATION_STATUS, EventBus, bus as default_bus
+from scheduler import CronExpression, HeapScheduler, parse_at
+
+
+logger = logging.getLogger(__name__)
 
 
 class AutomationManager:
     """Manages all automation instances"""
     
-    def __init__(self):
+    def __init__(self, coordinator=None, scheduler: HeapScheduler = None, bus: EventBus = None):
         self.automations: Dict[str, BaseAutomation] = {}
         self.automation_classes = {cls.__name__: cls for cls in AVAILABLE_AUTOMATIONS}
         self.status_callback = None
+        # Latest status reported by a cluster worker, per automation
+        self.remote_status: Dict[str, Dict[str, Any]] = {}
+        self.coordinator = coordinator
+        if coordinator is not None:
+            coordinator.set_report_callback(self._handle_worker_report)
+        # Cron/at schedules per automation, fired by one shared timer thread
+        self.scheduler = scheduler or HeapScheduler()
+        self.schedules: Dict[str, Dict[str, Any]] = {}
+        # Status changes and events emitted by automations go to the event bus
+        self.bus = bus or default_bus
+        self._published_status: Dict[str, str] = {}
     
     def set_status_callback(self, callback):
         """Set callback for status updates"""
@@ -36,9 +55,11 @@ class AutomationManager:
         automation_class = self.automation_classes[automation_type]
         automation = automation_class()
         
-        # Set status callback
-        if self.status_callback:
-            automation.set_status_callback(self.status_callback)
+        # Status changes pass through the manager (scheduled runs return to SCHEDULED)
+        automation.set_status_callback(lambda status, a=automation: self._automation_status_changed(a))
+        automation.set_event_callback(
+            lambda event_type, payload, a=automation: self.bus.publish(event_type, payload, source=f"automation:{a.id}")
+        )
         
         self.automations[automation.id] = automation
         return automation.get_status()
@@ -51,34 +72,223 @@ class AutomationManager:
     
     def list_automations(self) -> List[Dict[str, Any]]:
         """List all automation instances"""
-        return [auto.get_status() for auto in self.automations.values()]
+        return [self._status_of(auto) for auto in list(self.automations.values())]
     
     def start_automation(self, automation_id: str, config: Dict[str, Any]) -> Dict[str, Any]:
         """Start an automation with config"""
         automation = self.get_automation(automation_id)
+        if self.coordinator is not None:
+            # Runs on whichever worker picks up the lease
+            if automation.status == AutomationStatus.RUNNING:
+                raise AutomationAlreadyRunningError("Automation is already running")
+            automation.config = config
+            automation.status = AutomationStatus.RUNNING
+            automation.error_message = None
+            self.remote_status.pop(automation_id, None)
+            self.coordinator.submit(automation_id, type(automation).__name__, config)
+            return self._status_of(automation)
         automation.start(config)
         return automation.get_status()
     
     def stop_automation(self, automation_id: str) -> Dict[str, Any]:
         """Stop an automation"""
         automation = self.get_automation(automation_id)
+        if self.coordinator is not None:
+            self.coordinator.withdraw(automation_id)
+            automation.status = AutomationStatus.STOPPED
+            if automation_id in self.schedules:
+                automation.status = AutomationStatus.SCHEDULED
+            if automation_id in self.remote_status:
+                self.remote_status[automation_id]['status'] = AutomationStatus.STOPPED
+            return self._status_of(automation)
         automation.stop()
         return automation.get_status()
     
     def get_status(self, automation_id: str) -> Dict[str, Any]:
         """Get automation status"""
         automation = self.get_automation(automation_id)
-        return automation.get_status()
+        return self._status_of(automation)
+    
+    def get_logs(self, automation_id: str, since: int = 0, limit: int = 200) -> Dict[str, Any]:
+        """Log records of an automation after the `since` cursor"""
+        automation = self.get_automation(automation_id)
+        return automation.logs.read(since, limit)
+    
+    def schedule_automation(self, automation_id: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run an automation on a schedule:
+        {"cron": "0 8 * * 1-5" | "at": "2030-01-01T08:00", "config": {...}, "duration": seconds}
+        duration stops each run after that many seconds (for automations that loop until stopped).
+        """
+        automation = self.get_automation(automation_id)
+        cron = spec.get('cron')
+        at = spec.get('at')
+        if bool(cron) == bool(at):
+            raise ValueError("Provide exactly one of 'cron' or 'at'")
+        duration = spec.get('duration')
+        if duration is not None:
+            duration = int(duration)
+            if duration <= 0:
+                raise ValueError("duration must be a positive number of seconds")
+        config = spec.get('config', automation.config or {})
+        if not isinstance(config, dict):
+            raise ValueError("config must be an object")
+        
+        schedule = {
+            'cron': CronExpression(cron).expression if cron else None,
+            'at': parse_at(at).isoformat() if at else None,
+            'config': config,
+            'duration': duration,
+            'next_run': None,
+        }
+        if at and parse_at(at) <= datetime.now():
+            raise ValueError("'at' time is in the past")
+        self.schedules[automation_id] = schedule
+        self._arm(automation_id)
+        if automation.status == AutomationStatus.STOPPED:
+            automation.status = AutomationStatus.SCHEDULED
+        self._automation_status_changed(automation)
+        return self._status_of(automation)
+    
+    def unschedule_automation(self, automation_id: str) -> Dict[str, Any]:
+        """Remove an automation's schedule (a run in progress continues)"""
+        automation = self.get_automation(automation_id)
+        self.schedules.pop(automation_id, None)
+        self.scheduler.cancel(('automation', automation_id))
+        if automation.status == AutomationStatus.SCHEDULED:
+            automation.status = AutomationStatus.STOPPED
+        self._automation_status_changed(automation)
+        return self._status_of(automation)
+    
+    def _arm(self, automation_id: str):
+        """Queue the next fire time of a schedule"""
+        schedule = self.schedules.get(automation_id)
+        if schedule is None:
+            return
+        if schedule['cron']:
+            next_run = CronExpression(schedule['cron']).next_after(datetime.now())
+        else:
+            next_run = parse_at(schedule['at'])
+        schedule['next_run'] = next_run.isoformat()
+        self.scheduler.schedule(
+            ('automation', automation_id), next_run.timestamp(), lambda: self._fire(automation_id)
+        )
+    
+    def _fire(self, automation_id: str):
+        """Start a scheduled run (on a scheduler worker thread)"""
+        schedule = self.schedules.get(automation_id)
+        automation = self.automations.get(automation_id)
+        if schedule is None or automation is None:
+            return
+        if schedule['cron']:
+            self._arm(automation_id)
+        else:
+            # One-shot: the schedule is used up once it fires
+            self.schedules.pop(automation_id, None)
+        
+        if automation.status == AutomationStatus.RUNNING:
+            logger.warning(f"Skipping scheduled run of {automation_id}: previous run still in progress")
+            return
+        try:
+            self.start_automation(automation_id, schedule['config'])
+        except AutomationAlreadyRunningError:
+            # Started concurrently (API call or the previous run's stop still in progress)
+            logger.warning(f"Skipping scheduled run of {automation_id}: previous run still in progress")
+            return
+        except Exception as e:
+            logger.error(f"Scheduled run of {automation_id} failed to start: {e}")
+            automation.status = AutomationStatus.ERROR
+            automation.error_message = str(e)
+            self._automation_status_changed(automation)
+            return
+        if schedule['duration']:
+            self.scheduler.schedule(
+                ('automation-stop', automation_id),
+                datetime.now().timestamp() + schedule['duration'],
+                lambda: self._stop_scheduled_run(automation_id)
+            )
+    
+    def _stop_scheduled_run(self, automation_id: str):
+        automation = self.automations.get(automation_id)
+        if automation is not None and automation.status == AutomationStatus.RUNNING:
+            self.stop_automation(automation_id)
+    
+    def _automation_status_changed(self, automation: BaseAutomation):
+        """Return finished scheduled automations to SCHEDULED and broadcast"""
+        if automation.status == AutomationStatus.STOPPED and automation.id in self.schedules:
+            automation.status = AutomationStatus.SCHEDULED
+        self._broadcast(automation)
+    
+    def _broadcast(self, automation: BaseAutomation):
+        """Send the status to the status callback, publish an event if it changed"""
+        status = self._status_of(automation)
+        if self.status_callback:
+            self.status_callback(status)
+        previous = self._published_status.get(automation.id, AutomationStatus.STOPPED)
+        if status['status'] != previous:
+            self._published_status[automation.id] = status['status']
+            self.bus.publish(AUTOMATION_STATUS, {
+                'automation_id': automation.id,
+                'name': status['name'],
+                'status': status['status'],
+                'previous': previous,
+                'error_message': status['error_message'],
+            }, source=f"automation:{automation.id}")
     
     def delete_automation(self, automation_id: str):
         """Delete an automation instance"""
         automation = self.get_automation(automation_id)
-        if automation.status == "running":
+        self.schedules.pop(automation_id, None)
+        self.scheduler.cancel(('automation', automation_id))
+        self.scheduler.cancel(('automation-stop', automation_id))
+        if self.coordinator is not None:
+            self.coordinator.withdraw(automation_id)
+            self.remote_status.pop(automation_id, None)
+        elif automation.status == "running":
             automation.stop()
         del self.automations[automation_id]
+        self._published_status.pop(automation_id, None)
+    
+    def _status_of(self, automation: BaseAutomation) -> Dict[str, Any]:
+        """Local status, overlaid with what the owning worker reported"""
+        status = automation.get_status()
+        if self.coordinator is not None:
+            remote = self.remote_status.get(automation.id)
+            if remote:
+                for key in ('last_run', 'error_message', 'metrics'):
+                    status[key] = remote.get(key, status[key])
+            status['status'] = automation.status
+            status['worker_id'] = self.coordinator.placement(automation.id)
+        schedule = self.schedules.get(automation.id)
+        if schedule is not None:
+            status['schedule'] = {k: v for k, v in schedule.items() if k != 'config'}
+        return status
+    
+    def _handle_worker_report(self, automation_id: str, report: Dict[str, Any]):
+        """Apply a status reported by a cluster worker"""
+        automation = self.automations.get(automation_id)
+        if automation is None:
+            return
+        previous = self.remote_status.get(automation_id, {})
+        self.remote_status[automation_id] = report
+        if automation.status == AutomationStatus.RUNNING:
+            automation.status = report.get('status', automation.status)
+            automation.error_message = report.get('error_message')
+            if automation.status == AutomationStatus.STOPPED and automation_id in self.schedules:
+                automation.status = AutomationStatus.SCHEDULED
+        changed = any(previous.get(k) != report.get(k) for k in ('status', 'error_message', 'last_run'))
+        if changed:
+            self._broadcast(automation)
+    
+    def render_metrics(self) -> str:
+        """Render per-automation run metrics in Prometheus text format"""
+        return render_prometheus(list(self.automations.values()))
     
     def stop_all(self):
         """Stop all running automations"""
+        if self.coordinator is not None:
+            # Workers keep running their leases; nothing runs in this process
+            return
         for automation in self.automations.values():
             if automation.status == "running":
                 automation.stop()
@@ -1,9 +1,15 @@
 from abc import ABC, abstractmethod
+from concurrent import futures
+from contextlib import contextmanager
 from typing import Dict, Any, List
 from datetime import datetime
 import threading
+import time
 import uuid
 
+from .logs import AutomationLog
+from .metrics import IterationMetrics
+
 
 class AutomationStatus:
     STOPPED = "stopped"
@@ -12,9 +18,18 @@ class AutomationStatus:
     SCHEDULED = "scheduled"
 
 
+class AutomationAlreadyRunningError(Exception):
+    """Start requested for an automation that is already running"""
+    pass
+
+
 class BaseAutomation(ABC):
     """Base class for all automations"""
     
+    # "thread" runs in the server process, "process" runs in a shared
+    # multiprocessing pool (use for CPU-heavy run() implementations)
+    execution_mode = "thread"
+    
     def __init__(self, automation_id: str = None):
         self.id = automation_id or str(uuid.uuid4())
         self.status = AutomationStatus.STOPPED
@@ -24,6 +39,11 @@ class BaseAutomation(ABC):
         self.thread = None
         self.stop_flag = threading.Event()
         self.status_callback = None
+        self.event_callback = None
+        self.metrics = IterationMetrics()
+        self.logs = AutomationLog(self.id)
+        self._process_future = None
+        self._process_run = None
         
     @abstractmethod
     def get_name(self) -> str:
@@ -59,18 +79,28 @@ class BaseAutomation(ABC):
     def start(self, config: Dict[str, Any]):
         """Start the automation with given config"""
         if self.status == AutomationStatus.RUNNING:
-            raise Exception("Automation is already running")
+            raise AutomationAlreadyRunningError("Automation is already running")
         
         self.config = config
         self.stop_flag.clear()
         self.status = AutomationStatus.RUNNING
         self.error_message = None
         
-        self.thread = threading.Thread(target=self._run_wrapper)
-        self.thread.daemon = True
-        self.thread.start()
-        
-        self._notify_status_change()
+        if self.execution_mode == "process":
+            from .process_pool import get_process_pool
+            self.last_run = datetime.now().isoformat()
+            try:
+                self.stop_flag, self._process_future, self._process_run = get_process_pool().submit(self, config)
+            except Exception:
+                self.status = AutomationStatus.STOPPED
+                raise
+            self._notify_status_change()
+        else:
+            self.thread = threading.Thread(target=self._run_wrapper)
+            self.thread.daemon = True
+            # Announce "running" before a short run() can finish and report "stopped"
+            self._notify_status_change()
+            self.thread.start()
     
     def stop(self):
         """Stop the automation"""
@@ -78,12 +108,39 @@ class BaseAutomation(ABC):
             return
         
         self.stop_flag.set()
-        if self.thread:
+        if self._process_future is not None:
+            futures.wait([self._process_future], timeout=5)
+        elif self.thread:
             self.thread.join(timeout=5)
         
         self.status = AutomationStatus.STOPPED
         self._notify_status_change()
     
+    def log(self, message: str, level: str = "info", **fields):
+        """Write to this automation's log (GET /api/automations/<id>/logs)"""
+        self.logs.write(message, level, **fields)
+    
+    def emit(self, event_type: str, **payload):
+        """Publish an event (see events.EVENT_TYPES) that rules can react to"""
+        self._publish_event(event_type, {'automation_id': self.id, 'name': self.get_name(), **payload})
+    
+    @contextmanager
+    def track_iteration(self):
+        """Time one iteration of the run loop and record its outcome.
+
+        Usage inside run():
+            with self.track_iteration():
+                ...one check...
+            self.stop_flag.wait(interval)
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.metrics.observe(time.perf_counter() - started, success=False)
+            raise
+        self.metrics.observe(time.perf_counter() - started, success=True)
+    
     def _run_wrapper(self):
         """Wrapper to catch exceptions"""
         try:
@@ -94,9 +151,34 @@ class BaseAutomation(ABC):
         except Exception as e:
             self.status = AutomationStatus.ERROR
             self.error_message = str(e)
+            self.log(f"Automation failed: {e}", "error")
         finally:
             self._notify_status_change()
     
+    def _handle_process_event(self, kind: str, payload, run: str = None):
+        """Apply an event relayed from the pool process (execution_mode = "process")"""
+        if run is not None and run != self._process_run:
+            return  # left over from an earlier run
+        if kind == 'iteration':
+            self.metrics.observe(*payload)
+        elif kind == 'log':
+            self.logs.append(payload)
+        elif kind == 'event':
+            self._publish_event(*payload)
+        elif kind == 'status':
+            self.last_run = payload.get('last_run') or self.last_run
+            self.error_message = payload.get('error_message')
+            self._notify_status_change()
+        elif kind == 'finished':
+            if self.status != AutomationStatus.RUNNING:
+                return
+            if payload:
+                self.status = AutomationStatus.ERROR
+                self.error_message = payload
+            else:
+                self.status = AutomationStatus.STOPPED
+            self._notify_status_change()
+    
     def get_status(self) -> Dict[str, Any]:
         """Get current status"""
         return {
@@ -106,13 +188,22 @@ class BaseAutomation(ABC):
             "status": self.status,
             "config": self.config,
             "last_run": self.last_run,
-            "error_message": self.error_message
+            "error_message": self.error_message,
+            "metrics": self.metrics.snapshot()
         }
     
     def set_status_callback(self, callback):
         """Set callback for status changes"""
         self.status_callback = callback
     
+    def set_event_callback(self, callback):
+        """Set callback(event_type, payload) for events emitted by run()"""
+        self.event_callback = callback
+    
+    def _publish_event(self, event_type: str, payload: Dict[str, Any]):
+        if self.event_callback:
+            self.event_callback(event_type, payload)
+    
     def _notify_status_change(self):
         """Notify about status change"""
         if self.status_callback:
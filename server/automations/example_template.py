@@ -21,6 +21,11 @@ class ExampleAutomation(BaseAutomation):
     Replace this with your automation description.
     """
     
+    # Automations run as threads inside the server by default. Set this to
+    # "process" for CPU-heavy work (big page parsing, regex over megabytes)
+    # so run() executes in a worker process and doesn't slow down the API.
+    execution_mode = "thread"
+    
     def get_name(self) -> str:
         """
         Return the display name of this automation.
@@ -94,11 +99,10 @@ class ExampleAutomation(BaseAutomation):
         date_value = self.config.get('example_date')
         time_value = self.config.get('example_time')
         
-        print(f"Starting example automation with config:")
-        print(f"  Text: {text_value}")
-        print(f"  Number: {number_value}")
-        print(f"  Date: {date_value}")
-        print(f"  Time: {time_value}")
+        # self.log() writes to this automation's log, readable via
+        # GET /api/automations/<id>/logs; keyword arguments become structured fields
+        self.log("Starting example automation", text=text_value, number=number_value,
+                 date=date_value, time=time_value)
         
         # Main loop - runs until stopped
         iteration = 0
@@ -106,19 +110,22 @@ class ExampleAutomation(BaseAutomation):
             iteration += 1
             
             # Your automation logic here
-            print(f"Example automation running... iteration {iteration}")
-            
-            # Example: Do some work
-            # result = do_something(text_value)
-            # if result:
-            #     print(f"Success: {result}")
+            # Wrapping the work in track_iteration() records its duration and
+            # outcome in get_status()["metrics"] and on /metrics
+            with self.track_iteration():
+                self.log(f"Example automation running... iteration {iteration}")
+                
+                # Example: Do some work
+                # result = do_something(text_value)
+                # if result:
+                #     self.log(f"Success: {result}")
             
             # Wait before next iteration
             # Use self.stop_flag.wait() instead of time.sleep()
             # This allows the automation to stop immediately when requested
             self.stop_flag.wait(number_value)
         
-        print("Example automation stopped")
+        self.log("Example automation stopped")
 
 
 # Example of a more complex automation
@@ -152,22 +159,23 @@ class AdvancedExampleAutomation(BaseAutomation):
         url = self.config.get('url')
         interval = int(self.config.get('interval', 300))
         
-        print(f"Monitoring {url} every {interval} seconds")
+        self.log(f"Monitoring {url} every {interval} seconds")
         
         while not self.stop_flag.is_set():
             try:
-                # Your logic here
-                print(f"Checking {url}...")
-                
-                # Example: Make HTTP request
-                # import requests
-                # response = requests.get(url, timeout=10)
-                # if response.status_code == 200:
-                #     print("URL is accessible")
+                with self.track_iteration():
+                    # Your logic here
+                    self.log(f"Checking {url}...")
+                    
+                    # Example: Make HTTP request
+                    # import requests
+                    # response = requests.get(url, timeout=10)
+                    # if response.status_code == 200:
+                    #     self.log("URL is accessible")
                 
             except Exception as e:
                 # Handle errors gracefully
-                print(f"Error: {e}")
+                self.log(f"Error: {e}", "error")
                 # Continue running despite errors
             
             # Wait for next iteration
@@ -0,0 +1,170 @@
+"""
+Automation Logs - structured per-automation log capture
+
+Every automation writes its log records into a bounded in-memory ring
+buffer, which the API reads with a sequence-number cursor. Records are
+also handed to a shared sink that appends them as JSON lines to
+<log dir>/<automation id>.jsonl from a background thread, in batches.
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 500
+LEVELS = ('debug', 'info', 'warning', 'error')
+
+
+class LogSink:
+    """Appends log records to JSONL files in batches from one writer thread"""
+
+    def __init__(self, directory: str = None, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_bytes: int = 10 * 1024 * 1024, queue_size: int = 10000):
+        self.directory = None
+        self.buffer_size = BUFFER_SIZE
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=queue_size)
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = None
+        self._lock = threading.Lock()
+        if directory:
+            self.configure(directory)
+
+    def configure(self, directory: Optional[str], buffer_size: int = None):
+        """Write to this directory from now on (None disables disk writes)
+
+        buffer_size is the number of records kept in memory by logs created afterwards.
+        """
+        if directory:
+            os.makedirs(directory, mode=0o755, exist_ok=True)
+        with self._lock:
+            self.directory = directory
+            if buffer_size:
+                self.buffer_size = buffer_size
+            if directory and self._thread is None:
+                self._thread = threading.Thread(target=self._writer_loop, name='automation-log-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, automation_id: str, record: Dict[str, Any]):
+        """Queue a record for writing; never blocks the caller"""
+        if not self.directory:
+            return
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((automation_id, record))
+        except queue.Full:
+            self._done(1)
+            self.dropped += 1
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything submitted so far is on disk"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending <= 0, timeout)
+
+    def path_for(self, automation_id: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, f"{automation_id}.jsonl")
+
+    def _done(self, count: int):
+        with self._idle:
+            self._pending -= count
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} automation log record(s): {e}")
+            finally:
+                self._done(len(batch))
+
+    def _write(self, batch: List[tuple]):
+        by_automation: Dict[str, List[str]] = {}
+        for automation_id, record in batch:
+            by_automation.setdefault(automation_id, []).append(json.dumps(record, default=str))
+        for automation_id, lines in by_automation.items():
+            path = self.path_for(automation_id)
+            if path is None:
+                continue
+            if os.path.exists(path) and os.path.getsize(path) > self.max_bytes:
+                os.replace(path, path + '.1')
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+
+
+# Shared by every automation in this process; disk writes are enabled by the server
+log_sink = LogSink()
+
+
+class AutomationLog:
+    """Bounded, cursor-readable log of one automation"""
+
+    def __init__(self, automation_id: str, capacity: int = None, sink: LogSink = None):
+        self.automation_id = automation_id
+        self.sink = sink or log_sink
+        self._records = deque(maxlen=capacity or self.sink.buffer_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def write(self, message: str, level: str = 'info', **fields) -> Dict[str, Any]:
+        """Record one log line with optional structured fields"""
+        now = time.time()
+        return self.append({
+            'time': datetime.fromtimestamp(now).isoformat(timespec='milliseconds'),
+            'ts': now,
+            'level': level if level in LEVELS else 'info',
+            'message': str(message),
+            **fields,
+        })
+
+    def append(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a prepared record (also used for records relayed from pool processes)"""
+        with self._lock:
+            self._seq += 1
+            record = {**record, 'seq': self._seq}
+            self._records.append(record)
+        self.sink.submit(self.automation_id, record)
+        return record
+
+    def read(self, since: int = 0, limit: int = 200) -> Dict[str, Any]:
+        """Records with seq > since (oldest first) and the cursor for the next read"""
+        since = max(int(since), 0)
+        with self._lock:
+            first = self._records[0]['seq'] if self._records else self._seq + 1
+            # Sequence numbers in the buffer are contiguous
+            start = min(max(since - first + 1, 0), len(self._records))
+            page = list(itertools.islice(self._records, start, start + max(1, limit)))
+            last = self._seq
+        return {
+            'logs': page,
+            'next': page[-1]['seq'] if page else min(since, last),
+            # Records after the cursor that already left the buffer
+            'missed': max(0, first - since - 1),
+        }
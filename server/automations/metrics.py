@@ -0,0 +1,144 @@
+"""
+Automation Metrics - per-iteration latency and outcome tracking
+"""
+import threading
+from collections import deque
+from typing import Dict, Any, List, Iterable
+
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" values)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape_label(value: str) -> str:
+    """Escape a Prometheus label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Render a label dict as {k="v",...}"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + '}'
+
+
+class IterationMetrics:
+    """Latency histogram, success/error counters and recent durations of one automation"""
+
+    RECENT_SIZE = 20
+
+    def __init__(self, recent_size: int = RECENT_SIZE):
+        self._lock = threading.Lock()
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total_seconds = 0.0
+        self.successes = 0
+        self.errors = 0
+        self.last_duration = None
+        self.recent = deque(maxlen=recent_size)
+
+    def observe(self, duration: float, success: bool = True):
+        """Record one finished iteration"""
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                index = i
+                break
+
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.total_seconds += duration
+            if success:
+                self.successes += 1
+            else:
+                self.errors += 1
+            self.last_duration = duration
+            self.recent.append(duration)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summary suitable for get_status()"""
+        with self._lock:
+            recent = list(self.recent)
+            count = self.count
+            total = self.total_seconds
+            successes = self.successes
+            errors = self.errors
+            last = self.last_duration
+
+        ordered = sorted(recent)
+        return {
+            "iterations": count,
+            "successes": successes,
+            "errors": errors,
+            "last_duration": round(last, 6) if last is not None else None,
+            "avg_duration": round(total / count, 6) if count else None,
+            "p50_duration": round(ordered[len(ordered) // 2], 6) if ordered else None,
+            "max_recent_duration": round(ordered[-1], 6) if ordered else None,
+            "recent_durations": [round(d, 6) for d in recent],
+        }
+
+    def prometheus_lines(self, labels: Dict[str, str]) -> Dict[str, List[str]]:
+        """Sample lines for each metric family, keyed by family name"""
+        with self._lock:
+            buckets = list(self.bucket_counts)
+            count = self.count
+            total = self.total_seconds
+            successes = self.successes
+            errors = self.errors
+            last = self.last_duration
+
+        histogram = []
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, buckets):
+            cumulative += n
+            histogram.append(
+                f'automation_iteration_duration_seconds_bucket'
+                f'{_format_labels({**labels, "le": repr(bound)})} {cumulative}'
+            )
+        histogram.append(
+            f'automation_iteration_duration_seconds_bucket{_format_labels({**labels, "le": "+Inf"})} {count}'
+        )
+        histogram.append(f'automation_iteration_duration_seconds_sum{_format_labels(labels)} {total}')
+        histogram.append(f'automation_iteration_duration_seconds_count{_format_labels(labels)} {count}')
+
+        result = {
+            'automation_iteration_duration_seconds': histogram,
+            'automation_iterations_total': [
+                f'automation_iterations_total{_format_labels({**labels, "outcome": "success"})} {successes}',
+                f'automation_iterations_total{_format_labels({**labels, "outcome": "error"})} {errors}',
+            ],
+            'automation_last_iteration_duration_seconds': [],
+        }
+        if last is not None:
+            result['automation_last_iteration_duration_seconds'].append(
+                f'automation_last_iteration_duration_seconds{_format_labels(labels)} {last}'
+            )
+        return result
+
+
+# Metric family name -> (type, help)
+METRIC_FAMILIES = {
+    'automation_iteration_duration_seconds': ('histogram', 'Duration of automation run-loop iterations'),
+    'automation_iterations_total': ('counter', 'Automation run-loop iterations by outcome'),
+    'automation_last_iteration_duration_seconds': ('gauge', 'Duration of the most recent iteration'),
+}
+
+
+def render_prometheus(automations: Iterable) -> str:
+    """Render metrics of the given automations in Prometheus text format"""
+    families: Dict[str, List[str]] = {name: [] for name in METRIC_FAMILIES}
+    for automation in automations:
+        labels = {
+            'automation_id': automation.id,
+            'type': type(automation).__name__,
+        }
+        for name, lines in automation.metrics.prometheus_lines(labels).items():
+            families[name].extend(lines)
+
+    output = []
+    for name, (metric_type, help_text) in METRIC_FAMILIES.items():
+        output.append(f'# HELP {name} {help_text}')
+        output.append(f'# TYPE {name} {metric_type}')
+        output.extend(families[name])
+    return '\n'.join(output) + '\n'
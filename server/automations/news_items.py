@@ -0,0 +1,328 @@
+"""
+News Items - headline extraction and a bounded record of items already seen
+
+A monitored page is split into items so only genuinely new headlines are
+reported, instead of every ad rotation or timestamp change on the page:
+
+- RSS/RDF/Atom feeds are parsed incrementally with iterparse, clearing
+  each entry once read, so large feeds never build a full tree.
+- HTML pages yield the links inside headings (<h1>-<h4>), or inside
+  <article> elements when headings have no links.
+
+Seen item IDs are kept per monitored URL in a SeenItems set: an exact LRU
+of recent IDs (the ones currently on the page) backed by two generations
+of Bloom filters for older ones. Memory and file size stay fixed however
+long a monitor runs; an old item reappearing is recognised with a small
+false-positive rate, which at worst suppresses one notification.
+"""
+import hashlib
+import logging
+import math
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urldefrag, urljoin
+from xml.etree.ElementTree import ParseError, iterparse
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS = 500
+MAX_TITLE_LENGTH = 300
+MAX_SUMMARY_LENGTH = 1000
+FEED_MARKERS = (b'<rss', b'<feed', b'<rdf:rdf')
+HEADING_TAGS = frozenset({'h1', 'h2', 'h3', 'h4'})
+SKIPPED_TAGS = frozenset({'script', 'style', 'noscript', 'template'})
+_WHITESPACE = re.compile(r'\s+')
+
+
+class NewsItem:
+    """One headline of a page or feed"""
+
+    __slots__ = ('id', 'title', 'link', 'summary')
+
+    def __init__(self, id: str, title: str, link: str = '', summary: str = ''):
+        self.id = id
+        self.title = title
+        self.link = link
+        self.summary = summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'title': self.title, 'link': self.link}
+
+    def __repr__(self):
+        return f"NewsItem({self.title!r})"
+
+
+def _clean(text: Optional[str], limit: int) -> str:
+    return _WHITESPACE.sub(' ', text or '').strip()[:limit]
+
+
+def is_feed(content: bytes, content_type: str = '') -> bool:
+    """True for RSS/RDF/Atom documents"""
+    content_type = content_type.lower()
+    if 'rss' in content_type or 'atom' in content_type:
+        return True
+    head = content[:2048].lower()
+    return any(marker in head for marker in FEED_MARKERS)
+
+
+def extract_items(content: bytes, content_type: str = '', base_url: str = '') -> List[NewsItem]:
+    """Items of a feed or HTML page, in document order (empty if none found)"""
+    if is_feed(content, content_type):
+        return _feed_items(content, base_url)
+    charset = re.search(r'charset=([\w-]+)', content_type or '')
+    try:
+        text = content.decode(charset.group(1) if charset else 'utf-8', errors='replace')
+    except LookupError:
+        text = content.decode('utf-8', errors='replace')
+    parser = _HeadlineParser(base_url)
+    parser.feed(text)
+    parser.close()
+    return parser.items()
+
+
+def _local_name(tag: str) -> str:
+    """Tag without its XML namespace"""
+    return tag.rsplit('}', 1)[-1].lower()
+
+
+def _feed_items(content: bytes, base_url: str) -> List[NewsItem]:
+    items: List[NewsItem] = []
+    try:
+        for _, element in iterparse(BytesIO(content), events=('end',)):
+            if _local_name(element.tag) not in ('item', 'entry'):
+                continue
+            fields: Dict[str, str] = {}
+            for child in element:
+                name = _local_name(child.tag)
+                if name == 'link':
+                    # Atom: <link rel="alternate" href="..."/>, RSS: <link>url</link>
+                    href = child.get('href')
+                    if href is None:
+                        fields.setdefault('link', (child.text or '').strip())
+                    elif child.get('rel', 'alternate') == 'alternate':
+                        fields.setdefault('link', href.strip())
+                elif name in ('title', 'guid', 'id') and child.text:
+                    fields.setdefault(name, child.text.strip())
+                elif name in ('description', 'summary', 'content', 'encoded') and child.text:
+                    fields.setdefault('summary', child.text)
+            element.clear()
+            link = urljoin(base_url, fields['link']) if fields.get('link') else ''
+            title = _clean(fields.get('title'), MAX_TITLE_LENGTH)
+            item_id = fields.get('guid') or fields.get('id') or link or title
+            if item_id:
+                items.append(NewsItem(item_id, title or link, link, _clean(fields.get('summary'), MAX_SUMMARY_LENGTH)))
+                if len(items) >= MAX_ITEMS:
+                    break
+    except ParseError as e:
+        logger.debug(f"Could not parse feed: {e}")
+    return items
+
+
+class _HeadlineParser(HTMLParser):
+    """Collects linked headlines: <a> inside headings, else inside <article>"""
+
+    def __init__(self, base_url: str):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.heading_links: List[NewsItem] = []
+        self.article_links: List[NewsItem] = []
+        self._heading_depth = 0
+        self._article_depth = 0
+        self._skip_depth = 0
+        self._href: Optional[str] = None
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in HEADING_TAGS:
+            self._heading_depth += 1
+        elif tag == 'article':
+            self._article_depth += 1
+        elif tag == 'a' and (self._heading_depth or self._article_depth):
+            href = dict(attrs).get('href')
+            if href and not href.startswith(('javascript:', 'mailto:', '#')):
+                self._href = href
+                self._text = []
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in HEADING_TAGS:
+            self._heading_depth = max(self._heading_depth - 1, 0)
+        elif tag == 'article':
+            self._article_depth = max(self._article_depth - 1, 0)
+        elif tag == 'a' and self._href is not None:
+            title = _clean(''.join(self._text), MAX_TITLE_LENGTH)
+            link = urldefrag(urljoin(self.base_url, self._href))[0]
+            if title:
+                target = self.heading_links if self._heading_depth else self.article_links
+                target.append(NewsItem(link, title, link))
+            self._href = None
+
+    def handle_data(self, data):
+        if self._href is not None and not self._skip_depth:
+            self._text.append(data)
+
+    def items(self) -> List[NewsItem]:
+        unique: Dict[str, NewsItem] = {}
+        for item in self.heading_links or self.article_links:
+            unique.setdefault(item.id, item)
+        return list(unique.values())[:MAX_ITEMS]
+
+
+class BloomFilter:
+    """Fixed-size set membership test without false negatives"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = max(8, (bits + 7) // 8 * 8)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes) -> Iterable[int]:
+        # Kirsch-Mitzenmacher: k positions from two 64-bit hashes
+        h1, h2 = struct.unpack('<QQ', digest[:16])
+        h2 |= 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, digest: bytes):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+
+class SeenItems:
+    """Bounded set of item IDs: exact recent LRU plus aging Bloom filters"""
+
+    MAGIC = b'SEEN1'
+
+    def __init__(self, recent_size: int = 2000, capacity: int = 20000, error_rate: float = 0.001):
+        self.recent_size = recent_size
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._recent: 'OrderedDict[bytes, None]' = OrderedDict()
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(item_id: str) -> bytes:
+        return hashlib.blake2b(item_id.encode('utf-8'), digest_size=16).digest()
+
+    def __len__(self) -> int:
+        """Approximate number of IDs remembered"""
+        return len(self._recent) + self._current.count + self._previous.count
+
+    def add(self, item_id: str) -> bool:
+        """Record an ID; True if it had not been seen before"""
+        digest = self._digest(item_id)
+        with self._lock:
+            if digest in self._recent:
+                self._recent.move_to_end(digest)
+                return False
+            new = digest not in self._current and digest not in self._previous
+            self._recent[digest] = None
+            if len(self._recent) > self.recent_size:
+                evicted, _ = self._recent.popitem(last=False)
+                if self._current.count >= self.capacity:
+                    # Forget the oldest generation instead of filling up
+                    self._previous, self._current = self._current, BloomFilter(self.capacity, self.error_rate)
+                self._current.add(evicted)
+            return new
+
+    def filter_new(self, items: Iterable[NewsItem]) -> List[NewsItem]:
+        """Record all items and return those not seen before"""
+        return [item for item in items if self.add(item.id)]
+
+    def to_bytes(self) -> bytes:
+        with self._lock:
+            header = struct.pack('<5sIIII', self.MAGIC, self._current.count, self._previous.count,
+                                 len(self._current.bits), len(self._recent))
+            return b''.join([header, bytes(self._current.bits), bytes(self._previous.bits), *self._recent])
+
+    def load(self, data: bytes):
+        """Restore from to_bytes() output; ValueError if it does not fit this set's sizes"""
+        header_size = struct.calcsize('<5sIIII')
+        magic, current, previous, bloom_bytes, recent = struct.unpack_from('<5sIIII', data)
+        if magic != self.MAGIC or bloom_bytes != len(self._current.bits):
+            raise ValueError("Incompatible seen-items data")
+        if len(data) != header_size + 2 * bloom_bytes + 16 * recent:
+            raise ValueError("Truncated seen-items data")
+        offset = header_size
+        with self._lock:
+            self._current.bits = bytearray(data[offset:offset + bloom_bytes])
+            self._previous.bits = bytearray(data[offset + bloom_bytes:offset + 2 * bloom_bytes])
+            self._current.count, self._previous.count = current, previous
+            offset += 2 * bloom_bytes
+            self._recent = OrderedDict(
+                (data[i:i + 16], None) for i in range(offset, len(data), 16)
+            )
+            while len(self._recent) > self.recent_size:
+                self._current.add(self._recent.popitem(last=False)[0])
+
+
+class SeenItemStore:
+    """SeenItems per monitored source, saved to one file each"""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory
+        self._sets: Dict[str, SeenItems] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, directory: Optional[str]):
+        """Save to this directory from now on (None keeps sets in memory only)"""
+        with self._lock:
+            self.directory = directory
+            self._sets.clear()
+
+    @staticmethod
+    def _key(source: str) -> str:
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32]
+
+    def _path(self, key: str) -> Optional[str]:
+        return os.path.join(self.directory, f"{key}.seen") if self.directory else None
+
+    def get(self, source: str) -> SeenItems:
+        """The seen set of a source (URL plus anything else that separates monitors)"""
+        key = self._key(source)
+        with self._lock:
+            seen = self._sets.get(key)
+            if seen is None:
+                seen = self._sets[key] = SeenItems()
+                path = self._path(key)
+                if path and os.path.exists(path):
+                    try:
+                        with open(path, 'rb') as f:
+                            seen.load(f.read())
+                    except (OSError, ValueError, struct.error) as e:
+                        logger.warning(f"Discarding seen items in {path}: {e}")
+            return seen
+
+    def save(self, source: str):
+        key = self._key(source)
+        with self._lock:
+            seen, path = self._sets.get(key), self._path(key)
+        if seen is None or path is None:
+            return
+        os.makedirs(self.directory, mode=0o755, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(seen.to_bytes())
+        os.replace(tmp_path, path)
+
+
+# Shared by all monitors in this process
+seen_items = SeenItemStore()
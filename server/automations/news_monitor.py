@@ -1,8 +1,13 @@
 from .base import BaseAutomation
+from .news_items import NewsItem, extract_items, seen_items
+from .snapshots import snapshot_store
+from .notifications import dispatcher
+from .scheduling import AdaptiveInterval, request_budget
 from typing import Dict, Any, List
 import time
 import requests
-from datetime import datetime
+
+from events import KEYWORD_MATCH
 
 
 class NewsMonitorAutomation(BaseAutomation):
@@ -36,6 +41,30 @@ class NewsMonitorAutomation(BaseAutomation):
                 "required": False,
                 "default": "600"
             },
+            {
+                "key": "change_detection",
+                "label": "Detect Changes By",
+                "type": "select",
+                "options": ["items", "page"],
+                "required": False,
+                "default": "items"
+            },
+            {
+                "key": "keep_history",
+                "label": "Keep Page Versions",
+                "type": "select",
+                "options": ["yes", "no"],
+                "required": False,
+                "default": "yes"
+            },
+            {
+                "key": "adaptive_interval",
+                "label": "Poll Less Often While Unchanged",
+                "type": "select",
+                "options": ["yes", "no"],
+                "required": False,
+                "default": "yes"
+            },
             {
                 "key": "notification_method",
                 "label": "Notification Method",
@@ -53,61 +82,120 @@ class NewsMonitorAutomation(BaseAutomation):
         keywords = [k.strip() for k in keywords if k.strip()]
         check_interval = int(self.config.get('check_interval', 600))
         notification_method = self.config.get('notification_method', 'console')
+        adaptive = self.config.get('adaptive_interval', 'yes') != 'no'
+        keep_history = self.config.get('keep_history', 'yes') != 'no'
+        # "items": report new headlines/feed entries, "page": any change of the page
+        seen = None
+        if self.config.get('change_detection', 'items') != 'page':
+            seen_key = '\n'.join([url or '', *sorted(k.lower() for k in keywords)])
+            seen = seen_items.get(seen_key)
+        
+        # Back off up to 4x while unchanged, down to 1/4 while changing often
+        interval = AdaptiveInterval(
+            check_interval,
+            min_interval=check_interval / 4 if adaptive else None,
+            max_interval=check_interval * 4 if adaptive else None
+        )
         
-        print(f"Starting news monitoring for: {url}")
+        self.log(f"Starting news monitoring for: {url}")
         if keywords:
-            print(f"Monitoring keywords: {', '.join(keywords)}")
+            self.log(f"Monitoring keywords: {', '.join(keywords)}")
         
         last_content_hash = None
         
+        # Spread out monitors that were started at the same time
+        self.stop_flag.wait(interval.initial_delay())
+        
         while not self.stop_flag.is_set():
             try:
-                # Fetch the news page
-                print(f"Checking news at {url}...")
-                response = requests.get(url, timeout=10)
-                content = response.text
-                
-                # Simple hash to detect changes
-                current_hash = hash(content)
-                
-                if last_content_hash is None:
-                    last_content_hash = current_hash
-                    print("Initial content captured")
-                elif current_hash != last_content_hash:
-                    print("News content changed!")
+                changed = False
+                if not request_budget.acquire(self.stop_flag):
+                    break
+                with self.track_iteration():
+                    # Fetch the news page
+                    self.log(f"Checking news at {url}...", "debug")
+                    response = requests.get(url, timeout=10)
+                    if keep_history and response.ok:
+                        snapshot = snapshot_store.record(url, response.content,
+                                                         response.headers.get('Content-Type', ''))
+                        if snapshot is not None:
+                            self.log("Saved page version", "debug", version=snapshot['id'])
+                    items = []
+                    if seen is not None:
+                        items = extract_items(response.content, response.headers.get('Content-Type', ''), url)
                     
-                    # Check for keywords if specified
-                    if keywords:
-                        found_keywords = [kw for kw in keywords if kw.lower() in content.lower()]
-                        if found_keywords:
-                            self.send_notification(
-                                f"Keywords found: {', '.join(found_keywords)}",
-                                notification_method
-                            )
+                    if items:
+                        first_check = len(seen) == 0
+                        new_items = seen.filter_new(items)
+                        seen_items.save(seen_key)
+                        if first_check:
+                            self.log(f"Initial items captured ({len(items)})")
+                        elif new_items:
+                            changed = True
+                            self._report_new_items(new_items, keywords, notification_method, url)
                     else:
-                        self.send_notification("News content updated", notification_method)
-                    
-                    last_content_hash = current_hash
+                        # No items found: fall back to hashing the whole page
+                        content = response.text
+                        current_hash = hash(content)
+                        
+                        if last_content_hash is None:
+                            last_content_hash = current_hash
+                            self.log("Initial content captured")
+                        elif current_hash != last_content_hash:
+                            self.log("News content changed!")
+                            changed = True
+                            
+                            # Check for keywords if specified
+                            if keywords:
+                                found_keywords = [kw for kw in keywords if kw.lower() in content.lower()]
+                                if found_keywords:
+                                    self.emit(KEYWORD_MATCH, url=url, keywords=found_keywords, items=[])
+                                    self.send_notification(
+                                        f"Keywords found: {', '.join(found_keywords)}",
+                                        notification_method
+                                    )
+                            else:
+                                self.send_notification("News content updated", notification_method)
+                            
+                            last_content_hash = current_hash
                 
-                # Wait for the specified interval or until stop is requested
-                self.stop_flag.wait(check_interval)
+                # Wait for the next (adaptive, jittered) interval or until stop is requested
+                self.stop_flag.wait(interval.next(changed))
                 
             except Exception as e:
-                print(f"Error monitoring news: {e}")
-                self.stop_flag.wait(60)  # Wait a minute before retrying
+                self.log(f"Error monitoring news: {e}", "error", url=url)
+                self.stop_flag.wait(interval.jittered(60))  # Wait a minute before retrying
+    
+    def _report_new_items(self, items: List[NewsItem], keywords: List[str], method: str, url: str):
+        """Notify about new items (only those mentioning a keyword, if any are configured)"""
+        self.log(f"{len(items)} new item(s)", titles=[item.title for item in items[:20]])
+        if keywords:
+            matches = []
+            found = set()
+            for item in items:
+                text = f"{item.title} {item.summary}".lower()
+                item_keywords = [kw for kw in keywords if kw.lower() in text]
+                if item_keywords:
+                    matches.append(item)
+                    found.update(item_keywords)
+            if not matches:
+                return
+            found_keywords = [kw for kw in keywords if kw in found]
+            self.emit(KEYWORD_MATCH, url=url, keywords=found_keywords, items=[i.to_dict() for i in matches])
+            self.send_notification(
+                f"Keywords found: {', '.join(found_keywords)} - {self._titles(matches)}", method
+            )
+        else:
+            self.send_notification(f"{len(items)} new item(s): {self._titles(items)}", method)
+    
+    @staticmethod
+    def _titles(items: List[NewsItem], limit: int = 5) -> str:
+        titles = '; '.join(item.title for item in items[:limit])
+        if len(items) > limit:
+            titles += f" and {len(items) - limit} more"
+        return titles
     
     def send_notification(self, message: str, method: str):
-        """Send notification using specified method"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        if method == "console":
-            print(f"[NOTIFICATION {timestamp}] {message}")
-        elif method == "email":
-            # Implement email notification
-            print(f"[EMAIL NOTIFICATION {timestamp}] {message}")
-            # Example: send_email(message)
-        elif method == "push":
-            # Implement push notification
-            print(f"[PUSH NOTIFICATION {timestamp}] {message}")
-            # Example: send_push_notification(message)
-
+        """Queue a notification; delivery happens off the monitoring loop"""
+        queued = dispatcher.notify(message, method, source=self.id)
+        self.log(f"Notification: {message}", method=method, queued=queued)
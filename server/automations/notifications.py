@@ -0,0 +1,305 @@
+"""
+Notifications - asynchronous notification dispatch for automations
+
+Automations hand notifications to the shared dispatcher and return
+immediately. Each channel (console, email, push) has its own queue and
+worker threads; workers send what has accumulated as one batch, retry
+failed batches with exponential backoff, and identical messages from the
+same automation are dropped within a dedup window.
+
+Email is sent via SMTP and push via a JSON webhook, both configured
+through NOTIFY_* settings (see config.py and .env.example); an unconfigured
+channel prints its notifications like the console channel.
+"""
+from abc import ABC, abstractmethod
+import json
+import logging
+import queue
+import smtplib
+import threading
+import time
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationChannel(ABC):
+    """Delivers batches of notifications"""
+
+    name = "base"
+    workers = 1
+    max_batch = 20
+
+    @abstractmethod
+    def send_batch(self, notifications: List[Dict[str, Any]]):
+        """Deliver all notifications or raise to have the batch retried"""
+        pass
+
+
+class ConsoleChannel(NotificationChannel):
+    """Prints notifications to stdout"""
+
+    name = "console"
+
+    def send_batch(self, notifications):
+        for notification in notifications:
+            print(f"[NOTIFICATION {notification['timestamp']}] {notification['message']}")
+
+
+class EmailChannel(NotificationChannel):
+    """Sends one email per batch via SMTP"""
+
+    name = "email"
+    workers = 2
+
+    def __init__(self, host: str = None, port: int = 587, username: str = None, password: str = None,
+                 use_tls: bool = True, sender: str = None, recipients: List[str] = None, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.sender = sender or username
+        self.recipients = recipients or []
+        self.timeout = timeout
+
+    def send_batch(self, notifications):
+        if not self.host or not self.recipients:
+            # Not configured (NOTIFY_SMTP_HOST, NOTIFY_EMAIL_TO): print instead
+            for notification in notifications:
+                print(f"[EMAIL NOTIFICATION {notification['timestamp']}] {notification['message']}")
+            return
+
+        email = EmailMessage()
+        email['From'] = self.sender or 'box@localhost'
+        email['To'] = ', '.join(self.recipients)
+        if len(notifications) == 1:
+            email['Subject'] = notifications[0]['message'][:78]
+        else:
+            email['Subject'] = f"{len(notifications)} notifications"
+        email.set_content('\n'.join(
+            f"[{n['timestamp']}] {n['source'] or 'box'}: {n['message']}" for n in notifications
+        ))
+
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+            smtp.send_message(email)
+
+
+class PushChannel(NotificationChannel):
+    """POSTs each batch as JSON to a push webhook"""
+
+    name = "push"
+    workers = 2
+
+    def __init__(self, url: str = None, token: str = None, timeout: float = 10):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def send_batch(self, notifications):
+        if not self.url:
+            # Not configured (NOTIFY_PUSH_URL): print instead
+            for notification in notifications:
+                print(f"[PUSH NOTIFICATION {notification['timestamp']}] {notification['message']}")
+            return
+        headers = {'Authorization': f"Bearer {self.token}"} if self.token else {}
+        response = self._session.post(
+            self.url,
+            data=json.dumps({'notifications': notifications}),
+            headers={'Content-Type': 'application/json', **headers},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+
+
+class _ChannelQueue:
+    """Queue, worker threads and counters of one channel"""
+
+    def __init__(self, channel: NotificationChannel, queue_size: int):
+        self.channel = channel
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_size)
+        self.pending = 0
+        self.idle = threading.Condition()
+        self.threads: List[threading.Thread] = []
+        self.stats = {'sent': 0, 'failed': 0, 'dropped': 0, 'deduplicated': 0, 'batches': 0, 'retries': 0}
+
+
+class NotificationDispatcher:
+    """Non-blocking notification queue with batching, retries and dedup"""
+
+    def __init__(self, channels: List[NotificationChannel], queue_size: int = 1000,
+                 batch_window: float = 0.5, dedup_window: float = 300.0,
+                 max_retries: int = 3, retry_backoff: float = 1.0):
+        self.queue_size = queue_size
+        self.batch_window = batch_window
+        self.dedup_window = dedup_window
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._recent: Dict[tuple, float] = {}  # (channel, source, message) -> last accepted
+        self._channels = {channel.name: _ChannelQueue(channel, queue_size) for channel in channels}
+
+    def configure(self, channels: List[NotificationChannel] = None, queue_size: int = None,
+                  batch_window: float = None, dedup_window: float = None, max_retries: int = None):
+        """Apply server settings before the first notification; channels replace those of the same name"""
+        with self._lock:
+            if any(target.threads for target in self._channels.values()):
+                raise RuntimeError("Notifications were already sent, configure the dispatcher first")
+            merged = {name: target.channel for name, target in self._channels.items()}
+            merged.update((channel.name, channel) for channel in channels or [])
+            self.queue_size = queue_size or self.queue_size
+            self._channels = {name: _ChannelQueue(channel, self.queue_size) for name, channel in merged.items()}
+            if batch_window is not None:
+                self.batch_window = batch_window
+            if dedup_window is not None:
+                self.dedup_window = dedup_window
+            if max_retries is not None:
+                self.max_retries = max_retries
+
+    @property
+    def channels(self) -> List[str]:
+        return list(self._channels)
+
+    def notify(self, message: str, method: str = 'console', source: str = None) -> bool:
+        """Queue a notification; False if it was a duplicate or could not be queued"""
+        target = self._channels.get(method)
+        if target is None:
+            raise ValueError(f"Unknown notification method: {method}")
+
+        now = time.monotonic()
+        key = (method, source, message)
+        with self._lock:
+            last = self._recent.get(key)
+            if last is not None and now - last < self.dedup_window:
+                target.stats['deduplicated'] += 1
+                return False
+            self._recent[key] = now
+            if len(self._recent) > 10000:
+                self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedup_window}
+            self._ensure_workers(target)
+
+        notification = {
+            'message': message,
+            'source': source,
+            'channel': method,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with target.idle:
+            target.pending += 1
+        try:
+            target.queue.put_nowait(notification)
+        except queue.Full:
+            self._done(target, 1)
+            with self._lock:
+                target.stats['dropped'] += 1
+                # Not delivered, so a retry of the same message must not count as a duplicate
+                if self._recent.get(key) == now:
+                    del self._recent[key]
+            logger.warning(f"Notification queue for {method} is full, dropping: {message}")
+            return False
+        return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far was delivered or given up on"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for target in self._channels.values():
+            with target.idle:
+                while target.pending:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    target.idle.wait(remaining)
+        return True
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                name: {**target.stats, 'queued': target.queue.qsize()}
+                for name, target in self._channels.items()
+            }
+
+    def shutdown(self, timeout: float = 5.0):
+        """Deliver what is queued, then stop the workers"""
+        self.flush(timeout)
+        self._stop.set()
+
+    # -------- internals --------
+
+    def _ensure_workers(self, target: _ChannelQueue):
+        """Start a channel's workers on first use (lock held)"""
+        if target.threads:
+            return
+        for i in range(max(1, target.channel.workers)):
+            thread = threading.Thread(
+                target=self._worker_loop, args=(target,),
+                name=f"notify-{target.channel.name}-{i}", daemon=True
+            )
+            target.threads.append(thread)
+            thread.start()
+
+    def _done(self, target: _ChannelQueue, count: int):
+        with target.idle:
+            target.pending -= count
+            if target.pending <= 0:
+                target.idle.notify_all()
+
+    def _next_batch(self, target: _ChannelQueue) -> Optional[List[Dict[str, Any]]]:
+        """Block for one notification, then collect more for up to batch_window"""
+        try:
+            batch = [target.queue.get(timeout=1.0)]
+        except queue.Empty:
+            return None
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < target.channel.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(target.queue.get(timeout=remaining) if remaining > 0 else target.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self, target: _ChannelQueue):
+        while not self._stop.is_set():
+            batch = self._next_batch(target)
+            if batch is None:
+                continue
+            try:
+                self._deliver(target, batch)
+            finally:
+                self._done(target, len(batch))
+
+    def _deliver(self, target: _ChannelQueue, batch: List[Dict[str, Any]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                target.channel.send_batch(batch)
+                with self._lock:
+                    target.stats['sent'] += len(batch)
+                    target.stats['batches'] += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    with self._lock:
+                        target.stats['failed'] += len(batch)
+                    logger.error(f"Giving up on {len(batch)} {target.channel.name} notification(s): {e}")
+                    return
+                with self._lock:
+                    target.stats['retries'] += 1
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"{target.channel.name} notification failed ({e}), retrying in {delay:.1f}s")
+                if self._stop.wait(delay):
+                    return
+
+
+# Shared by every automation in this process; the server applies the NOTIFY_* settings
+dispatcher = NotificationDispatcher([ConsoleChannel(), EmailChannel(), PushChannel()])
@@ -0,0 +1,169 @@
+"""
+Process Pool - run CPU-heavy automations outside the API process
+
+Automations that set `execution_mode = "process"` run in a shared pool of
+worker processes so their work doesn't hold the GIL of the Flask process.
+Iteration metrics, logs, emitted events, status notifications and the
+final outcome are relayed back to the automation object living in the API
+process.
+
+Each run gets its own token, so events still in flight from a previous run
+never reach a restarted automation. The pool runs at most max_workers
+automations at a time and refuses more instead of queueing them.
+"""
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import uuid
+from typing import Dict
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessPoolFullError(Exception):
+    """Every pool worker is already running an automation"""
+    pass
+
+
+def _run_in_process(module_name: str, class_name: str, automation_id: str,
+                    config: Dict, stop_flag, events, run: str):
+    """Entry point inside the pool process"""
+    module = importlib.import_module(module_name)
+    automation = getattr(module, class_name)(automation_id=automation_id)
+    automation.config = config
+    automation.stop_flag = stop_flag
+    automation.status = 'running'
+
+    observe = automation.metrics.observe
+
+    def relay_observe(duration, success=True):
+        observe(duration, success)
+        events.put((run, 'iteration', (duration, success)))
+
+    automation.metrics.observe = relay_observe
+    # Records are kept and written to disk by the API process
+    automation.logs.append = lambda record: events.put((run, 'log', record))
+    automation.set_event_callback(
+        lambda event_type, payload: events.put((run, 'event', (event_type, payload)))
+    )
+    automation.set_status_callback(
+        lambda status: events.put((run, 'status', {
+            'last_run': status.get('last_run'),
+            'error_message': status.get('error_message'),
+        }))
+    )
+
+    try:
+        automation.run()
+        events.put((run, 'finished', None))
+    except Exception as e:
+        events.put((run, 'finished', str(e) or type(e).__name__))
+
+
+class AutomationProcessPool:
+    """Shared process pool with an event relay back to the parent automations"""
+
+    def __init__(self, max_workers: int = None):
+        # spawn: forking a multi-threaded server process is not safe
+        self._context = multiprocessing.get_context('spawn')
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self._manager = self._context.Manager()
+        self._events = self._manager.Queue()
+        self._executor = None
+        self._lock = threading.Lock()
+        # run token -> (automation, future)
+        self._runs: Dict[str, tuple] = {}
+        threading.Thread(target=self._relay_loop, name='process-pool-relay', daemon=True).start()
+
+    def _get_executor(self, replace: bool = False) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or replace:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=self._context
+                )
+            return self._executor
+
+    def submit(self, automation, config: Dict):
+        """Run automation.run() in the pool, returns (stop_flag, future, run token)"""
+        run = uuid.uuid4().hex
+        with self._lock:
+            busy = sum(1 for _, future in self._runs.values() if future is None or not future.done())
+            if busy >= self.max_workers:
+                raise ProcessPoolFullError(
+                    f"All {self.max_workers} automation worker processes are busy "
+                    f"(AUTOMATION_PROCESS_POOL_SIZE)"
+                )
+            self._runs[run] = (automation, None)
+        stop_flag = self._manager.Event()
+        args = (
+            type(automation).__module__, type(automation).__name__,
+            automation.id, config, stop_flag, self._events, run
+        )
+        try:
+            try:
+                future = self._get_executor().submit(_run_in_process, *args)
+            except BrokenProcessPool:
+                # A worker died earlier; start a fresh pool
+                future = self._get_executor(replace=True).submit(_run_in_process, *args)
+        except Exception:
+            self._release(run)
+            raise
+        with self._lock:
+            if run in self._runs:
+                self._runs[run] = (automation, future)
+
+        def on_done(done):
+            error = done.exception()
+            if error is not None:
+                self._release(run)
+                automation._handle_process_event('finished', f"Worker process failed: {error}", run)
+
+        future.add_done_callback(on_done)
+        return stop_flag, future, run
+
+    def _release(self, run: str):
+        with self._lock:
+            self._runs.pop(run, None)
+
+    def _relay_loop(self):
+        while True:
+            try:
+                run, kind, payload = self._events.get()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                automation = self._runs.get(run, (None, None))[0]
+            if automation is None:
+                continue
+            if kind == 'finished':
+                self._release(run)
+            try:
+                automation._handle_process_event(kind, payload, run)
+            except Exception as e:
+                logger.error(f"Error relaying {kind} for {automation.id}: {e}")
+
+
+_pool = None
+_pool_size = None
+_pool_lock = threading.Lock()
+
+
+def configure_process_pool(max_workers: int = None):
+    """Size of the process-wide pool once it is created (None: one worker per CPU)"""
+    global _pool_size
+    with _pool_lock:
+        _pool_size = max_workers or None
+
+
+def get_process_pool() -> AutomationProcessPool:
+    """Process-wide pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AutomationProcessPool(max_workers=_pool_size)
+        return _pool
@@ -0,0 +1,86 @@
+"""
+Polling Scheduling - jitter, adaptive intervals and a shared request budget
+
+Monitors started together would otherwise poll in lockstep. Each monitor
+gets a random start offset and jittered waits, backs off while the page is
+unchanged and speeds up again when changes are frequent. All monitors in a
+process share one token bucket (MONITOR_MAX_RPS) for outgoing requests.
+"""
+import random
+import threading
+import time
+
+
+class AdaptiveInterval:
+    """Polling interval that grows while nothing changes and shrinks on changes"""
+
+    def __init__(self, base: float, min_interval: float = None, max_interval: float = None,
+                 backoff: float = 1.5, speedup: float = 0.5, jitter: float = 0.1):
+        self.base = max(float(base), 0.001)
+        self.min_interval = min_interval if min_interval is not None else self.base
+        self.max_interval = max_interval if max_interval is not None else self.base
+        self.min_interval = min(self.min_interval, self.base)
+        self.max_interval = max(self.max_interval, self.base)
+        self.backoff = backoff
+        self.speedup = speedup
+        self.jitter = jitter
+        self.current = self.base
+
+    def jittered(self, value: float) -> float:
+        """value +/- jitter fraction"""
+        if not self.jitter:
+            return value
+        return value * random.uniform(1 - self.jitter, 1 + self.jitter)  # nosec B311 - not crypto
+
+    def initial_delay(self) -> float:
+        """Random offset within the first interval so instances don't start in lockstep"""
+        if not self.jitter:
+            return 0.0
+        return random.uniform(0, self.base * self.jitter)  # nosec B311 - not crypto
+
+    def next(self, changed: bool = False) -> float:
+        """Adapt to the last result and return how long to wait"""
+        if changed:
+            self.current = max(self.min_interval, self.current * self.speedup)
+        else:
+            self.current = min(self.max_interval, self.current * self.backoff)
+        return self.jittered(self.current)
+
+
+class RequestBudget:
+    """Token bucket limiting requests per second across all monitors"""
+
+    def __init__(self, rate: float = 0.0, burst: float = None):
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+
+    def configure(self, rate: float, burst: float = None):
+        """rate <= 0 disables the budget"""
+        with self._lock:
+            self.rate = float(rate)
+            self.burst = float(burst) if burst else max(self.rate, 1.0)
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    def acquire(self, stop_flag: threading.Event = None) -> bool:
+        """Wait for a token; False if stop_flag was set while waiting"""
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    return True
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop_flag is not None:
+                if stop_flag.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+# Shared by every monitor in this process; the server applies MONITOR_MAX_RPS/MONITOR_BURST
+request_budget = RequestBudget()
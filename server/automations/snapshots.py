@@ -0,0 +1,295 @@
+"""
+Snapshots - compressed version history of monitored pages
+
+Every distinct version of a page is kept so a change can be inspected
+later (GET /api/snapshots/...). Versions are stored as deltas against a
+keyframe, the last full copy of the page:
+
+- The page is split into tokens after every '>' and newline, so minified
+  HTML diffs as well as line-oriented feeds.
+- A delta is a list of "copy this byte range of the keyframe" and
+  "insert these bytes" operations found by matching tokens, zlib-compressed
+  with the keyframe as preset dictionary so inserted text that resembles
+  the keyframe stays small.
+- A new keyframe is written every KEYFRAME_INTERVAL versions, or when a
+  delta would be larger than half the compressed keyframe.
+
+Any version is rebuilt from one keyframe and at most one delta. Retention
+drops versions beyond max_versions or older than max_age_days; keyframe
+files are removed once no retained version needs them.
+"""
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+KEYFRAME_INTERVAL = 20
+# zlib only looks back 32KB, so only the end of a longer keyframe is used
+ZDICT_SIZE = 32 * 1024
+MAX_PAGE_SIZE = 10 * 1024 * 1024
+# After '>' (unless a newline follows) and after newlines
+_TOKEN_BOUNDARY = re.compile(rb'(?<=>)(?!\n)|(?<=\n)')
+_TEXT_BOUNDARY = re.compile(_TOKEN_BOUNDARY.pattern.decode())
+_COPY = b'C'
+_INSERT = b'I'
+
+
+def tokenize(content: bytes) -> List[bytes]:
+    return [token for token in _TOKEN_BOUNDARY.split(content) if token]
+
+
+def encode_delta(base: bytes, content: bytes) -> bytes:
+    """Compressed delta that turns base into content"""
+    base_tokens = tokenize(base)
+    tokens = tokenize(content)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_tokens, tokens)
+    offsets = [0]
+    for token in base_tokens:
+        offsets.append(offsets[-1] + len(token))
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(_COPY + struct.pack('<II', offsets[i1], offsets[i2] - offsets[i1]))
+        elif j2 > j1:
+            data = b''.join(tokens[j1:j2])
+            ops.append(_INSERT + struct.pack('<I', len(data)) + data)
+    compressor = zlib.compressobj(9, zdict=base[-ZDICT_SIZE:])
+    return compressor.compress(b''.join(ops)) + compressor.flush()
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    decompressor = zlib.decompressobj(zdict=base[-ZDICT_SIZE:])
+    ops = decompressor.decompress(delta) + decompressor.flush()
+    parts = []
+    position = 0
+    while position < len(ops):
+        op = ops[position:position + 1]
+        if op == _COPY:
+            start, length = struct.unpack_from('<II', ops, position + 1)
+            parts.append(base[start:start + length])
+            position += 9
+        elif op == _INSERT:
+            (length,) = struct.unpack_from('<I', ops, position + 1)
+            parts.append(ops[position + 5:position + 5 + length])
+            position += 5 + length
+        else:
+            raise ValueError("Corrupt snapshot delta")
+    return b''.join(parts)
+
+
+def _diff_lines(text: str) -> List[str]:
+    """Text split like tokenize(), each piece ending in a newline for difflib"""
+    return [t if t.endswith('\n') else t + '\n' for t in _TEXT_BOUNDARY.split(text) if t]
+
+
+def page_key(url: str) -> str:
+    """Directory name (and API id) of a page's history"""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+class SnapshotStore:
+    """Per-URL version history in DATA_DIR/snapshots/<key>/"""
+
+    def __init__(self, directory: str = None, max_versions: int = 100, max_age_days: float = 30):
+        self.directory = directory
+        self.max_versions = max_versions
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+
+    def configure(self, directory: Optional[str], max_versions: int = None, max_age_days: float = None):
+        """Store under this directory from now on (None disables history)"""
+        with self._lock:
+            self.directory = directory
+            if max_versions is not None:
+                self.max_versions = max_versions
+            if max_age_days is not None:
+                self.max_age_days = max_age_days
+
+    def record(self, url: str, content: bytes, content_type: str = '') -> Optional[Dict[str, Any]]:
+        """Store a version of the page; None if unchanged since the last one (or disabled)"""
+        if not self.directory or len(content) > MAX_PAGE_SIZE:
+            return None
+        digest = hashlib.sha256(content).hexdigest()
+        key = page_key(url)
+        with self._lock:
+            index = self._load_index(key) or {'url': url, 'next_id': 1, 'versions': []}
+            versions = index['versions']
+            if versions and versions[-1]['sha256'] == digest:
+                return None
+            os.makedirs(self._page_dir(key), mode=0o755, exist_ok=True)
+
+            version_id = index['next_id']
+            index['next_id'] += 1
+            version = {
+                'id': version_id,
+                'time': time.time(),
+                'size': len(content),
+                'sha256': digest,
+                'content_type': content_type[:100],
+                'keyframe': version_id,
+            }
+            keyframe = self._latest_keyframe(versions)
+            if keyframe is not None and self._since_keyframe(versions, keyframe['id']) < KEYFRAME_INTERVAL:
+                base = self._read_file(key, f"k{keyframe['id']}.z")
+                base = zlib.decompress(base) if base is not None else None
+                if base is not None:
+                    delta = encode_delta(base, content)
+                    if len(delta) <= keyframe['stored'] / 2 and apply_delta(base, delta) == content:
+                        self._write_file(key, f"d{version_id}.z", delta)
+                        version.update(keyframe=keyframe['id'], stored=len(delta))
+            if version['keyframe'] == version_id:
+                data = zlib.compress(content, 9)
+                self._write_file(key, f"k{version_id}.z", data)
+                version['stored'] = len(data)
+            versions.append(version)
+            self._apply_retention(key, index)
+            self._save_index(key, index)
+            return dict(version)
+
+    def list_pages(self) -> List[Dict[str, Any]]:
+        """Pages with history: key, url, number of versions, bytes on disk"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        pages = []
+        with self._lock:
+            for key in sorted(os.listdir(self.directory)):
+                if not re.fullmatch(r'[0-9a-f]{32}', key):
+                    continue
+                index = self._load_index(key)
+                if index is None:
+                    continue
+                versions = index['versions']
+                pages.append({
+                    'key': key,
+                    'url': index['url'],
+                    'versions': len(versions),
+                    'latest': versions[-1]['time'] if versions else None,
+                    'stored_bytes': sum(v['stored'] for v in versions),
+                    'page_bytes': sum(v['size'] for v in versions),
+                })
+        return pages
+
+    def list_versions(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            index = self._require_index(key)
+            return {'key': key, 'url': index['url'], 'versions': [dict(v) for v in index['versions']]}
+
+    def get(self, key: str, version_id: int) -> bytes:
+        """Content of a version; ValueError if unknown"""
+        with self._lock:
+            index = self._require_index(key)
+            version = next((v for v in index['versions'] if v['id'] == version_id), None)
+            if version is None:
+                raise ValueError("Snapshot not found")
+            base = self._read_file(key, f"k{version['keyframe']}.z")
+            if base is None:
+                raise ValueError("Snapshot data is missing")
+            base = zlib.decompress(base)
+            if version['keyframe'] == version_id:
+                return base
+            delta = self._read_file(key, f"d{version_id}.z")
+            if delta is None:
+                raise ValueError("Snapshot data is missing")
+            return apply_delta(base, delta)
+
+    def diff(self, key: str, from_id: int, to_id: int, context: int = 3) -> str:
+        """Unified diff between two versions, split like the stored deltas"""
+        old = self.get(key, from_id).decode('utf-8', errors='replace')
+        new = self.get(key, to_id).decode('utf-8', errors='replace')
+        return ''.join(difflib.unified_diff(
+            _diff_lines(old), _diff_lines(new), fromfile=f"version {from_id}", tofile=f"version {to_id}", n=context
+        ))
+
+    def _page_dir(self, key: str) -> str:
+        if not re.fullmatch(r'[0-9a-f]{32}', key or ''):
+            raise ValueError("Snapshot history not found")
+        return os.path.join(self.directory, key)
+
+    def _latest_keyframe(self, versions: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not versions:
+            return None
+        keyframe_id = versions[-1]['keyframe']
+        return next((v for v in versions if v['id'] == keyframe_id), None)
+
+    @staticmethod
+    def _since_keyframe(versions: List[Dict[str, Any]], keyframe_id: int) -> int:
+        return sum(1 for v in versions if v['keyframe'] == keyframe_id)
+
+    def _apply_retention(self, key: str, index: Dict[str, Any]):
+        """Drop old versions and files no retained version needs (lock held)"""
+        versions = index['versions']
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days else None
+        keep = [v for v in versions if cutoff is None or v['time'] >= cutoff]
+        keep = keep[-self.max_versions:] if self.max_versions else keep
+        if not keep:
+            keep = versions[-1:]  # always keep the latest version
+        needed = {v['keyframe'] for v in keep}
+        kept_ids = {v['id'] for v in keep}
+        for version in versions:
+            if version['id'] not in kept_ids:
+                if version['keyframe'] != version['id']:
+                    self._remove_file(key, f"d{version['id']}.z")
+                elif version['id'] not in needed:
+                    self._remove_file(key, f"k{version['id']}.z")
+        # Keyframes of dropped versions, kept while retained deltas need them
+        for keyframe_id in index.get('orphan_keyframes', []):
+            if keyframe_id not in needed:
+                self._remove_file(key, f"k{keyframe_id}.z")
+        index['versions'] = [v for v in versions if v['id'] in kept_ids]
+        index['orphan_keyframes'] = sorted(needed - kept_ids)
+
+    def _require_index(self, key: str) -> Dict[str, Any]:
+        index = self._load_index(key) if self.directory else None
+        if index is None:
+            raise ValueError("Snapshot history not found")
+        return index
+
+    def _load_index(self, key: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._page_dir(key), 'index.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read snapshot index {key}: {e}")
+            return None
+
+    def _save_index(self, key: str, index: Dict[str, Any]):
+        path = os.path.join(self._page_dir(key), 'index.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(path + '.tmp', path)
+
+    def _read_file(self, key: str, name: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self._page_dir(key), name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, key: str, name: str, data: bytes):
+        path = os.path.join(self._page_dir(key), name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def _remove_file(self, key: str, name: str):
+        try:
+            os.remove(os.path.join(self._page_dir(key), name))
+        except FileNotFoundError:
+            pass
+
+
+# Shared by all monitors in this process
+snapshot_store = SnapshotStore()
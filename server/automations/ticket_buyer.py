@@ -1,13 +1,29 @@
 from .base import BaseAutomation
-from typing import Dict, Any, List
+from .metrics import IterationMetrics
+from .scheduling import AdaptiveInterval, request_budget
+from .ticket_providers import PROVIDERS, create_provider, filter_trains, query_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
 import time
 from datetime import datetime, timedelta
 import requests
+from requests.adapters import HTTPAdapter
+
+
+# Connections are opened this many seconds before the fast polling starts
+SNIPE_WARMUP_SECONDS = 5
 
 
 class TicketBuyerAutomation(BaseAutomation):
     """Automation for monitoring and buying train tickets"""
     
+    def __init__(self, automation_id: str = None):
+        super().__init__(automation_id)
+        # Latency of individual requests made while sniping
+        self.attempt_metrics = IterationMetrics(recent_size=50)
+        self.snipe_phase = None
+        self._provider = None
+    
     def get_name(self) -> str:
         return "Ticket Buyer"
     
@@ -48,12 +64,67 @@ class TicketBuyerAutomation(BaseAutomation):
                 "type": "text",
                 "required": True
             },
+            {
+                "key": "provider",
+                "label": "Ticket Provider",
+                "type": "select",
+                "options": list(PROVIDERS),
+                "required": False,
+                "default": "http_json"
+            },
+            {
+                "key": "provider_url",
+                "label": "Provider API URL",
+                "type": "text",
+                "required": False
+            },
             {
                 "key": "check_interval",
                 "label": "Check Interval (seconds)",
                 "type": "number",
                 "required": False,
                 "default": "300"
+            },
+            {
+                "key": "release_date",
+                "label": "Tickets On Sale Date (optional)",
+                "type": "date",
+                "required": False
+            },
+            {
+                "key": "release_time",
+                "label": "Tickets On Sale Time",
+                "type": "time",
+                "required": False,
+                "default": "00:00"
+            },
+            {
+                "key": "snipe_lead_seconds",
+                "label": "Start Fast Polling Before Sale (seconds)",
+                "type": "number",
+                "required": False,
+                "default": "30"
+            },
+            {
+                "key": "snipe_interval_ms",
+                "label": "Fast Polling Interval (milliseconds)",
+                "type": "number",
+                "required": False,
+                "default": "500"
+            },
+            {
+                "key": "snipe_parallelism",
+                "label": "Parallel Requests While Sniping",
+                "type": "number",
+                "required": False,
+                "default": "4"
+            },
+            {
+                "key": "snipe_duration",
+                "label": "Keep Fast Polling After Sale Start (seconds)",
+                "type": "number",
+                "required": False,
+                "default": "300"
             }
         ]
     
@@ -65,35 +136,176 @@ class TicketBuyerAutomation(BaseAutomation):
         from_station = self.config.get('from_station')
         to_station = self.config.get('to_station')
         check_interval = int(self.config.get('check_interval', 300))
+        self._provider = None  # config may have changed since the last run
+        
+        # Tickets keep a steady pace, only jittered so instances don't poll in lockstep
+        interval = AdaptiveInterval(check_interval)
         
-        print(f"Starting ticket monitoring: {from_station} -> {to_station} on {date} between {time_start}-{time_end}")
+        self.log(
+            f"Starting ticket monitoring: {from_station} -> {to_station} on {date} between {time_start}-{time_end}"
+        )
+        
+        release_at = self._parse_release_at()
+        if release_at is not None:
+            found = self.snipe(release_at, date, time_start, time_end, from_station, to_station)
+            if found:
+                self.log(f"Tickets found while sniping: {found}", trains=found)
+                return
+            if self.stop_flag.is_set():
+                return
+            self.log("Sniping window over, falling back to regular checks")
+        
+        self.stop_flag.wait(interval.initial_delay())
         
         while not self.stop_flag.is_set():
             try:
-                # This is where you'd implement your actual ticket checking logic
-                # For now, it's a placeholder that simulates checking
-                print(f"Checking tickets for {date} {time_start}-{time_end}...")
-                
-                # Simulate API call to ticket service
-                # available = self.check_ticket_availability(date, time_start, time_end, from_station, to_station)
+                if not request_budget.acquire(self.stop_flag):
+                    break
+                with self.track_iteration():
+                    self.log(f"Checking tickets for {date} {time_start}-{time_end}...", "debug")
+                    available = self.check_ticket_availability(
+                        date, time_start, time_end, from_station, to_station, max_age=check_interval
+                    )
                 
-                # Placeholder: randomly simulate availability check
-                # In real implementation, replace with actual API calls
+                if available:
+                    self.log(f"Tickets available: {available}", trains=available)
+                    return
                 
                 # Wait for the specified interval or until stop is requested
-                self.stop_flag.wait(check_interval)
+                self.stop_flag.wait(interval.next())
                 
             except Exception as e:
-                print(f"Error checking tickets: {e}")
-                self.stop_flag.wait(60)  # Wait a minute before retrying
+                self.log(f"Error checking tickets: {e}", "error")
+                self.stop_flag.wait(interval.jittered(60))  # Wait a minute before retrying
     
-    def check_ticket_availability(self, date, time_start, time_end, from_station, to_station):
+    def _parse_release_at(self) -> Optional[datetime]:
+        """On-sale moment from config, None when sniping is not configured"""
+        release_date = self.config.get('release_date')
+        if not release_date:
+            return None
+        release_time = self.config.get('release_time') or '00:00'
+        return datetime.strptime(f"{release_date} {release_time}", "%Y-%m-%d %H:%M")
+    
+    def snipe(self, release_at: datetime, date, time_start, time_end, from_station, to_station):
         """
-        Placeholder for actual ticket checking logic
-        Replace this with your actual implementation
+        Idle until shortly before release_at, pre-warm connections, then poll at
+        sub-second intervals with `snipe_parallelism` concurrent requests that
+        bypass the query cache; the first one that finds seats wins.
+        Returns the first availability result, or None when the window passed.
         """
-        # Example:
-        # response = requests.get(f"https://ticket-api.com/search?date={date}&from={from_station}&to={to_station}")
-        # return response.json()
-        pass
-
+        lead = float(self.config.get('snipe_lead_seconds', 30))
+        tick = max(int(self.config.get('snipe_interval_ms', 500)), 50) / 1000.0
+        parallelism = min(max(int(self.config.get('snipe_parallelism', 4)), 1), 32)
+        duration = float(self.config.get('snipe_duration', 300))
+        
+        start_at = release_at - timedelta(seconds=lead)
+        end_at = release_at + timedelta(seconds=duration)
+        if datetime.now() >= end_at:
+            return None
+        
+        # Idle until it's time to warm up
+        self.snipe_phase = 'waiting'
+        idle = (start_at - datetime.now()).total_seconds() - SNIPE_WARMUP_SECONDS
+        if idle > 0:
+            self.log(f"Sniping starts at {start_at.isoformat()}, idling {idle:.0f}s")
+            if self.stop_flag.wait(idle):
+                return None
+        
+        self.snipe_phase = 'warming'
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=parallelism, pool_maxsize=parallelism)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='snipe') as pool:
+                list(pool.map(lambda _: self.warm_up(session), range(parallelism)))
+                
+                remaining = (start_at - datetime.now()).total_seconds()
+                if remaining > 0 and self.stop_flag.wait(remaining):
+                    return None
+                
+                self.snipe_phase = 'sniping'
+                self.log(f"Sniping {from_station} -> {to_station}: {parallelism} parallel requests every {tick}s")
+                # Requests are paced by the tick, not by the shared monitor budget
+                next_tick = time.monotonic()
+                while not self.stop_flag.is_set() and datetime.now() < end_at:
+                    with self.track_iteration():
+                        attempts = [
+                            pool.submit(self._timed_attempt, session, date, time_start, time_end,
+                                        from_station, to_station)
+                            for _ in range(parallelism)
+                        ]
+                        found = next((f.result() for f in as_completed(attempts) if f.result()), None)
+                    if found:
+                        return found
+                    next_tick += tick
+                    delay = next_tick - time.monotonic()
+                    if delay < 0:
+                        # Requests took longer than the tick; don't burst to catch up
+                        next_tick = time.monotonic()
+                    elif self.stop_flag.wait(delay):
+                        break
+        finally:
+            session.close()
+            self.snipe_phase = 'done'
+        return None
+    
+    def _timed_attempt(self, session, date, time_start, time_end, from_station, to_station):
+        """One upstream availability request with its latency recorded"""
+        started = time.perf_counter()
+        try:
+            # Not through the query cache: it would merge the parallel attempts into one request
+            result = self.check_ticket_availability(
+                date, time_start, time_end, from_station, to_station, session=session, use_cache=False
+            )
+        except Exception as e:
+            self.attempt_metrics.observe(time.perf_counter() - started, success=False)
+            self.log(f"Snipe attempt failed: {e}", "warning")
+            return None
+        self.attempt_metrics.observe(time.perf_counter() - started, success=True)
+        return result
+    
+    def warm_up(self, session: requests.Session):
+        """Open connections to the ticket service before sniping starts"""
+        provider = self.get_provider()
+        if provider is not None:
+            provider.warm_up(session)
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Status including sniping phase and per-attempt latency"""
+        status = super().get_status()
+        if self.snipe_phase is not None:
+            status["snipe"] = {
+                "phase": self.snipe_phase,
+                "attempts": self.attempt_metrics.snapshot(),
+            }
+        return status
+    
+    def get_provider(self):
+        """Provider adapter from config, None when no provider URL is configured"""
+        if self._provider is None and self.config.get('provider_url'):
+            self._provider = create_provider(
+                self.config.get('provider') or 'http_json', self.config['provider_url']
+            )
+        return self._provider
+    
+    def check_ticket_availability(self, date, time_start, time_end, from_station, to_station,
+                                  session: requests.Session = None, max_age: float = None,
+                                  use_cache: bool = True):
+        """
+        Trains in the time range with free seats, or None.
+        The route query is shared with other automations through the query cache
+        unless use_cache is False; max_age bounds how stale a shared result may be.
+        """
+        provider = self.get_provider()
+        if provider is None:
+            return None
+        if use_cache:
+            key = (provider.cache_key, from_station, to_station, date)
+            trains = query_cache.get_or_fetch(
+                key, lambda: provider.search(from_station, to_station, date, session=session), max_age=max_age
+            )
+        else:
+            trains = provider.search(from_station, to_station, date, session=session)
+        return filter_trains(trains, time_start, time_end) or None
@@ -0,0 +1,181 @@
+"""
+Ticket Providers - adapters for ticket search APIs and a shared query cache
+
+Every TicketBuyerAutomation watching the same (provider, from, to, date)
+shares one upstream query per cache interval: results are kept for a TTL
+and concurrent lookups of the same key wait for the single request in flight.
+
+Add a provider by subclassing TicketProvider and registering it in PROVIDERS.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import requests
+
+
+class TicketProvider(ABC):
+    """Adapter for one ticket search API"""
+
+    name = "base"
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the upstream; instances with the same key share cached results"""
+        return self.name
+
+    @abstractmethod
+    def search(self, from_station: str, to_station: str, date: str,
+               session: requests.Session = None) -> List[Dict[str, Any]]:
+        """
+        Return all trains for the route and date:
+        [{"train": "IC 123", "departure": "HH:MM", "seats": 12}, ...]
+        """
+        pass
+
+    def warm_up(self, session: requests.Session):
+        """Open connections before time-critical polling"""
+        pass
+
+
+class HttpJsonProvider(TicketProvider):
+    """
+    Generic JSON API:
+    GET <url>/search?from=..&to=..&date=YYYY-MM-DD -> [{"train", "departure", "seats"}, ...]
+    (a {"trains": [...]} envelope is accepted too)
+    """
+
+    name = "http_json"
+
+    def __init__(self, base_url: str, timeout: float = 10):
+        if not base_url or not base_url.startswith(('http://', 'https://')):
+            raise ValueError("Provider URL must start with http:// or https://")
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}:{self.base_url}"
+
+    def search(self, from_station, to_station, date, session=None):
+        http = session or requests
+        response = http.get(
+            f"{self.base_url}/search",
+            params={'from': from_station, 'to': to_station, 'date': date},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        if isinstance(data, dict):
+            data = data.get('trains', [])
+        return [train for train in data if isinstance(train, dict)]
+
+    def warm_up(self, session):
+        session.head(self.base_url, timeout=self.timeout)
+
+
+# Register all available providers here
+PROVIDERS = {
+    HttpJsonProvider.name: HttpJsonProvider,
+}
+
+
+def create_provider(name: str, url: str) -> TicketProvider:
+    """Instantiate a registered provider"""
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown ticket provider: {name}")
+    return PROVIDERS[name](url)
+
+
+class _Inflight:
+    """A lookup in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TicketQueryCache:
+    """TTL-bounded LRU cache with single-flight lookups"""
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (fetched_at, result)
+        self._inflight: Dict[Hashable, _Inflight] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any], max_age: Optional[float] = None) -> Any:
+        """Cached result for key if younger than max_age (default ttl), else fetch once for everyone"""
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            inflight = self._inflight.get(key)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[key] = _Inflight()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not owner:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.result
+
+        try:
+            inflight.result = fetch()
+            with self._lock:
+                self._entries[key] = (time.monotonic(), inflight.result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return inflight.result
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.done.set()
+
+    def configure(self, ttl: float):
+        with self._lock:
+            self.ttl = ttl
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Shared by every TicketBuyerAutomation in this process; the server applies TICKET_CACHE_TTL
+query_cache = TicketQueryCache()
+
+
+def _seats(train: Dict[str, Any]) -> int:
+    """Free seats of a train: an omitted count means available, one that is not a number none"""
+    try:
+        return int(train.get('seats', 1))
+    except (TypeError, ValueError):
+        return 0
+
+
+def filter_trains(trains: List[Dict[str, Any]], time_start: str, time_end: str) -> List[Dict[str, Any]]:
+    """Trains departing within [time_start, time_end] that still have seats"""
+    start = time_start or '00:00'
+    end = time_end or '23:59'
+    return [
+        train for train in trains
+        if start <= str(train.get('departure', ''))[:5] <= end and _seats(train) > 0
+    ]
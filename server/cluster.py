@@ -0,0 +1,331 @@
+"""
+Automation Cluster - run automations on a pool of worker processes/nodes
+
+The API server acts as coordinator: it keeps the desired set of running
+automations and hands them out as time-limited leases. Workers heartbeat
+with the status of everything they run; the heartbeat renews their leases
+and returns new assignments and revocations. When a worker stops
+heartbeating its leases expire and the automations are re-assigned to the
+remaining workers.
+
+Run a worker:
+  API_KEY=... python cluster.py worker --coordinator http://server:5000
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = frozenset({'stopped', 'error'})
+
+
+class AutomationCoordinator:
+    """Lease table of automations to worker nodes"""
+
+    def __init__(self, lease_ttl: float = 15.0, heartbeat_interval: float = 5.0):
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self._lock = threading.Lock()
+        self.workers: Dict[str, Dict[str, Any]] = {}
+        self.desired: Dict[str, Dict[str, Any]] = {}   # automation id -> {type, config}
+        self.leases: Dict[str, Dict[str, Any]] = {}    # automation id -> {worker_id, expires, epoch}
+        self._epoch = 0
+        self.report_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self._reaper = threading.Thread(target=self._reap_loop, name='cluster-reaper', daemon=True)
+        self._reaper.start()
+
+    def set_report_callback(self, callback: Callable[[str, Dict[str, Any]], None]):
+        """Called with (automation_id, status) for every status reported by a worker"""
+        self.report_callback = callback
+
+    # -------- desired state (API side) --------
+
+    def submit(self, automation_id: str, automation_type: str, config: Dict[str, Any]):
+        """Request that an automation runs somewhere in the cluster"""
+        with self._lock:
+            self.desired[automation_id] = {'type': automation_type, 'config': config}
+            # A restart with new config must not keep the old lease
+            self.leases.pop(automation_id, None)
+
+    def withdraw(self, automation_id: str):
+        """Request that an automation stops wherever it runs"""
+        with self._lock:
+            self.desired.pop(automation_id, None)
+            self.leases.pop(automation_id, None)
+
+    def placement(self, automation_id: str) -> Optional[str]:
+        """Worker currently holding the automation's lease"""
+        with self._lock:
+            lease = self.leases.get(automation_id)
+            return lease['worker_id'] if lease else None
+
+    def list_workers(self) -> List[Dict[str, Any]]:
+        """Known workers with their load"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            load = self._load()
+            return [
+                {
+                    'id': worker_id,
+                    'host': info.get('host'),
+                    'capacity': info['capacity'],
+                    'running': load.get(worker_id, 0),
+                    'seconds_since_heartbeat': round(now - info['last_heartbeat'], 3),
+                }
+                for worker_id, info in sorted(self.workers.items())
+            ]
+
+    # -------- worker side --------
+
+    def heartbeat(self, worker_id: str, capacity: int, running: Dict[str, Dict[str, Any]],
+                  host: str = None) -> Dict[str, Any]:
+        """Register a heartbeat and return assignments/revocations for the worker"""
+        now = time.monotonic()
+        reports = []
+        revoke = []
+        assignments = []
+
+        with self._lock:
+            self.workers[worker_id] = {
+                'capacity': max(0, int(capacity)),
+                'host': host,
+                'last_heartbeat': now,
+            }
+            self._expire(now)
+
+            for automation_id, status in running.items():
+                lease = self.leases.get(automation_id)
+                owned = lease is not None and lease['worker_id'] == worker_id \
+                    and lease['epoch'] == status.get('epoch')
+                if not owned or automation_id not in self.desired:
+                    revoke.append(automation_id)
+                    continue
+
+                lease['expires'] = now + self.lease_ttl
+                reports.append((automation_id, status))
+                if status.get('status') in FINISHED_STATUSES:
+                    # Finished on its own (or failed) - same as a local run ending
+                    self.desired.pop(automation_id, None)
+                    self.leases.pop(automation_id, None)
+                    revoke.append(automation_id)
+
+            # Leases granted but not yet confirmed by this worker stay valid until they expire
+            load = self._load()
+            spare = self.workers[worker_id]['capacity'] - load.get(worker_id, 0)
+            other_loads = [
+                load.get(w, 0) for w, info in self.workers.items()
+                if w != worker_id and load.get(w, 0) < info['capacity']
+            ]
+
+            # Hand one automation per heartbeat back when another worker is much less busy
+            if other_loads and load.get(worker_id, 0) > min(other_loads) + 1:
+                for automation_id, lease in self.leases.items():
+                    if lease['worker_id'] == worker_id and automation_id not in revoke:
+                        del self.leases[automation_id]
+                        revoke.append(automation_id)
+                        load[worker_id] -= 1
+                        break
+            for automation_id, spec in self.desired.items():
+                if spare <= 0:
+                    break
+                if automation_id in self.leases:
+                    continue
+                # Leave work for a less loaded worker if there is one
+                if other_loads and load.get(worker_id, 0) > min(other_loads):
+                    break
+                self._epoch += 1
+                self.leases[automation_id] = {
+                    'worker_id': worker_id,
+                    'expires': now + self.lease_ttl,
+                    'epoch': self._epoch,
+                }
+                load[worker_id] = load.get(worker_id, 0) + 1
+                spare -= 1
+                assignments.append({
+                    'id': automation_id,
+                    'type': spec['type'],
+                    'config': spec['config'],
+                    'epoch': self._epoch,
+                })
+
+        for automation_id, status in reports:
+            self._report(automation_id, status)
+
+        return {
+            'assignments': assignments,
+            'revoke': revoke,
+            'lease_ttl': self.lease_ttl,
+            'heartbeat_interval': self.heartbeat_interval,
+        }
+
+    # -------- internals --------
+
+    def _load(self) -> Dict[str, int]:
+        """Leases per worker (lock held)"""
+        load: Dict[str, int] = {}
+        for lease in self.leases.values():
+            load[lease['worker_id']] = load.get(lease['worker_id'], 0) + 1
+        return load
+
+    def _expire(self, now: float):
+        """Drop dead workers and expired leases (lock held)"""
+        dead = [w for w, info in self.workers.items() if now - info['last_heartbeat'] > self.lease_ttl]
+        for worker_id in dead:
+            logger.warning(f"Worker {worker_id} missed heartbeats, rebalancing its automations")
+            del self.workers[worker_id]
+        for automation_id, lease in list(self.leases.items()):
+            if lease['expires'] < now or lease['worker_id'] in dead:
+                del self.leases[automation_id]
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(self.lease_ttl / 2, 0.5))
+            with self._lock:
+                self._expire(time.monotonic())
+
+    def _report(self, automation_id: str, status: Dict[str, Any]):
+        if self.report_callback:
+            try:
+                self.report_callback(automation_id, status)
+            except Exception as e:
+                logger.error(f"Error handling report for {automation_id}: {e}")
+
+
+class AutomationWorker:
+    """Runs automations leased from a coordinator"""
+
+    def __init__(self, coordinator_url: str, api_key: str = None, worker_id: str = None,
+                 capacity: int = 10, heartbeat_interval: float = 5.0):
+        from automations import AVAILABLE_AUTOMATIONS
+
+        self.coordinator_url = coordinator_url.rstrip('/')
+        self.api_key = api_key
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.capacity = capacity
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_ttl = heartbeat_interval * 3
+        self.automation_classes = {cls.__name__: cls for cls in AVAILABLE_AUTOMATIONS}
+        self.automations: Dict[str, Any] = {}
+        self.epochs: Dict[str, int] = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._last_contact = time.monotonic()
+
+    def _running_report(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for automation_id, automation in list(self.automations.items()):
+            status = automation.get_status()
+            status['epoch'] = self.epochs.get(automation_id)
+            report[automation_id] = status
+        return report
+
+    def _heartbeat(self, session) -> Dict[str, Any]:
+        headers = {'X-API-Key': self.api_key} if self.api_key else {}
+        response = session.post(
+            f"{self.coordinator_url}/api/cluster/heartbeat",
+            json={
+                'worker_id': self.worker_id,
+                'capacity': self.capacity,
+                'host': socket.gethostname(),
+                'running': self._running_report(),
+            },
+            headers=headers,
+            timeout=self.heartbeat_interval
+        )
+        response.raise_for_status()
+        return response.json()['data']
+
+    def _apply(self, plan: Dict[str, Any]):
+        for automation_id in plan.get('revoke', []):
+            automation = self.automations.pop(automation_id, None)
+            self.epochs.pop(automation_id, None)
+            if automation is not None:
+                automation.stop()
+
+        for assignment in plan.get('assignments', []):
+            automation_class = self.automation_classes.get(assignment['type'])
+            if automation_class is None:
+                logger.error(f"Unknown automation type: {assignment['type']}")
+                continue
+            automation = automation_class(automation_id=assignment['id'])
+            # Report status changes right away instead of waiting for the next beat
+            automation.set_status_callback(lambda status: self._wakeup.set())
+            self.automations[assignment['id']] = automation
+            self.epochs[assignment['id']] = assignment['epoch']
+            automation.start(assignment['config'])
+            logger.info(f"Started {assignment['type']} {assignment['id']}")
+
+        self.lease_ttl = plan.get('lease_ttl', self.lease_ttl)
+        self.heartbeat_interval = plan.get('heartbeat_interval', self.heartbeat_interval)
+
+    def stop_all(self):
+        for automation in self.automations.values():
+            automation.stop()
+        self.automations.clear()
+        self.epochs.clear()
+
+    def run(self):
+        """Heartbeat loop, returns when stop() is called"""
+        import requests
+
+        session = requests.Session()
+        while not self._stop.is_set():
+            try:
+                self._apply(self._heartbeat(session))
+                self._last_contact = time.monotonic()
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {e}")
+                # Our leases are gone by now and may be running elsewhere
+                if time.monotonic() - self._last_contact > self.lease_ttl and self.automations:
+                    logger.warning("Lost contact with coordinator, stopping local automations")
+                    self.stop_all()
+            self._wakeup.wait(self.heartbeat_interval)
+            self._wakeup.clear()
+        self.stop_all()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Automation cluster worker')
+    sub = parser.add_subparsers(dest='command', required=True)
+    worker = sub.add_parser('worker', help='Run automations leased from a coordinator')
+    worker.add_argument('--coordinator', required=True, help='Coordinator base URL')
+    worker.add_argument('--worker-id', help='Stable worker id (default: hostname + random suffix)')
+    worker.add_argument('--capacity', type=int, default=10, help='Max automations on this worker')
+    worker.add_argument('--interval', type=float, default=5.0, help='Heartbeat interval in seconds')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    node = AutomationWorker(
+        args.coordinator,
+        api_key=os.environ.get('API_KEY'),
+        worker_id=args.worker_id,
+        capacity=args.capacity,
+        heartbeat_interval=args.interval
+    )
+    logger.info(f"Worker {node.worker_id} joining {args.coordinator}")
+    try:
+        node.run()
+    except KeyboardInterrupt:
+        node.stop()
+        node.stop_all()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
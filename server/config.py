@@ -2,16 +2,27 @@
 Security Configuration - Production-Ready Settings
 """
 import os
+import ipaddress
 import secrets
 import re
-from functools import wraps
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
 from flask import request, jsonify, g
-from datetime import datetime
 import logging
+import metrics
+from api_keys import ApiKeyStore
+from audit import audit_trail
 
 # Security logger
 security_logger = logging.getLogger('security')
 
+RATE_LIMIT_REJECTIONS = metrics.counter(
+    'rate_limit_rejections_total', 'Requests rejected by the rate limiter'
+)
+
 
 class Config:
     """Application configuration from environment variables"""
@@ -30,6 +41,9 @@ class Config:
     RATE_LIMIT_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE', '60'))
     RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
     
+    # Reverse proxies (IPs/CIDRs) whose X-Forwarded-For header is trusted
+    TRUSTED_PROXIES = [p for p in os.environ.get('TRUSTED_PROXIES', '').split(',') if p.strip()]
+    
     # TLS/SSL
     SSL_CERT = os.environ.get('SSL_CERT')
     SSL_KEY = os.environ.get('SSL_KEY')
@@ -40,6 +54,88 @@ class Config:
     PORT = int(os.environ.get('PORT', '5000'))
     DEBUG = os.environ.get('DEBUG', 'false').lower() == 'true'
     
+    # Persistent data (automation logs, ...)
+    DATA_DIR = os.path.realpath(os.environ.get('DATA_DIR') or os.path.join(os.path.dirname(__file__), 'data'))
+    
+    # Additional hashed API keys with per-key quotas, reloaded on change (see api_keys.py)
+    API_KEYS_FILE = os.environ.get('API_KEYS_FILE') or os.path.join(DATA_DIR, 'api_keys.json')
+    
+    # Run .py scripts as forks of a warm interpreter with these modules preloaded
+    SCRIPT_FORKSERVER = os.environ.get('SCRIPT_FORKSERVER', 'false').lower() == 'true'
+    SCRIPT_FORKSERVER_PRELOAD = [
+        m.strip() for m in os.environ.get(
+            'SCRIPT_FORKSERVER_PRELOAD', 'json,re,datetime,subprocess,urllib.request,logging'
+        ).split(',') if m.strip()
+    ]
+    
+    # Resource limits for every script run, e.g. "cpu=300 memory=1G files=256 nice=5 io=idle"
+    # (see script_directives.py); a script's own @limits can only tighten them
+    SCRIPT_LIMITS = os.environ.get('SCRIPT_LIMITS', '')
+    
+    # Disk budget of cached results of @cache scripts (DATA_DIR/script-cache)
+    SCRIPT_CACHE_MAX_BYTES = int(os.environ.get('SCRIPT_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+    
+    # Webhooks: calls waiting to be delivered before POST /api/hooks/<name>
+    # answers 503, and the largest accepted request body
+    HOOK_QUEUE_SIZE = int(os.environ.get('HOOK_QUEUE_SIZE', '100'))
+    HOOK_MAX_PAYLOAD_BYTES = int(os.environ.get('HOOK_MAX_PAYLOAD_BYTES', str(256 * 1024)))
+    
+    # Events waiting for each rule before further ones are dropped
+    RULE_QUEUE_SIZE = int(os.environ.get('RULE_QUEUE_SIZE', '100'))
+    
+    # Log records kept in memory per automation
+    AUTOMATION_LOG_BUFFER = int(os.environ.get('AUTOMATION_LOG_BUFFER', '500'))
+    
+    # Worker processes for execution_mode = "process" automations (0: one per CPU)
+    AUTOMATION_PROCESS_POOL_SIZE = int(os.environ.get('AUTOMATION_PROCESS_POOL_SIZE', '0'))
+    
+    # Requests per second shared by all monitors (0 disables the budget)
+    MONITOR_MAX_RPS = float(os.environ.get('MONITOR_MAX_RPS', '0'))
+    MONITOR_BURST = float(os.environ.get('MONITOR_BURST', '0'))
+    
+    # Seconds a train query result is shared between ticket buyers
+    TICKET_CACHE_TTL = float(os.environ.get('TICKET_CACHE_TTL', '30'))
+    
+    # Notifications - SMTP for email, a JSON webhook for push
+    NOTIFY_SMTP_HOST = os.environ.get('NOTIFY_SMTP_HOST')
+    NOTIFY_SMTP_PORT = int(os.environ.get('NOTIFY_SMTP_PORT', '587'))
+    NOTIFY_SMTP_USER = os.environ.get('NOTIFY_SMTP_USER')
+    NOTIFY_SMTP_PASSWORD = os.environ.get('NOTIFY_SMTP_PASSWORD')
+    NOTIFY_SMTP_TLS = os.environ.get('NOTIFY_SMTP_TLS', 'true').lower() == 'true'
+    NOTIFY_EMAIL_FROM = os.environ.get('NOTIFY_EMAIL_FROM')
+    NOTIFY_EMAIL_TO = [r.strip() for r in os.environ.get('NOTIFY_EMAIL_TO', '').split(',') if r.strip()]
+    NOTIFY_PUSH_URL = os.environ.get('NOTIFY_PUSH_URL')
+    NOTIFY_PUSH_TOKEN = os.environ.get('NOTIFY_PUSH_TOKEN')
+    NOTIFY_QUEUE_SIZE = int(os.environ.get('NOTIFY_QUEUE_SIZE', '1000'))
+    NOTIFY_BATCH_WINDOW = float(os.environ.get('NOTIFY_BATCH_WINDOW', '0.5'))
+    NOTIFY_DEDUP_WINDOW = float(os.environ.get('NOTIFY_DEDUP_WINDOW', '300'))
+    NOTIFY_MAX_RETRIES = int(os.environ.get('NOTIFY_MAX_RETRIES', '3'))
+    
+    # Page versions kept by news monitors (DATA_DIR/snapshots), per URL
+    SNAPSHOT_MAX_VERSIONS = int(os.environ.get('SNAPSHOT_MAX_VERSIONS', '100'))
+    SNAPSHOT_MAX_AGE_DAYS = float(os.environ.get('SNAPSHOT_MAX_AGE_DAYS', '30'))
+    
+    # Audit trail in DATA_DIR/audit, rotated by size
+    AUDIT_LOG_MAX_BYTES = int(os.environ.get('AUDIT_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    AUDIT_LOG_BACKUPS = int(os.environ.get('AUDIT_LOG_BACKUPS', '5'))
+    
+    # Cluster - "standalone" runs automations in this process, "coordinator"
+    # leases them to worker nodes started with: python cluster.py worker
+    CLUSTER_MODE = os.environ.get('CLUSTER_MODE', 'standalone').lower()
+    CLUSTER_LEASE_TTL = float(os.environ.get('CLUSTER_LEASE_TTL', '15'))
+    CLUSTER_HEARTBEAT_INTERVAL = float(os.environ.get('CLUSTER_HEARTBEAT_INTERVAL', '5'))
+    
+    # Socket.IO message queue shared by all server processes
+    # (memory://name, unix:///path/to.sock, redis://..., amqp://...)
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'box-socketio')
+    
+    # Request profiling - fraction of requests sampled, and whether clients
+    # may force profiling of a request with the X-Profile header
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+    PROFILE_ALLOW_HEADER = os.environ.get('PROFILE_ALLOW_HEADER', 'false').lower() == 'true'
+    
     # Security Headers
     SECURITY_HEADERS = {
         'X-Content-Type-Options': 'nosniff',
@@ -58,6 +154,7 @@ PATTERNS = {
     'container_id': re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]*$'),
     'filename': re.compile(r'^[a-zA-Z0-9_.-]+\.(py|sh|bash)$'),
     'automation_type': re.compile(r'^[A-Za-z][A-Za-z0-9_]*$'),
+    'audit_action': re.compile(r'^[A-Z][A-Z0-9_]*$'),
 }
 
 
@@ -88,71 +185,170 @@ class RateLimiter:
     
     def __init__(self, requests_per_minute: int = 60):
         self.requests_per_minute = requests_per_minute
-        self.requests = {}  # ip -> list of timestamps
+        self.requests = {}  # ip -> deque of timestamps, oldest first
+        self._lock = threading.Lock()
     
-    def is_allowed(self, client_ip: str) -> bool:
-        """Check if request is allowed"""
-        now = datetime.now().timestamp()
+    def is_allowed(self, client_ip: str, limit: int = None) -> bool:
+        """Check if request is allowed (limit overrides requests_per_minute)"""
+        now = time.monotonic()
         minute_ago = now - 60
         
-        if client_ip not in self.requests:
-            self.requests[client_ip] = []
-        
-        # Clean old entries
-        self.requests[client_ip] = [t for t in self.requests[client_ip] if t > minute_ago]
-        
-        if len(self.requests[client_ip]) >= self.requests_per_minute:
-            return False
-        
-        self.requests[client_ip].append(now)
-        return True
+        with self._lock:
+            timestamps = self.requests.get(client_ip)
+            if timestamps is None:
+                timestamps = self.requests[client_ip] = deque()
+            
+            # Clean old entries
+            while timestamps and timestamps[0] <= minute_ago:
+                timestamps.popleft()
+            
+            if len(timestamps) >= (self.requests_per_minute if limit is None else limit):
+                return False
+            
+            timestamps.append(now)
+            return True
 
 
 rate_limiter = RateLimiter(Config.RATE_LIMIT_PER_MINUTE)
 
 
-def require_api_key(f):
-    """Decorator to require API key authentication"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if not Config.API_KEY_REQUIRED:
-            return f(*args, **kwargs)
-        
-        api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
-        
-        if not Config.API_KEY:
-            security_logger.warning("API_KEY not configured but API_KEY_REQUIRED is true")
-            return jsonify({"success": False, "error": "Server misconfigured"}), 500
-        
-        if not api_key or not secrets.compare_digest(api_key, Config.API_KEY):
-            security_logger.warning(f"Invalid API key attempt from {request.remote_addr}")
-            return jsonify({"success": False, "error": "Invalid or missing API key"}), 401
-        
-        return f(*args, **kwargs)
-    return decorated
+def public(f):
+    """Mark a view as reachable without API key and rate limiting"""
+    f.public = True
+    return f
 
 
-def rate_limit(f):
-    """Decorator to apply rate limiting"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        if not Config.RATE_LIMIT_ENABLED:
-            return f(*args, **kwargs)
-        
-        client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-        if ',' in client_ip:
-            client_ip = client_ip.split(',')[0].strip()
-        
-        if not rate_limiter.is_allowed(client_ip):
-            security_logger.warning(f"Rate limit exceeded for {client_ip}")
-            return jsonify({"success": False, "error": "Rate limit exceeded"}), 429
-        
-        return f(*args, **kwargs)
-    return decorated
+def make_client_ip_resolver(trusted_proxies: List[str]) -> Callable[[str, Optional[str]], str]:
+    """
+    Build resolve(remote_addr, x_forwarded_for) -> client IP.
+    X-Forwarded-For is only honoured when the direct peer is a trusted proxy;
+    the client is the right-most hop that is not a trusted proxy itself.
+    """
+    networks = [ipaddress.ip_network(p.strip(), strict=False) for p in trusted_proxies if p.strip()]
+    if not networks:
+        return lambda remote_addr, forwarded_for: remote_addr
+
+    @lru_cache(maxsize=4096)
+    def is_trusted(addr: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(addr)
+        except ValueError:
+            return False
+        return any(ip in network for network in networks)
+
+    # Clients send the same few header values, so whole resolutions are cached
+    @lru_cache(maxsize=4096)
+    def resolve(remote_addr: str, forwarded_for: Optional[str]) -> str:
+        if not forwarded_for or not is_trusted(remote_addr):
+            return remote_addr
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        for hop in reversed(hops):
+            if hop and not is_trusted(hop):
+                return hop
+        return hops[0] or remote_addr
+
+    return resolve
+
+
+class RouteGuard:
+    """
+    Rate limiting and API key check for every non-public endpoint, plus
+    security headers on every response. Settings are read once in install().
+
+    Authenticated requests are rate limited per key (with the key's own
+    limit if it has one), failed and anonymous requests per client IP.
+    """
+
+    def __init__(self, api_key: str = None, api_key_required: bool = None,
+                 rate_limit_enabled: bool = None, limiter: RateLimiter = None,
+                 trusted_proxies: List[str] = None, security_headers: Dict[str, str] = None,
+                 key_store: ApiKeyStore = None):
+        self.key_store = key_store or ApiKeyStore(
+            Config.API_KEYS_FILE if api_key is None else None,
+            default_key=Config.API_KEY if api_key is None else api_key
+        )
+        self.api_key_required = Config.API_KEY_REQUIRED if api_key_required is None else api_key_required
+        self.rate_limit_enabled = Config.RATE_LIMIT_ENABLED if rate_limit_enabled is None else rate_limit_enabled
+        self.limiter = limiter or rate_limiter
+        self.trusted_proxies = Config.TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+        self.security_headers = Config.SECURITY_HEADERS if security_headers is None else security_headers
+        self.client_ip = make_client_ip_resolver(self.trusted_proxies)
+
+    def install(self, app):
+        """
+        Register the guard on app; call after the @public routes are defined.
+        Every other request, including routes added later and unmatched URLs,
+        needs an API key.
+        """
+        public_endpoints = frozenset(
+            endpoint for endpoint, view in app.view_functions.items()
+            if endpoint == 'static' or getattr(view, 'public', False)
+        )
+        resolve_ip = self.client_ip
+        limiter = self.limiter
+        rate_limit_enabled = self.rate_limit_enabled
+        key_required = self.api_key_required
+        key_store = self.key_store
+        header_items = tuple(self.security_headers.items())
+
+        if key_required and not key_store.configured:
+            security_logger.warning("No API key configured but API_KEY_REQUIRED is true")
+
+        def rate_limited(bucket: str, limit: int = None):
+            if rate_limit_enabled and not limiter.is_allowed(bucket, limit):
+                RATE_LIMIT_REJECTIONS.inc()
+                security_logger.warning(f"Rate limit exceeded for {bucket}")
+                return jsonify({"success": False, "error": "Rate limit exceeded"}), 429
+            return None
+
+        def guard_request():
+            # Runs on every request: resolve the context proxies once and read
+            # headers straight from the WSGI environ
+            req = request._get_current_object()
+            if req.endpoint in public_endpoints:
+                return None
+            if req.method == 'OPTIONS' and getattr(req.url_rule, 'provide_automatic_options', False):
+                return None  # CORS preflight, answered without calling the view
+            environ = req.environ
+            request_globals = g._get_current_object()
+            client_ip = request_globals.client_ip = resolve_ip(
+                environ.get('REMOTE_ADDR'), environ.get('HTTP_X_FORWARDED_FOR')
+            )
+
+            if not key_required:
+                return rate_limited(client_ip)
+
+            if not key_store.configured:
+                return jsonify({"success": False, "error": "Server misconfigured"}), 500
+            api_key = environ.get('HTTP_X_API_KEY') or req.args.get('api_key')
+            identity = key_store.lookup(api_key) if api_key else None
+            if identity is None:
+                # Failed attempts count against the client IP
+                rejected = rate_limited(client_ip)
+                if rejected is not None:
+                    return rejected
+                security_logger.warning(f"Invalid API key attempt from {client_ip}")
+                return jsonify({"success": False, "error": "Invalid or missing API key"}), 401
+
+            request_globals.api_key = identity
+            return rate_limited(f"key:{identity.name}", identity.rate_limit_per_minute)
+
+        def add_security_headers(response):
+            response.headers.update(header_items)
+            return response
+
+        # Run before any other before_request hook
+        app.before_request_funcs.setdefault(None, []).insert(0, guard_request)
+        app.after_request(add_security_headers)
+        return guard_request
 
 
 def audit_log(action: str, details: str = ""):
-    """Log security-relevant actions"""
-    client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-    security_logger.info(f"AUDIT: {action} | IP: {client_ip} | {details}")
+    """Log security-relevant actions (queued, written in the background)"""
+    client_ip = g.get('client_ip') or request.remote_addr
+    api_key = g.get('api_key')
+    audit_trail.record(
+        action, details, ip=client_ip, key=api_key.name if api_key else None,
+        method=request.method, path=request.path
+    )
 
@@ -2,15 +2,28 @@
 Docker Manager - Manage Docker containers from the API
 Secured against command injection attacks.
 """
+import logging
 import subprocess
 import json
 import re
-from typing import Dict, List, Any
+import threading
+import time
+from typing import Callable, Dict, List, Any
 
+import metrics
+
+
+logger = logging.getLogger(__name__)
 
 # Pattern for valid container IDs (alphanumeric, dash, underscore, dot)
 CONTAINER_ID_PATTERN = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]{0,127}$')
 
+DOCKER_COMMAND_DURATION = metrics.histogram(
+    'docker_command_duration_seconds', 'Latency of docker CLI commands',
+    ('command', 'outcome'),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
 
 def _validate_container_id(container_id: str) -> bool:
     """Validate container ID to prevent command injection"""
@@ -24,6 +37,9 @@ class DockerManager:
 
     def __init__(self):
         self._docker_available = self._check_docker_available()
+        self._watch_stop = threading.Event()
+        self._watch_process = None
+        self._watch_thread = None
 
     def _check_docker_available(self) -> bool:
         """Check if Docker is available"""
@@ -40,6 +56,8 @@ class DockerManager:
 
     def _run_docker_command(self, args: List[str], timeout: int = 30) -> subprocess.CompletedProcess:
         """Run a docker command and return result. Uses list args to prevent shell injection."""
+        started = time.perf_counter()
+        outcome = 'error'
         try:
             # Never use shell=True to prevent command injection
             result = subprocess.run(
@@ -49,11 +67,15 @@ class DockerManager:
                 timeout=timeout,
                 shell=False  # Explicit: prevent shell injection
             )
+            outcome = 'ok' if result.returncode == 0 else 'failed'
             return result
         except subprocess.TimeoutExpired:
+            outcome = 'timeout'
             raise Exception("Docker command timed out")
         except FileNotFoundError:
             raise Exception("Docker is not installed or not in PATH")
+        finally:
+            DOCKER_COMMAND_DURATION.observe(time.perf_counter() - started, args[0], outcome)
     
     def list_containers(self, all_containers: bool = True) -> List[Dict[str, Any]]:
         """List all Docker containers"""
@@ -173,3 +195,61 @@ class DockerManager:
         """Check if Docker daemon is running"""
         return self._docker_available or self._check_docker_available()
 
+    def watch_container_deaths(self, callback: Callable[[Dict[str, Any]], None]):
+        """Call callback for every container that exits, as reported by `docker events`
+
+        Runs on a background thread; the event stream is reopened if the
+        daemon restarts. callback receives container_id, name, image, exit_code.
+        """
+        if self._watch_thread is not None:
+            raise RuntimeError("Already watching container events")
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(
+            target=self._watch_loop, args=(callback,), name='docker-events', daemon=True
+        )
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        self._watch_stop.set()
+        process = self._watch_process
+        if process is not None:
+            process.terminate()
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout=5)
+            self._watch_thread = None
+
+    def _watch_loop(self, callback: Callable[[Dict[str, Any]], None]):
+        retry_delay = 1
+        while not self._watch_stop.is_set():
+            try:
+                self._watch_process = subprocess.Popen(
+                    ['docker', 'events', '--filter', 'type=container', '--filter', 'event=die',
+                     '--format', '{{json .}}'],
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, shell=False
+                )
+            except FileNotFoundError:
+                logger.warning("Docker is not installed, not watching container events")
+                return
+            for line in self._watch_process.stdout:
+                retry_delay = 1
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                actor = event.get('Actor') or {}
+                attributes = actor.get('Attributes') or {}
+                exit_code = attributes.get('exitCode')
+                try:
+                    callback({
+                        'container_id': (actor.get('ID') or event.get('id', ''))[:12],
+                        'name': attributes.get('name', ''),
+                        'image': attributes.get('image', ''),
+                        'exit_code': int(exit_code) if exit_code and exit_code.isdigit() else None,
+                    })
+                except Exception as e:
+                    logger.error(f"Error handling container event: {e}")
+            self._watch_process.wait()
+            self._watch_process = None
+            # Daemon restarted or not reachable yet
+            self._watch_stop.wait(retry_delay)
+            retry_delay = min(retry_delay * 2, 60)
@@ -0,0 +1,172 @@
+"""
+Events - in-process publish/subscribe bus
+
+Producers publish events by type ("hook.github", ...) and never block:
+every subscriber has its own bounded queue and delivery thread, so a slow
+or stuck consumer only fills (and then drops from) its own queue.
+Subscribers select event types with shell-style patterns ("hook.*").
+
+Besides webhooks ("hook.<name>"), the server publishes the typed events in
+EVENT_TYPES; rules.py connects them to actions.
+"""
+import fnmatch
+import itertools
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 1000
+
+# Event types published by the server
+AUTOMATION_STATUS = 'automation.status'
+KEYWORD_MATCH = 'automation.keyword_match'
+SCRIPT_FINISHED = 'script.finished'
+CONTAINER_DIED = 'container.died'
+
+# Payload fields of each event type
+EVENT_TYPES: Dict[str, tuple] = {
+    AUTOMATION_STATUS: ('automation_id', 'name', 'status', 'previous', 'error_message'),
+    KEYWORD_MATCH: ('automation_id', 'name', 'url', 'keywords', 'items'),
+    SCRIPT_FINISHED: ('run_id', 'filename', 'status', 'return_code', 'trigger'),
+    CONTAINER_DIED: ('container_id', 'name', 'image', 'exit_code'),
+}
+
+
+class Event:
+    """Something that happened, delivered to every matching subscriber"""
+
+    __slots__ = ('id', 'type', 'payload', 'source', 'time')
+
+    _ids = itertools.count(1)
+
+    def __init__(self, type: str, payload: Dict[str, Any] = None, source: str = None):
+        self.id = next(Event._ids)
+        self.type = type
+        self.payload = payload if payload is not None else {}
+        self.source = source
+        self.time = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, 'type': self.type, 'payload': self.payload,
+                'source': self.source, 'time': self.time}
+
+    def __repr__(self):
+        return f"Event({self.type!r}, id={self.id})"
+
+
+class Subscription:
+    """One consumer: a pattern, a bounded queue and a delivery thread"""
+
+    def __init__(self, pattern: str, handler: Callable[[Event], None], queue_size: int, name: str):
+        self.pattern = pattern
+        self.handler = handler
+        self.name = name
+        self.queue: 'queue.Queue[Optional[Event]]' = queue.Queue(maxsize=queue_size)
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name=f"events-{name}", daemon=True)
+        self._thread.start()
+
+    def matches(self, event_type: str) -> bool:
+        return fnmatch.fnmatchcase(event_type, self.pattern)
+
+    def offer(self, event: Event) -> bool:
+        """Queue an event without blocking; False if the queue is full"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            try:
+                self.handler(event)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Event handler {self.name} failed on {event.type}: {e}")
+
+    def close(self, timeout: float = None):
+        """Stop after the queued events have been delivered"""
+        self.queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'pattern': self.pattern,
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+
+class EventBus:
+    """Non-blocking fan-out of events to subscribers"""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._published = 0
+
+    def subscribe(self, pattern: str, handler: Callable[[Event], None],
+                  queue_size: int = None, name: str = None) -> Subscription:
+        """Call handler (on the subscription's own thread) for events matching pattern"""
+        subscription = Subscription(pattern, handler, queue_size or self.queue_size,
+                                    name or getattr(handler, '__name__', pattern))
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+        subscription.close(timeout=5)
+
+    def publish(self, event_type: str, payload: Dict[str, Any] = None, source: str = None) -> Dict[str, Any]:
+        """Hand an event to every matching subscriber; never blocks
+
+        Returns {'event': id, 'queued': n, 'dropped': n}; dropped counts
+        subscribers whose queue was full.
+        """
+        event = Event(event_type, payload, source)
+        queued = dropped = 0
+        for subscription in self._subscriptions:  # copy-on-write list, no lock needed
+            if subscription.matches(event_type):
+                if subscription.offer(event):
+                    queued += 1
+                else:
+                    dropped += 1
+                    logger.warning(f"Event queue of {subscription.name} is full, dropped {event_type}")
+        self._published += 1
+        return {'event': event.id, 'queued': queued, 'dropped': dropped}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'published': self._published,
+            'subscriptions': [s.stats() for s in self._subscriptions],
+        }
+
+    def shutdown(self, timeout: float = 5.0):
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        for subscription in subscriptions:
+            subscription.close(timeout)
+
+
+# Shared by the whole server
+bus = EventBus()
@@ -0,0 +1,408 @@
+"""
+Fork Server - warm Python interpreter for running .py scripts
+
+Starting `python3 script.py` pays for interpreter startup and imports on
+every run. The fork server is one long-lived, single-threaded interpreter
+with common modules already imported; each run is a fork() of it that
+executes the script as __main__, so only the script itself costs time.
+
+The API process talks to it over a Unix socket: a run request carries the
+script path, arguments, extra environment and working directory plus the stdin/stdout/stderr file
+descriptors (SCM_RIGHTS), so output arrives on pipes exactly like with
+subprocess.Popen. The server replies with the child's pid and, once the
+child has exited, its return code and resource usage (wait4).
+
+The server exits when the API process goes away (its stdin pipe closes).
+"""
+import gc
+import importlib
+import json
+import logging
+import os
+import runpy
+import selectors
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from script_directives import LIMITS_FAILED_EXIT, ResourceLimits, rusage_to_dict
+
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('!I')
+MAX_REQUEST_SIZE = 64 * 1024
+
+# Imported once by the server so scripts don't pay for them
+DEFAULT_PRELOAD = ('json', 're', 'datetime', 'subprocess', 'urllib.request', 'logging')
+
+
+class ForkServerError(Exception):
+    """The fork server could not start or run a script"""
+    pass
+
+
+def _send_frame(sock: socket.socket, message: dict, fds: Sequence[int] = ()):
+    payload = json.dumps(message).encode('utf-8')
+    data = _HEADER.pack(len(payload)) + payload
+    if fds:
+        sent = socket.send_fds(sock, [data], list(fds))
+        data = data[sent:]
+    if data:
+        sock.sendall(data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv_frame(sock: socket.socket, maxfds: int = 0) -> Tuple[Optional[dict], List[int]]:
+    """Read one length-prefixed JSON frame and the descriptors sent with it"""
+    fds: List[int] = []
+    if maxfds:
+        data, fds, _, _ = socket.recv_fds(sock, _HEADER.size, maxfds)
+        if len(data) < _HEADER.size:
+            rest = _recv_exact(sock, _HEADER.size - len(data)) if data else None
+            if rest is None:
+                return None, fds
+            data += rest
+    else:
+        data = _recv_exact(sock, _HEADER.size)
+        if data is None:
+            return None, fds
+    (size,) = _HEADER.unpack(data)
+    if size > MAX_REQUEST_SIZE:
+        raise ValueError("Frame too large")
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        return None, fds
+    return json.loads(payload), fds
+
+
+# ============== CLIENT (API PROCESS) ==============
+
+class ForkedProcess:
+    """Popen-like handle of a script run forked by the fork server"""
+
+    def __init__(self, args: List[str], pid: int, sock: socket.socket, stdout_fd: int, stderr_fd: int):
+        self.args = args
+        self.pid = pid
+        self.returncode: Optional[int] = None
+        self.resources: Optional[Dict[str, Any]] = None
+        self._sock = sock
+        self._fds = {stdout_fd: [], stderr_fd: []}
+        self._stdout_fd = stdout_fd
+        self._stderr_fd = stderr_fd
+        self._open = {stdout_fd, stderr_fd}
+
+    def communicate(self, timeout: float = None) -> Tuple[bytes, bytes]:
+        """Read stdout/stderr until the script exits, like Popen.communicate"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            for fd in self._open:
+                selector.register(fd, selectors.EVENT_READ)
+            if self.returncode is None:
+                selector.register(self._sock, selectors.EVENT_READ)
+            while selector.get_map():
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(self.args, timeout)
+                for key, _ in selector.select(remaining):
+                    if key.fileobj is self._sock:
+                        selector.unregister(self._sock)
+                        self._read_exit()
+                        continue
+                    chunk = os.read(key.fd, 65536)
+                    if chunk:
+                        self._fds[key.fd].append(chunk)
+                    else:
+                        selector.unregister(key.fd)
+                        self._open.discard(key.fd)
+                        os.close(key.fd)
+        return b''.join(self._fds[self._stdout_fd]), b''.join(self._fds[self._stderr_fd])
+
+    def _read_exit(self):
+        try:
+            message, _ = _recv_frame(self._sock)
+        except (OSError, ValueError):
+            message = None
+        finally:
+            self._sock.close()
+        if message is None:
+            raise ForkServerError("Fork server exited before the script finished")
+        self.returncode = message['returncode']
+        self.resources = message.get('resources')
+
+    def send_signal(self, sig: int):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ForkServer:
+    """Starts (and restarts) the fork server process and submits runs to it"""
+
+    def __init__(self, preload: Sequence[str] = DEFAULT_PRELOAD, python: str = None,
+                 start_timeout: float = 10.0):
+        self.preload = list(preload)
+        # Same interpreter as cold runs (`python3` on PATH)
+        self.python = python or shutil.which('python3') or sys.executable
+        self.start_timeout = start_timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._socket_dir: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def supported() -> bool:
+        """fork() and descriptor passing are available (not on Windows)"""
+        return hasattr(os, 'fork') and hasattr(socket, 'send_fds')
+
+    @property
+    def socket_path(self) -> Optional[str]:
+        return os.path.join(self._socket_dir, 'forkserver.sock') if self._socket_dir else None
+
+    def start(self) -> 'ForkServer':
+        with self._lock:
+            self._ensure_running()
+        return self
+
+    def _ensure_running(self):
+        """Start the server unless it is alive (lock held)"""
+        if self._process is not None and self._process.poll() is None:
+            return
+        if self._process is not None:
+            logger.warning(f"Fork server exited with code {self._process.returncode}, restarting")
+        self._cleanup()
+        self._socket_dir = tempfile.mkdtemp(prefix='box-forkserver-')
+        self._process = subprocess.Popen(
+            [self.python, os.path.abspath(__file__), 'serve', self.socket_path, *self.preload],
+            stdin=subprocess.PIPE,  # lifeline: closes when this process exits
+            close_fds=True
+        )
+        deadline = time.monotonic() + self.start_timeout
+        while not os.path.exists(self.socket_path):
+            if self._process.poll() is not None:
+                raise ForkServerError(f"Fork server failed to start (exit code {self._process.returncode})")
+            if time.monotonic() > deadline:
+                self._process.kill()
+                raise ForkServerError("Fork server did not start in time")
+            time.sleep(0.01)
+        logger.info(f"Fork server started (pid {self._process.pid}, preloaded: {', '.join(self.preload)})")
+
+    def spawn(self, path: str, cwd: str, args: Sequence[str] = (), env: Dict[str, str] = None,
+              limits: Dict[str, Any] = None) -> ForkedProcess:
+        """Run a .py script in a fork of the warm interpreter (limits: ResourceLimits.to_dict())"""
+        with self._lock:
+            self._ensure_running()
+            socket_path = self.socket_path
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        stdin_fd = os.open(os.devnull, os.O_RDONLY)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+            _send_frame(
+                sock, {'path': path, 'cwd': cwd, 'args': list(args), 'env': env or {}, 'limits': limits},
+                fds=(stdin_fd, stdout_w, stderr_w)
+            )
+            reply, _ = _recv_frame(sock)
+            if reply is None or 'pid' not in reply:
+                raise ForkServerError((reply or {}).get('error', "Fork server closed the connection"))
+        except (OSError, ValueError, ForkServerError) as e:
+            sock.close()
+            os.close(stdout_r)
+            os.close(stderr_r)
+            raise ForkServerError(f"Fork server could not run {os.path.basename(path)}: {e}") from e
+        finally:
+            # The child has its own copies now
+            for fd in (stdin_fd, stdout_w, stderr_w):
+                os.close(fd)
+        return ForkedProcess([self.python, path, *args], reply['pid'], sock, stdout_r, stderr_r)
+
+    def stop(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.stdin.close()
+                try:
+                    self._process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+            self._process = None
+            self._cleanup()
+
+    def _cleanup(self):
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+
+# ============== SERVER (WARM INTERPRETER) ==============
+
+def _exit_code(code) -> int:
+    """Process exit status for SystemExit(code), as the interpreter computes it"""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xff
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run_child(request: dict, fds: List[int], inherited: list):
+    """Body of a forked child: become the script's process, never returns"""
+    code = 1
+    try:
+        for obj in inherited:
+            if isinstance(obj, int):
+                os.close(obj)
+            else:
+                obj.close()
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        for fd in fds:
+            if fd > 2:
+                os.close(fd)
+        try:
+            ResourceLimits.from_dict(request.get('limits')).apply()
+        except (OSError, ValueError) as e:
+            print(f"Could not apply resource limits: {e}", file=sys.stderr)
+            code = LIMITS_FAILED_EXIT
+            return
+        os.chdir(request['cwd'])
+        path = request['path']
+        sys.argv = [path, *request.get('args', [])]
+        os.environ.update(request.get('env', {}))
+        sys.path[0] = os.path.dirname(path)
+        try:
+            runpy.run_path(path, run_name='__main__')
+            code = 0
+        except SystemExit as e:
+            code = _exit_code(e.code)
+        except BaseException as e:
+            # Start the traceback at the script, as `python3 script.py` would
+            tb = e.__traceback__
+            while tb is not None and tb.tb_frame.f_code.co_filename != path:
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb or e.__traceback__)
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        os._exit(code)
+
+
+def serve(path: str, preload: Sequence[str]):
+    """Fork server main loop (single-threaded so fork() is safe)"""
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"forkserver: could not preload {name}: {e}", file=sys.stderr)
+    # Keep preloaded objects out of the collector so children share their pages
+    gc.freeze()
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path + '.tmp')
+    os.chmod(path + '.tmp', 0o600)
+    listener.listen(128)
+    os.rename(path + '.tmp', path)  # the client waits for the final name
+
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    # Ctrl+C in the server's terminal is for the API process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    children = {}  # pid -> connection awaiting the exit status
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(wake_r, selectors.EVENT_READ)
+    selector.register(sys.stdin.fileno(), selectors.EVENT_READ)
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is listener:
+                conn, _ = listener.accept()
+                try:
+                    request, fds = _recv_frame(conn, maxfds=3)
+                except (OSError, ValueError):
+                    request, fds = None, []
+                if request is None or len(fds) != 3:
+                    for fd in fds:
+                        os.close(fd)
+                    conn.close()
+                    continue
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    _run_child(request, fds, [selector, listener, conn, wake_r, wake_w, *children.values()])
+                for fd in fds:
+                    os.close(fd)
+                try:
+                    _send_frame(conn, {'pid': pid})
+                except OSError:
+                    pass
+                children[pid] = conn
+            elif key.fileobj == wake_r:
+                os.read(wake_r, 4096)
+                while True:
+                    try:
+                        pid, status, usage = os.wait4(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    conn = children.pop(pid, None)
+                    if conn is None:
+                        continue
+                    try:
+                        _send_frame(conn, {
+                            'pid': pid,
+                            'returncode': os.waitstatus_to_exitcode(status),
+                            'resources': rusage_to_dict(usage),
+                        })
+                    except OSError:
+                        pass
+                    conn.close()
+            elif not os.read(key.fd, 1):
+                # API process is gone
+                return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'serve':
+        print("Usage: python forkserver.py serve <socket-path> [module ...]")
+        sys.exit(1)
+    serve(sys.argv[2], sys.argv[3:])
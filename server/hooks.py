@@ -0,0 +1,213 @@
+"""
+Hooks - webhooks that let upstream systems push changes instead of being polled
+
+POST /api/hooks/<name> only publishes a 'hook.<name>' event on the event
+bus and returns 202. The registry's bus subscription (a bounded queue with
+its own thread) then starts/stops the hook's automation or runs its
+script. When that queue is full the request is answered with 503 so the
+sender retries later.
+
+Each hook has its own token, sent as X-Hook-Token or
+"Authorization: Bearer <token>"; only its SHA-256 is stored. Definitions
+are kept in DATA_DIR/hooks.json.
+
+Scripts get the request body in the file named by HOOK_PAYLOAD_FILE (it
+is removed after the run) plus HOOK_NAME and HOOK_EVENT_ID. They count
+against the running-script quota of the API key that defined the hook, as
+it is configured when the script starts; once that key is gone the hook
+no longer runs its script.
+"""
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from api_keys import ApiKeyStore, hash_key
+from events import Event, EventBus, bus as default_bus
+from script_manager import validate_params
+
+
+logger = logging.getLogger(__name__)
+
+HOOK_NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+AUTOMATION_ACTIONS = ('start', 'stop')
+
+
+class HookRegistry:
+    """Webhook definitions and their delivery to automations and scripts"""
+
+    def __init__(self, path: Optional[str], manager, script_manager, bus: EventBus = None,
+                 payload_dir: str = None, queue_size: int = 100, key_store: ApiKeyStore = None):
+        self.path = path
+        self.manager = manager
+        self.script_manager = script_manager
+        self.key_store = key_store
+        self.bus = bus or default_bus
+        self.payload_dir = payload_dir or os.path.join(os.path.dirname(path or '.'), 'hook-payloads')
+        self.hooks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._load()
+        self.subscription = self.bus.subscribe('hook.*', self._deliver, queue_size=queue_size, name='hooks')
+
+    def define(self, name: str, spec: Dict[str, Any], owner: str = None) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Create or replace a hook; returns it and its token if a new one was issued
+
+        spec: {"automation": id, "action": "start"|"stop", "config": {...}}
+           or {"script": filename, "args": [...], "env": {...}}
+        owner: name of the defining API key, whose script quota the hook's runs count against
+        A hook keeps its token when redefined unless spec has "rotate_token": true.
+        """
+        if not isinstance(name, str) or not HOOK_NAME_PATTERN.match(name):
+            raise ValueError("Hook name must be 1-64 lowercase letters, digits, '-' or '_'")
+        if bool(spec.get('automation')) == bool(spec.get('script')):
+            raise ValueError("Provide exactly one of 'automation' or 'script'")
+
+        hook: Dict[str, Any] = {'name': name}
+        if spec.get('automation'):
+            self.manager.get_automation(spec['automation'])
+            action = spec.get('action', 'start')
+            if action not in AUTOMATION_ACTIONS:
+                raise ValueError(f"action must be one of: {', '.join(AUTOMATION_ACTIONS)}")
+            config = spec.get('config', {})
+            if not isinstance(config, dict):
+                raise ValueError("config must be an object")
+            hook.update(automation=spec['automation'], action=action, config=config)
+        else:
+            if spec['script'] not in {s['filename'] for s in self.script_manager.list_scripts()}:
+                raise FileNotFoundError("Script not found")
+            args, env = validate_params(spec.get('args'), spec.get('env'))
+            hook.update(script=spec['script'], args=args, env=env, owner=owner)
+
+        with self._lock:
+            previous = self.hooks.get(name)
+            token = None
+            if previous is None or spec.get('rotate_token'):
+                token = secrets.token_hex(24)
+                hook['token_sha256'] = hash_key(token)
+            else:
+                hook['token_sha256'] = previous['token_sha256']
+            hook.update(
+                created_at=previous['created_at'] if previous else datetime.now().isoformat(),
+                received=previous['received'] if previous else 0,
+                triggered=previous['triggered'] if previous else 0,
+                last_received=previous['last_received'] if previous else None,
+                last_error=None,
+            )
+            self.hooks[name] = hook
+            self._save()
+            return self._public(hook), token
+
+    def remove(self, name: str):
+        with self._lock:
+            if self.hooks.pop(name, None) is None:
+                raise ValueError("Hook not found")
+            self._save()
+
+    def list_hooks(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._public(h) for h in sorted(self.hooks.values(), key=lambda h: h['name'])]
+
+    def authenticate(self, name: str, token: Optional[str]) -> bool:
+        """True if the hook exists and token is its token"""
+        with self._lock:
+            hook = self.hooks.get(name)
+        if hook is None or not token:
+            return False
+        return hmac.compare_digest(hash_key(token), hook['token_sha256'])
+
+    def receive(self, name: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Publish an authenticated webhook call; 'dropped' > 0 means the queue was full"""
+        with self._lock:
+            hook = self.hooks.get(name)
+            if hook is None:
+                raise ValueError("Hook not found")
+            hook['received'] += 1
+            hook['last_received'] = datetime.now().isoformat()
+        return self.bus.publish(f"hook.{name}", {'hook': name, 'body': body}, source='webhook')
+
+    def _deliver(self, event: Event):
+        """Trigger the hook's target (on the bus subscription thread)"""
+        name = event.payload.get('hook')
+        with self._lock:
+            hook = self.hooks.get(name)
+        if hook is None:
+            return
+        try:
+            if 'automation' in hook:
+                if hook['action'] == 'start':
+                    self.manager.start_automation(hook['automation'], hook['config'])
+                else:
+                    self.manager.stop_automation(hook['automation'])
+            else:
+                self._run_script(hook, event)
+            error = None
+        except Exception as e:
+            logger.error(f"Hook {name} failed: {e}")
+            error = str(e)[:1000]
+        with self._lock:
+            hook['last_error'] = error
+            if error is None:
+                hook['triggered'] += 1
+
+    def _run_script(self, hook: Dict[str, Any], event: Event):
+        owner = hook.get('owner')
+        max_running = None
+        if owner is not None and self.key_store is not None:
+            identity = self.key_store.get(owner)
+            if identity is None:
+                raise PermissionError(f"API key {owner!r} that defined the hook no longer exists")
+            max_running = identity.max_running_scripts
+
+        os.makedirs(self.payload_dir, mode=0o700, exist_ok=True)
+        payload_path = os.path.join(self.payload_dir, f"{hook['name']}-{event.id}.json")
+        with open(payload_path, 'w', encoding='utf-8') as f:
+            json.dump(event.payload['body'], f)
+
+        def remove_payload(execution):
+            try:
+                os.remove(payload_path)
+            except FileNotFoundError:
+                pass
+
+        env = {**hook['env'], 'HOOK_NAME': hook['name'], 'HOOK_EVENT_ID': str(event.id),
+               'HOOK_PAYLOAD_FILE': payload_path}
+        try:
+            self.script_manager.run_script(hook['script'], owner=owner, max_running=max_running,
+                                           args=hook['args'], env=env,
+                                           on_finish=remove_payload, use_cache=False,
+                                           trigger={'hook': hook['name'], 'event': event.id})
+        except Exception:
+            remove_payload(None)
+            raise
+
+    def _public(self, hook: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in hook.items() if k != 'token_sha256'}
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load hooks from {self.path}: {e}")
+            return
+        for hook in stored.get('hooks', []):
+            if 'name' in hook and 'token_sha256' in hook:
+                self.hooks[hook['name']] = hook
+
+    def _save(self):
+        """Write all hooks atomically (lock held)"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', mode=0o755, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'hooks': list(self.hooks.values())}, f, indent=2)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.path)
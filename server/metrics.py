@@ -0,0 +1,252 @@
+"""
+Metrics Registry - low-overhead Prometheus-style server metrics
+
+Every thread writes into its own private cell without taking a lock; the
+cells are only summed when /metrics is scraped.
+"""
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Tuple
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+INF_LABEL = 'le="+Inf"'
+
+# Fold cells of finished threads once this many cells are registered
+MAX_LIVE_CELLS = 256
+
+
+def _escape_label(value: Any) -> str:
+    """Escape a Prometheus label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = '') -> str:
+    """Render label names/values as {k="v",...}"""
+    parts = [f'{k}="{_escape_label(v)}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    """Base class for registered metrics"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str,
+                 labelnames: Tuple[str, ...] = ()):
+        self._registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+
+    def render(self, values: Dict[Tuple, Any]) -> List[str]:
+        lines = []
+        for labels, value in sorted(values.items(), key=lambda item: tuple(map(str, item[0]))):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    metric_type = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        cell = self._registry._cell()
+        key = (self.name, labels)
+        cell[key] = cell.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    """Up/down gauge stored as per-thread deltas"""
+
+    metric_type = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class FunctionGauge(_Metric):
+    """Gauge whose value is computed by a callback at scrape time"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, registry, name, help_text, func: Callable[[], float]):
+        super().__init__(registry, name, help_text)
+        self.func = func
+
+    def collect(self) -> Dict[Tuple, Any]:
+        try:
+            return {(): self.func()}
+        except Exception:
+            return {}
+
+
+class Histogram(_Metric):
+    """Histogram with fixed buckets"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._sum_index = len(self.buckets) + 1
+
+    def observe(self, value: float, *labels):
+        cell = self._registry._cell()
+        key = (self.name, labels)
+        slots = cell.get(key)
+        if slots is None:
+            # One slot per bucket, one for +Inf and one for the running sum
+            slots = cell[key] = [0] * (len(self.buckets) + 2)
+        slots[bisect_left(self.buckets, value)] += 1
+        slots[self._sum_index] += value
+
+    def render(self, values: Dict[Tuple, Any]) -> List[str]:
+        lines = []
+        for labels, slots in sorted(values.items(), key=lambda item: tuple(map(str, item[0]))):
+            cumulative = 0
+            for bound, n in zip(self.buckets, slots):
+                cumulative += n
+                le = f'le="{bound!r}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            cumulative += slots[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, INF_LABEL)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {slots[self._sum_index]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Registry of metrics with lock-free per-thread accumulation"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict = {}
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], str]] = []
+
+    # -------- registration --------
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> Counter:
+        return self._register(Counter(self, name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(self, name, help_text, labelnames))
+
+    def gauge_function(self, name: str, help_text: str, func: Callable[[], float]) -> FunctionGauge:
+        return self._register(FunctionGauge(self, name, help_text, func))
+
+    def histogram(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help_text, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], str]):
+        """Add a callable returning extra Prometheus text on every scrape"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    # -------- hot path --------
+
+    def _cell(self) -> Dict:
+        """Return the calling thread's private cell"""
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = {}
+            with self._lock:
+                self._cells.append((threading.current_thread(), cell))
+                if len(self._cells) > MAX_LIVE_CELLS:
+                    self._fold_dead_cells()
+            self._local.cell = cell
+            return cell
+
+    # -------- aggregation --------
+
+    @staticmethod
+    def _merge(target: Dict, source: Dict):
+        for key, value in source.items():
+            if isinstance(value, list):
+                slots = target.get(key)
+                if slots is None:
+                    target[key] = list(value)
+                else:
+                    for i, n in enumerate(value):
+                        slots[i] += n
+            else:
+                target[key] = target.get(key, 0) + value
+
+    def _fold_dead_cells(self):
+        """Merge cells of finished threads into the retired totals (lock held)"""
+        alive = []
+        for thread, cell in self._cells:
+            if thread.is_alive():
+                alive.append((thread, cell))
+            else:
+                self._merge(self._retired, cell)
+        self._cells = alive
+
+    def collect(self) -> Dict:
+        """Sum all per-thread cells into {(name, labels): value}"""
+        with self._lock:
+            self._fold_dead_cells()
+            totals: Dict = {}
+            self._merge(totals, self._retired)
+            cells = [cell for _, cell in self._cells]
+        for cell in cells:
+            # dict.copy() is atomic under the GIL, the owning thread may keep writing
+            snapshot = {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in cell.copy().items()
+            }
+            self._merge(totals, snapshot)
+        return totals
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text format"""
+        totals = self.collect()
+        by_metric: Dict[str, Dict] = {}
+        for (name, labels), value in totals.items():
+            by_metric.setdefault(name, {})[labels] = value
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        output = []
+        for metric in metrics:
+            values = metric.collect() if isinstance(metric, FunctionGauge) else by_metric.get(metric.name, {})
+            output.append(f'# HELP {metric.name} {metric.help_text}')
+            output.append(f'# TYPE {metric.name} {metric.metric_type}')
+            output.extend(metric.render(values))
+        text = '\n'.join(output) + '\n'
+
+        for collector in collectors:
+            try:
+                text += collector()
+            except Exception:
+                continue
+        return text
+
+
+# Process-wide registry
+REGISTRY = MetricsRegistry()
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+gauge_function = REGISTRY.gauge_function
+histogram = REGISTRY.histogram
+register_collector = REGISTRY.register_collector
+render = REGISTRY.render
@@ -0,0 +1,150 @@
+"""
+Request Profiler - opt-in sampling profiler for Flask endpoints
+
+A single background thread periodically samples the stacks of request
+threads that were selected for profiling and aggregates them per endpoint
+as flamegraph-compatible collapsed stacks ("frame;frame;frame count").
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Optional
+
+
+MAX_STACK_DEPTH = 128
+MAX_STACKS_PER_ENDPOINT = 5000
+
+
+def _frame_label(frame) -> str:
+    """Human readable label of a single frame"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame) -> str:
+    """Collapse a frame chain into root-first "a;b;c" form"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class SamplingProfiler:
+    """Samples stacks of profiled request threads and aggregates them per endpoint"""
+
+    def __init__(self, sample_rate: float = 0.0, interval_ms: float = 5.0, allow_header: bool = False):
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self.allow_header = allow_header
+        self._lock = threading.Lock()
+        self._active: Dict[int, str] = {}  # thread ident -> endpoint
+        self._stacks: Dict[str, Counter] = {}
+        self._requests: Counter = Counter()
+        self._samples: Counter = Counter()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def configure(self, sample_rate: float = None, interval_ms: float = None, allow_header: bool = None):
+        """Change settings at runtime"""
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if interval_ms is not None:
+            self.interval_ms = min(max(float(interval_ms), 1.0), 1000.0)
+        if allow_header is not None:
+            self.allow_header = bool(allow_header)
+
+    def should_profile(self, header_value: Optional[str] = None) -> bool:
+        """Decide whether the current request gets profiled"""
+        if self.allow_header and header_value and header_value.lower() in ('1', 'true', 'yes'):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate  # nosec B311 - sampling only
+
+    def begin(self, endpoint: str):
+        """Start sampling the calling thread on behalf of endpoint"""
+        with self._lock:
+            self._active[threading.get_ident()] = endpoint
+            self._requests[endpoint] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def end(self):
+        """Stop sampling the calling thread"""
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _sample_loop(self):
+        """Sample all active request threads every interval"""
+        own_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                active = dict(self._active)
+                if not active:
+                    self._wakeup.clear()
+            if not active:
+                self._wakeup.wait()
+                continue
+
+            frames = sys._current_frames()
+            collected = []
+            for ident, endpoint in active.items():
+                frame = frames.get(ident)
+                if frame is not None and ident != own_ident:
+                    collected.append((endpoint, _collapse(frame)))
+            del frames
+
+            with self._lock:
+                for endpoint, stack in collected:
+                    stacks = self._stacks.setdefault(endpoint, Counter())
+                    if stack not in stacks and len(stacks) >= MAX_STACKS_PER_ENDPOINT:
+                        stack = '[truncated]'
+                    stacks[stack] += 1
+                    self._samples[endpoint] += 1
+
+            time.sleep(self.interval_ms / 1000.0)
+
+    def collapsed(self, endpoint: str = None) -> str:
+        """Collapsed stacks, rooted at the endpoint name, one "stack count" per line"""
+        with self._lock:
+            items = [
+                (name, dict(stacks)) for name, stacks in self._stacks.items()
+                if endpoint is None or name == endpoint
+            ]
+        lines = []
+        for name, stacks in sorted(items):
+            for stack, count in sorted(stacks.items()):
+                lines.append(f"{name};{stack} {count}")
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def get_status(self) -> Dict[str, Any]:
+        """Current settings and per-endpoint totals"""
+        with self._lock:
+            endpoints = {
+                name: {
+                    'profiled_requests': self._requests[name],
+                    'samples': self._samples[name],
+                    'unique_stacks': len(self._stacks.get(name, ())),
+                }
+                for name in self._requests
+            }
+            active = len(self._active)
+        return {
+            'sample_rate': self.sample_rate,
+            'interval_ms': self.interval_ms,
+            'allow_header': self.allow_header,
+            'active_requests': active,
+            'endpoints': endpoints,
+        }
+
+    def reset(self):
+        """Drop all collected samples"""
+        with self._lock:
+            self._stacks.clear()
+            self._requests.clear()
+            self._samples.clear()
@@ -0,0 +1,302 @@
+"""
+Rules - declarative chaining of automations, scripts and containers
+
+A rule connects an event on the event bus to an action:
+
+  {
+    "on": "automation.keyword_match",
+    "when": {"automation_id": "3f2a...", "keywords": "outage"},
+    "do": {"action": "run_script", "script": "page_oncall.sh", "args": ["$url"]},
+    "cooldown": 60
+  }
+
+"on" is an event type from events.EVENT_TYPES or a pattern ("hook.*").
+"when" compares payload fields: every field must match, a list of values
+matches any of them and a list field (keywords) matches if it contains the
+value. Actions:
+
+  start_automation / stop_automation  {"automation": id, "config": {...}}
+  run_script                          {"script": filename, "args": [...], "env": {...}}
+  start_container / stop_container /
+  restart_container                   {"container": id or "$container_id"}
+  notify                              {"message": "...", "method": "console"}
+
+"$field" in args, container and message is replaced with the event's
+payload field. Scripts also get the event as JSON in EVENT_PAYLOAD.
+
+Every rule has its own bounded queue and thread, so a slow action only
+delays (and eventually drops) events for that rule. A rule fires at most
+once per cooldown, and scripts started by rules reacting to script.finished
+stop after MAX_CHAIN_DEPTH links so rules cannot trigger each other forever.
+Scripts count against the running-script quota of the API key that defined
+the rule, as it is configured when the script starts; once that key is gone
+the rule no longer runs scripts.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from string import Template
+from typing import Any, Dict, List, Optional
+
+from api_keys import ApiKeyStore
+from docker_manager import _validate_container_id
+from events import EVENT_TYPES, Event, EventBus, Subscription, bus as default_bus
+from script_manager import validate_params
+
+
+logger = logging.getLogger(__name__)
+
+RULE_NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+EVENT_PATTERN = re.compile(r'^[a-z0-9_.*?-]{1,128}$')
+ACTIONS = ('start_automation', 'stop_automation', 'run_script',
+           'start_container', 'stop_container', 'restart_container', 'notify')
+DEFAULT_COOLDOWN = 1.0
+MAX_CHAIN_DEPTH = 5
+MAX_MESSAGE_LENGTH = 1000
+
+
+def _substitute(value: str, payload: Dict[str, Any]) -> str:
+    """Replace $field with the event's payload values (lists comma-joined)"""
+    fields = {k: ', '.join(map(str, v)) if isinstance(v, list) else str(v)
+              for k, v in payload.items() if v is not None}
+    return Template(value).safe_substitute(fields)
+
+
+class RuleEngine:
+    """Declarative rules from events to actions, kept in DATA_DIR/rules.json"""
+
+    def __init__(self, path: Optional[str], manager, script_manager, docker_manager,
+                 bus: EventBus = None, notifier=None, queue_size: int = 100, key_store: ApiKeyStore = None):
+        self.path = path
+        self.manager = manager
+        self.script_manager = script_manager
+        self.docker_manager = docker_manager
+        self.bus = bus or default_bus
+        self.notifier = notifier
+        self.queue_size = queue_size
+        self.key_store = key_store
+        self.rules: Dict[str, Dict[str, Any]] = {}
+        self._subscriptions: Dict[str, Subscription] = {}
+        self._last_fired: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._load()
+
+    def define(self, name: str, spec: Dict[str, Any], owner: str = None) -> Dict[str, Any]:
+        """Create or replace a rule
+
+        owner: name of the defining API key, whose script quota the rule's runs count against
+        """
+        if not isinstance(name, str) or not RULE_NAME_PATTERN.match(name):
+            raise ValueError("Rule name must be 1-64 lowercase letters, digits, '-' or '_'")
+        rule = self._validate(spec)
+        rule.update(name=name, owner=owner)
+        with self._lock:
+            previous = self.rules.get(name)
+            rule.update(
+                created_at=previous['created_at'] if previous else datetime.now().isoformat(),
+                fired=0, skipped=0, last_fired=None, last_error=None,
+            )
+            self.rules[name] = rule
+            replaced = self._subscriptions.pop(name, None)
+            self._subscribe(rule)
+            self._save()
+            result = self._public(rule)
+        self._close(replaced)
+        return result
+
+    def remove(self, name: str):
+        with self._lock:
+            if self.rules.pop(name, None) is None:
+                raise ValueError("Rule not found")
+            self._last_fired.pop(name, None)
+            subscription = self._subscriptions.pop(name, None)
+            self._save()
+        self._close(subscription)
+
+    def list_rules(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._public(r) for r in sorted(self.rules.values(), key=lambda r: r['name'])]
+
+    def shutdown(self):
+        with self._lock:
+            subscriptions, self._subscriptions = list(self._subscriptions.values()), {}
+        for subscription in subscriptions:
+            self._close(subscription)
+
+    def _validate(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        on = spec.get('on')
+        if not isinstance(on, str) or not EVENT_PATTERN.match(on):
+            raise ValueError("'on' must be an event type or pattern")
+        if not any(c in on for c in '*?') and on not in EVENT_TYPES and not on.startswith('hook.'):
+            raise ValueError(f"Unknown event type {on!r}, expected one of: {', '.join(EVENT_TYPES)}, hook.<name>")
+
+        when = spec.get('when') or {}
+        if not isinstance(when, dict):
+            raise ValueError("'when' must be an object")
+        fields = EVENT_TYPES.get(on)
+        for field, expected in when.items():
+            if fields is not None and field not in fields:
+                raise ValueError(f"{on} events have no field {field!r}, expected one of: {', '.join(fields)}")
+            values = expected if isinstance(expected, list) else [expected]
+            if not values or not all(isinstance(v, (str, int, float, bool)) for v in values):
+                raise ValueError(f"'when.{field}' must be a value or a list of values")
+
+        cooldown = spec.get('cooldown', DEFAULT_COOLDOWN)
+        if not isinstance(cooldown, (int, float)) or cooldown < 0:
+            raise ValueError("cooldown must be a non-negative number of seconds")
+
+        do = spec.get('do')
+        if not isinstance(do, dict):
+            raise ValueError("'do' must be an object")
+        action = do.get('action')
+        if action not in ACTIONS:
+            raise ValueError(f"action must be one of: {', '.join(ACTIONS)}")
+        if action in ('start_automation', 'stop_automation'):
+            self.manager.get_automation(do.get('automation'))
+            config = do.get('config', {})
+            if not isinstance(config, dict):
+                raise ValueError("config must be an object")
+            do = {'action': action, 'automation': do['automation'], 'config': config}
+        elif action == 'run_script':
+            if do.get('script') not in {s['filename'] for s in self.script_manager.list_scripts()}:
+                raise FileNotFoundError("Script not found")
+            args, env = validate_params(do.get('args'), do.get('env'))
+            do = {'action': action, 'script': do['script'], 'args': args, 'env': env}
+        elif action == 'notify':
+            message = do.get('message')
+            if not isinstance(message, str) or not message or len(message) > MAX_MESSAGE_LENGTH:
+                raise ValueError(f"message must be 1-{MAX_MESSAGE_LENGTH} characters")
+            method = do.get('method', 'console')
+            if self.notifier is not None and method not in self.notifier.channels:
+                raise ValueError(f"Unknown notification method: {method}")
+            do = {'action': action, 'message': message, 'method': method}
+        else:
+            container = do.get('container')
+            if not isinstance(container, str) or not (
+                    container.startswith('$') or _validate_container_id(container)):
+                raise ValueError("container must be a container ID/name or a $field of the event")
+            do = {'action': action, 'container': container}
+        return {'on': on, 'when': when, 'do': do, 'cooldown': cooldown}
+
+    def _subscribe(self, rule: Dict[str, Any]):
+        """Give the rule its own queue and delivery thread (lock held)"""
+        name = rule['name']
+        self._subscriptions[name] = self.bus.subscribe(
+            rule['on'], lambda event: self._handle(name, event),
+            queue_size=self.queue_size, name=f"rule:{name}"
+        )
+
+    def _close(self, subscription: Optional[Subscription]):
+        """Unsubscribe without the lock held: the rule's thread may be waiting for it"""
+        if subscription is not None:
+            self.bus.unsubscribe(subscription)
+
+    @staticmethod
+    def matches(rule: Dict[str, Any], payload: Dict[str, Any]) -> bool:
+        """True if the payload satisfies every condition of the rule"""
+        for field, expected in rule['when'].items():
+            expected = expected if isinstance(expected, list) else [expected]
+            actual = payload.get(field)
+            actual = actual if isinstance(actual, list) else [actual]
+            if not any(value in actual for value in expected):
+                return False
+        return True
+
+    def _handle(self, name: str, event: Event):
+        """Run the rule's action for a matching event (on the rule's thread)"""
+        with self._lock:
+            rule = self.rules.get(name)
+        if rule is None or not self.matches(rule, event.payload):
+            return
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_fired.get(name)
+            if last is not None and now - last < rule['cooldown']:
+                rule['skipped'] += 1
+                return
+            self._last_fired[name] = now
+        try:
+            self._perform(rule, event)
+            error = None
+        except Exception as e:
+            logger.error(f"Rule {name} failed on {event.type}: {e}")
+            error = str(e)[:1000]
+        with self._lock:
+            rule['last_error'] = error
+            if error is None:
+                rule['fired'] += 1
+                rule['last_fired'] = datetime.now().isoformat()
+
+    def _perform(self, rule: Dict[str, Any], event: Event):
+        do = rule['do']
+        action = do['action']
+        payload = event.payload
+        if action == 'start_automation':
+            self.manager.start_automation(do['automation'], do['config'])
+        elif action == 'stop_automation':
+            self.manager.stop_automation(do['automation'])
+        elif action == 'run_script':
+            trigger = payload.get('trigger') if isinstance(payload.get('trigger'), dict) else {}
+            depth = trigger.get('depth', 0) if 'rule' in trigger else 0
+            if depth >= MAX_CHAIN_DEPTH:
+                raise RuntimeError(f"Not running {do['script']}: chain of {depth} rule-started scripts")
+            owner = rule.get('owner')
+            max_running = None
+            if owner is not None and self.key_store is not None:
+                identity = self.key_store.get(owner)
+                if identity is None:
+                    raise PermissionError(f"API key {owner!r} that defined the rule no longer exists")
+                max_running = identity.max_running_scripts
+            env = {**do['env'], 'EVENT_TYPE': event.type, 'EVENT_ID': str(event.id),
+                   'EVENT_PAYLOAD': json.dumps(payload)}
+            self.script_manager.run_script(
+                do['script'], owner=owner, max_running=max_running,
+                args=[_substitute(a, payload) for a in do['args']], env=env,
+                trigger={'rule': rule['name'], 'event': event.id, 'depth': depth + 1}
+            )
+        elif action == 'notify':
+            if self.notifier is None:
+                raise RuntimeError("Notifications are not available")
+            self.notifier.notify(_substitute(do['message'], payload), do['method'], source=f"rule:{rule['name']}")
+        else:
+            container = _substitute(do['container'], payload)
+            getattr(self.docker_manager, action)(container)
+
+    def _public(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        result = dict(rule)
+        subscription = self._subscriptions.get(rule['name'])
+        if subscription is not None:
+            stats = subscription.stats()
+            result.update(queued=stats['queued'], dropped=stats['dropped'])
+        return result
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load rules from {self.path}: {e}")
+            return
+        for rule in stored.get('rules', []):
+            if 'name' not in rule:
+                continue
+            rule.update(fired=0, skipped=0, last_fired=None, last_error=None)
+            self.rules[rule['name']] = rule
+            self._subscribe(rule)
+
+    def _save(self):
+        """Write the rule definitions atomically (lock held)"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', mode=0o755, exist_ok=True)
+        keys = ('name', 'on', 'when', 'do', 'cooldown', 'owner', 'created_at')
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'rules': [{k: r.get(k) for k in keys} for r in self.rules.values()]}, f, indent=2)
+        os.replace(tmp_path, self.path)
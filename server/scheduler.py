@@ -0,0 +1,211 @@
+"""
+Scheduler - cron expressions and a single-thread timer heap
+
+CronExpression computes the next fire time field by field (month, day,
+hour, minute) instead of scanning minute by minute. HeapScheduler keeps
+every pending job in one heap served by one timer thread, so idle
+schedules cost nothing but a heap entry; due callbacks run on a small
+worker pool so a slow one (stopping an automation) delays no other job.
+
+Cron syntax: "minute hour day-of-month month day-of-week" with *, lists,
+ranges and steps (e.g. "*/15 8-18 * * 1-5"), day-of-week 0-7 (0 and 7 are
+Sunday), or one of @hourly, @daily, @weekly, @monthly, @yearly.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, FrozenSet, Hashable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+# (name, min, max) of the five cron fields
+CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day of month', 1, 31),
+    ('month', 1, 12),
+    ('day of week', 0, 7),
+)
+
+# Upper bound for next_after(); a valid expression always fires within 4 years (Feb 29)
+MAX_SEARCH_DAYS = 366 * 5
+
+
+def _parse_field(text: str, name: str, low: int, high: int) -> FrozenSet[int]:
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise ValueError(f"Invalid step in {name} field: {text}")
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            if not (start_text.isdigit() and end_text.isdigit()):
+                raise ValueError(f"Invalid range in {name} field: {text}")
+            start, end = int(start_text), int(end_text)
+        elif part.isdigit():
+            start = int(part)
+            end = high if step > 1 else start
+        else:
+            raise ValueError(f"Invalid {name} field: {text}")
+        if start < low or end > high or start > end:
+            raise ValueError(f"{name.capitalize()} field out of range ({low}-{high}): {text}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronExpression:
+    """Parsed 5-field cron expression"""
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        text = CRON_ALIASES.get(self.expression.lower(), self.expression)
+        parts = text.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        fields = [_parse_field(part, *spec) for part, spec in zip(parts, CRON_FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        # cron: 0 and 7 are Sunday; Python: Monday=0 .. Sunday=6
+        self.weekdays = frozenset((d - 1) % 7 for d in weekdays)
+        # If both day fields are restricted a day matches either (standard cron)
+        self._dom_any = parts[2] == '*'
+        self._dow_any = parts[4] == '*'
+        self._sorted_minutes = sorted(self.minutes)
+        self._sorted_hours = sorted(self.hours)
+
+    def __repr__(self):
+        return f"CronExpression({self.expression!r})"
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_dom = day.day in self.days
+        in_dow = day.weekday() in self.weekdays
+        if self._dom_any:
+            return in_dow
+        if self._dow_any:
+            return in_dom
+        return in_dom or in_dow
+
+    def next_after(self, after: datetime) -> datetime:
+        """First matching minute strictly after `after` (naive local time)"""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=MAX_SEARCH_DAYS)
+        while t < limit:
+            if t.month not in self.months:
+                year, month = (t.year + 1, 1) if t.month == 12 else (t.year, t.month + 1)
+                t = t.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(t):
+                t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if t.hour not in self.hours:
+                later = [h for h in self._sorted_hours if h > t.hour]
+                if later:
+                    t = t.replace(hour=later[0], minute=0)
+                else:
+                    t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if t.minute not in self.minutes:
+                later = [m for m in self._sorted_minutes if m > t.minute]
+                if later:
+                    t = t.replace(minute=later[0])
+                else:
+                    t = (t + timedelta(hours=1)).replace(minute=0)
+                continue
+            return t
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+def parse_at(value: str) -> datetime:
+    """One-shot time in ISO format ("2030-01-01T08:00")"""
+    try:
+        return datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid 'at' time, expected ISO format: {value!r}")
+
+
+class HeapScheduler:
+    """Runs callbacks at wall-clock times, timed by a single thread"""
+
+    # Re-check the heap at least this often so wall clock jumps are noticed
+    MAX_WAIT = 30.0
+
+    def __init__(self, workers: int = 4):
+        self.workers = workers
+        self._heap = []  # (timestamp, seq, key)
+        self._jobs: Dict[Hashable, tuple] = {}  # key -> (seq, callback)
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+
+    def schedule(self, key: Hashable, when: float, callback: Callable[[], None]):
+        """Run callback at Unix time `when`, replacing any job with the same key"""
+        with self._cond:
+            seq = next(self._counter)
+            self._jobs[key] = (seq, callback)
+            heapq.heappush(self._heap, (when, seq, key))
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scheduler-job')
+                self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Forget a pending job (its heap entry is skipped lazily)"""
+        with self._cond:
+            return self._jobs.pop(key, None) is not None
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    def next_run(self, key: Hashable) -> Optional[float]:
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None:
+                return None
+            return next((when for when, seq, k in self._heap if seq == job[0]), None)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    # Drop entries of cancelled or rescheduled jobs
+                    while self._heap and self._jobs.get(self._heap[0][2], (None,))[0] != self._heap[0][1]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(min(delay, self.MAX_WAIT))
+                _, seq, key = heapq.heappop(self._heap)
+                _, callback = self._jobs.pop(key)
+            self._executor.submit(self._run, key, callback)
+
+    @staticmethod
+    def _run(key: Hashable, callback: Callable[[], None]):
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Scheduled job {key!r} failed: {e}")
@@ -0,0 +1,131 @@
+"""
+Script Cache - on-disk result cache for idempotent scripts
+
+Scripts opt in with a header comment (`# @cache ttl=10m`). A successful
+run's output is stored under a key derived from the script's content and
+its arguments/environment, so editing the script or changing parameters
+never returns stale output. Entries expire after their TTL, and the least
+recently used ones are evicted once the cache exceeds its size budget.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(script: bytes, args: List[str], env: Dict[str, str]) -> str:
+    """Hex SHA-256 of the script content and its parameters"""
+    digest = hashlib.sha256(script)
+    digest.update(b'\0')
+    digest.update(json.dumps([args, sorted(env.items())]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ScriptResultCache:
+    """Size-bounded LRU of script results, one JSON file per entry"""
+
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()  # key -> file size, oldest first
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        """Rebuild the LRU order from file modification times"""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith('.json')]
+        except FileNotFoundError:
+            return
+        files = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result, None if missing or expired"""
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return None
+            try:
+                with open(self._path(key), encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+            if entry is None or entry.get('expires_at', 0) <= time.time():
+                self._remove(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            try:
+                os.utime(self._path(key))  # recency survives restarts
+            except OSError:
+                pass
+            self._hits += 1
+            return entry
+
+    def put(self, key: str, result: Dict[str, Any], ttl: int):
+        """Store a result for ttl seconds"""
+        now = time.time()
+        entry = {**result, 'cached_at': now, 'expires_at': now + ttl}
+        data = json.dumps(entry).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            os.makedirs(self.directory, mode=0o755, exist_ok=True)
+            tmp_path = self._path(key) + '.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                logger.error(f"Could not write script cache entry: {e}")
+                return
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            while self._size > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        """Drop an entry (lock held)"""
+        self._size -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
@@ -0,0 +1,233 @@
+"""
+Script Directives - per-script settings declared in header comments
+
+A script opts into settings with `@name key=value ...` comments at the top
+of the file (before the first code line):
+
+  #!/bin/bash
+  # @limits cpu=60 memory=256M files=64 nice=10 io=idle
+
+@limits sets resource limits for every run of the script:
+  cpu     CPU seconds (s/m/h suffix allowed); SIGXCPU, then SIGKILL 2s later
+  memory  address space in bytes (K/M/G suffix)
+  files   open file descriptors
+  nice    scheduling niceness 0-19
+  io      I/O priority: idle or best-effort[:0-7] (Linux)
+
+Server-wide defaults (SCRIPT_LIMITS, same syntax) always apply; a script
+can tighten them but not loosen them.
+
+Limits are applied in the child before the script is exec'd (by the fork
+server, or by running this module as a launcher, see limited_command());
+a run whose limits cannot be applied fails with exit status 126.
+
+@cache ttl=10m marks the script as idempotent: a successful run's output is
+reused for identical arguments/environment until the TTL passes (see
+script_cache.py).
+"""
+import ctypes
+import json
+import logging
+import os
+import platform
+import re
+import sys
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+# Only the first lines of a script are searched for directives
+HEADER_BYTES = 4096
+DIRECTIVE_PATTERN = re.compile(r'^\s*(?:#|//|--)\s*@([a-z_]+)\b(.*)$')
+
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+_TIME_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600}
+
+# I/O scheduling classes (linux/ioprio.h); realtime needs root and is not offered
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+# Exit status of a run whose limits could not be applied (as for "cannot execute")
+LIMITS_FAILED_EXIT = 126
+_IOPRIO_SET_SYSCALL = {'x86_64': 251, 'aarch64': 30, 'i386': 289, 'i686': 289, 'armv7l': 314}
+
+
+def read_directives(path: str) -> Dict[str, Dict[str, str]]:
+    """Directives in the script's header comments: {name: {key: value}}"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_BYTES).decode('utf-8', errors='replace')
+    directives: Dict[str, Dict[str, str]] = {}
+    for line in header.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#!'):
+            continue
+        match = DIRECTIVE_PATTERN.match(line)
+        if match is None:
+            if stripped.startswith(('#', '//', '--')):
+                continue
+            break  # first code line ends the header
+        values = directives.setdefault(match.group(1), {})
+        for item in match.group(2).split():
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise ValueError(f"Invalid @{match.group(1)} setting {item!r}, expected key=value")
+            values[key.lower()] = value
+    return directives
+
+
+def _parse_number(value: str, units: Dict[str, int], what: str) -> int:
+    match = re.fullmatch(r'(\d+)([a-zA-Z]?)[bB]?', value.strip())
+    if not match or match.group(2).lower() not in units:
+        raise ValueError(f"Invalid {what}: {value!r}")
+    return int(match.group(1)) * units[match.group(2).lower()]
+
+
+def parse_cache_ttl(settings: Dict[str, str]) -> int:
+    """TTL in seconds from the settings of a @cache directive"""
+    unknown = set(settings) - {'ttl'}
+    if unknown:
+        raise ValueError(f"Unknown cache setting {sorted(unknown)[0]!r}")
+    if 'ttl' not in settings:
+        raise ValueError("@cache needs ttl=<seconds>")
+    ttl = _parse_number(settings['ttl'], _TIME_UNITS, 'cache ttl')
+    if ttl <= 0:
+        raise ValueError("cache ttl must be positive")
+    return ttl
+
+
+class ResourceLimits:
+    """rlimits and scheduling priority of a script run"""
+
+    __slots__ = ('cpu_seconds', 'memory_bytes', 'open_files', 'nice', 'io_class', 'io_level')
+
+    def __init__(self, cpu_seconds: int = None, memory_bytes: int = None, open_files: int = None,
+                 nice: int = None, io_class: int = None, io_level: int = None):
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.open_files = open_files
+        self.nice = nice
+        self.io_class = io_class
+        self.io_level = io_level
+
+    @classmethod
+    def parse(cls, settings) -> 'ResourceLimits':
+        """From "cpu=60 memory=256M ..." or the dict of an @limits directive"""
+        if isinstance(settings, str):
+            settings = dict(item.partition('=')[::2] for item in settings.split())
+        limits = cls()
+        for key, value in settings.items():
+            if key == 'cpu':
+                limits.cpu_seconds = _parse_number(value, _TIME_UNITS, 'cpu limit')
+            elif key == 'memory':
+                limits.memory_bytes = _parse_number(value, _SIZE_UNITS, 'memory limit')
+            elif key == 'files':
+                limits.open_files = _parse_number(value, {'': 1}, 'open files limit')
+            elif key == 'nice':
+                limits.nice = _parse_number(value, {'': 1}, 'nice value')
+                if limits.nice > 19:
+                    raise ValueError("nice must be between 0 and 19")
+            elif key == 'io':
+                io_class, _, level = value.partition(':')
+                if io_class == 'idle' and not level:
+                    limits.io_class, limits.io_level = IOPRIO_CLASS_IDLE, 0
+                elif io_class == 'best-effort' and (not level or (level.isdigit() and int(level) <= 7)):
+                    limits.io_class, limits.io_level = IOPRIO_CLASS_BE, int(level or 4)
+                else:
+                    raise ValueError(f"Invalid io priority {value!r}, expected idle or best-effort[:0-7]")
+            else:
+                raise ValueError(f"Unknown limit {key!r}")
+        return limits
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'ResourceLimits':
+        return cls(**{k: v for k, v in (data or {}).items() if k in cls.__slots__})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__ if getattr(self, k) is not None}
+
+    def __bool__(self):
+        return any(getattr(self, k) is not None for k in self.__slots__)
+
+    def tighten(self, other: 'ResourceLimits') -> 'ResourceLimits':
+        """The stricter of both limits, field by field"""
+        def lower(a, b):
+            return b if a is None else a if b is None else min(a, b)
+
+        def higher(a, b):
+            return b if a is None else a if b is None else max(a, b)
+
+        io = max(((limits.io_class, limits.io_level) for limits in (self, other) if limits.io_class is not None),
+                 default=(None, None))
+        return ResourceLimits(
+            cpu_seconds=lower(self.cpu_seconds, other.cpu_seconds),
+            memory_bytes=lower(self.memory_bytes, other.memory_bytes),
+            open_files=lower(self.open_files, other.open_files),
+            nice=higher(self.nice, other.nice),
+            io_class=io[0],
+            io_level=io[1],
+        )
+
+    def apply(self):
+        """Apply to the calling process (the child, before it execs the script)"""
+        if resource is not None:
+            for limit, value, slack in ((resource.RLIMIT_CPU, self.cpu_seconds, 2),
+                                        (resource.RLIMIT_AS, self.memory_bytes, 0),
+                                        (resource.RLIMIT_NOFILE, self.open_files, 0)):
+                if value is not None:
+                    _, current_hard = resource.getrlimit(limit)
+                    soft, hard = value, value + slack
+                    if current_hard != resource.RLIM_INFINITY:
+                        soft, hard = min(soft, current_hard), min(hard, current_hard)
+                    resource.setrlimit(limit, (soft, hard))
+        if self.nice:
+            os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+        if self.io_class is not None:
+            _ioprio_set(0, self.io_class, self.io_level or 0)
+
+
+def _ioprio_set(pid: int, io_class: int, level: int):
+    number = _IOPRIO_SET_SYSCALL.get(platform.machine())
+    if number is None or platform.system() != 'Linux':
+        raise OSError(f"I/O priority is not supported on {platform.system()} {platform.machine()}")
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(number, IOPRIO_WHO_PROCESS, pid, (io_class << IOPRIO_CLASS_SHIFT) | level) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def rusage_to_dict(usage) -> Dict[str, Any]:
+    """CPU time and peak memory from a wait4() resource usage"""
+    max_rss = usage.ru_maxrss
+    if platform.system() == 'Darwin':
+        max_rss //= 1024  # bytes on macOS, KiB elsewhere
+    return {
+        'user_time': round(usage.ru_utime, 4),
+        'system_time': round(usage.ru_stime, 4),
+        'max_rss_kb': max_rss,
+    }
+
+
+def limited_command(cmd: List[str], limits: ResourceLimits) -> List[str]:
+    """Command line that applies the limits in the new process, then execs cmd
+
+    preexec_fn is unsafe in a threaded server, so the limits are set by a
+    small launcher (this module) instead of on the running script.
+    """
+    return [sys.executable, os.path.abspath(__file__), json.dumps(limits.to_dict()), *cmd]
+
+
+if __name__ == '__main__':
+    # Launcher: script_directives.py '<limits JSON>' command [args...]
+    try:
+        ResourceLimits.from_dict(json.loads(sys.argv[1])).apply()
+        os.execvp(sys.argv[2], sys.argv[2:])
+    except (OSError, ValueError) as e:
+        print(f"Could not apply resource limits: {e}", file=sys.stderr)
+        sys.exit(LIMITS_FAILED_EXIT)
@@ -3,17 +3,109 @@ Script Manager - Auto-discovers and runs scripts from the scripts/ directory
 Secured against path traversal and command injection attacks.
 """
 import os
+import json
+import logging
 import subprocess
 import threading
 import uuid
 import re
-from typing import Dict, List, Any
+import signal
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
+from events import SCRIPT_FINISHED, EventBus, bus as default_bus
+from forkserver import ForkServer, ForkServerError
+from script_cache import ScriptResultCache, cache_key
+from script_directives import ResourceLimits, limited_command, parse_cache_ttl, read_directives, rusage_to_dict
+from scheduler import CronExpression, HeapScheduler
+
+
+logger = logging.getLogger(__name__)
+
+# What a schedule does when its previous run is still going
+OVERLAP_POLICIES = ('skip', 'queue', 'kill')
+
 
 # Strict filename pattern - alphanumeric, underscore, dash, dot only
 FILENAME_PATTERN = re.compile(r'^[a-zA-Z0-9_.-]+$')
 
+# Script parameters
+MAX_ARGS = 64
+MAX_ENV_VARS = 32
+MAX_PARAM_LENGTH = 4096
+ENV_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+# Variables that change how the interpreter, shell or loader itself behaves
+BLOCKED_ENV_PREFIXES = ('LD_', 'DYLD_', 'PYTHON', 'BASH_')
+BLOCKED_ENV_NAMES = frozenset({
+    'PATH', 'HOME', 'SHELL', 'ENV', 'IFS', 'CDPATH', 'GLOBIGNORE', 'SHELLOPTS', 'BASHOPTS', 'PS4'
+})
+
+# Fan-out batches
+MAX_BATCH_SIZE = 1000
+MAX_BATCH_CONCURRENCY = 16
+BATCH_OUTPUT_SIZE = 64 * 1024  # per run in the batch result
+MAX_BATCHES = 100
+
+# Finished runs whose status and output stay available via get_script_status
+MAX_FINISHED_RUNS = 100
+
+
+class QuotaExceededError(Exception):
+    """Caller already runs as many scripts as its quota allows"""
+    pass
+
+
+class _AccountedPopen(subprocess.Popen):
+    """Popen that reaps the child with wait4() to keep its resource usage"""
+
+    resources = None
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, sts, usage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return super()._try_wait(wait_flags)
+        if pid == self.pid:
+            self.resources = rusage_to_dict(usage)
+        return pid, sts
+
+
+def validate_params(args: Any, env: Any) -> Tuple[List[str], Dict[str, str]]:
+    """Validate script arguments and environment variables, return them as strings"""
+    if args is None:
+        args = []
+    if not isinstance(args, list) or len(args) > MAX_ARGS:
+        raise ValueError(f"args must be a list of at most {MAX_ARGS} values")
+    clean_args = []
+    for arg in args:
+        if isinstance(arg, bool) or not isinstance(arg, (str, int, float)):
+            raise ValueError("args must be strings or numbers")
+        arg = str(arg)
+        if len(arg) > MAX_PARAM_LENGTH or '\x00' in arg:
+            raise ValueError(f"Invalid argument (max {MAX_PARAM_LENGTH} characters, no NUL bytes)")
+        clean_args.append(arg)
+
+    if env is None:
+        env = {}
+    if not isinstance(env, dict) or len(env) > MAX_ENV_VARS:
+        raise ValueError(f"env must be an object with at most {MAX_ENV_VARS} variables")
+    clean_env = {}
+    for name, value in env.items():
+        if not ENV_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid environment variable name: {name[:64]!r}")
+        upper = name.upper()
+        if upper in BLOCKED_ENV_NAMES or upper.startswith(BLOCKED_ENV_PREFIXES):
+            raise ValueError(f"Environment variable not allowed: {name}")
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError(f"Value of {name} must be a string or number")
+        value = str(value)
+        if len(value) > MAX_PARAM_LENGTH or '\x00' in value:
+            raise ValueError(f"Invalid value for {name} (max {MAX_PARAM_LENGTH} characters, no NUL bytes)")
+        clean_env[name] = value
+    return clean_args, clean_env
+
 
 def _validate_filename(filename: str) -> bool:
     """Validate filename to prevent path traversal"""
@@ -34,11 +126,32 @@ class ScriptManager:
     ALLOWED_EXTENSIONS = frozenset({'.py', '.sh', '.bash'})
     MAX_OUTPUT_SIZE = 1024 * 1024  # 1MB max output
 
-    def __init__(self):
+    def __init__(self, scheduler: HeapScheduler = None, schedules_path: str = None,
+                 forkserver: ForkServer = None, limits: ResourceLimits = None,
+                 cache: ScriptResultCache = None, bus: EventBus = None):
         self.running_scripts: Dict[str, Dict[str, Any]] = {}
         self.script_history: List[Dict[str, Any]] = []
+        self._finished_runs = deque()  # run IDs in running_scripts, oldest finished first
         self._lock = threading.Lock()
+        # Notified when a run finishes, for batch runs waiting for a quota slot
+        self._run_finished = threading.Condition(self._lock)
         self._ensure_scripts_dir()
+        # Warm interpreter for .py scripts (None: start python3 for every run)
+        self.forkserver = forkserver
+        # Server-wide resource limits; a script's @limits can only tighten them
+        self.limits = limits or ResourceLimits()
+        # Results of scripts marked with @cache (None: always run)
+        self.cache = cache
+        # Finished runs are published as script.finished events
+        self.bus = bus or default_bus
+        # Fan-out runs of one script over many parameter sets
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        # Recurring runs, fired by the shared timer thread and saved to schedules_path
+        self.scheduler = scheduler or HeapScheduler()
+        self.schedules_path = schedules_path
+        self.schedules: Dict[str, Dict[str, Any]] = {}
+        self._schedule_lock = threading.RLock()
+        self._load_schedules()
 
     def _ensure_scripts_dir(self):
         """Create scripts directory if it doesn't exist"""
@@ -101,8 +214,41 @@ class ScriptManager:
 
         return realpath
 
-    def run_script(self, filename: str) -> Dict[str, Any]:
-        """Run a script and return execution info"""
+    def run_script(self, filename: str, owner: str = None, max_running: int = None,
+                   on_finish: Callable[[Dict[str, Any]], None] = None,
+                   args: List[Any] = None, env: Dict[str, Any] = None, use_cache: bool = True,
+                   trigger: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Run a script and return execution info
+
+        owner/max_running: at most max_running scripts of the same owner run at once
+        on_finish: called with the execution record once the script has ended
+        args/env: command line arguments and extra environment variables
+        use_cache: False runs a @cache script even if a cached result exists
+        trigger: what started the run ({"hook": name}, {"rule": name}, ...), kept in
+            the execution record and its script.finished event
+        """
+        args, env = validate_params(args, env)
+        execution, cmd = self._create_execution(filename, owner, max_running, args, env, use_cache, trigger)
+        if cmd is None:
+            # Cached result, nothing to run
+            self._finish(execution, on_finish)
+            return {
+                'id': execution['id'], 'filename': filename, 'status': execution['status'], 'cached': True,
+                'output': execution['output'], 'error': execution['error'],
+                'return_code': execution['return_code'],
+            }
+
+        # Run in background thread
+        thread = threading.Thread(target=self._execute, args=(execution, cmd, env, on_finish), daemon=True)
+        thread.start()
+
+        return {'id': execution['id'], 'filename': filename, 'status': 'running'}
+
+    def _create_execution(self, filename: str, owner: Optional[str], max_running: Optional[int],
+                          args: List[str], env: Dict[str, str], use_cache: bool = True,
+                          trigger: Dict[str, Any] = None):
+        """Register a running execution record, return it and its command line
+        (None if the record was filled from the result cache)"""
         filepath = self._validate_script_path(filename)
         ext = os.path.splitext(filename)[1].lower()
 
@@ -110,68 +256,151 @@ class ScriptManager:
 
         # Determine how to run the script - use absolute paths
         if ext == '.py':
-            cmd = ['python3', filepath]
+            cmd = ['python3', filepath, *args]
         elif ext in {'.sh', '.bash'}:
-            cmd = ['bash', filepath]
+            cmd = ['bash', filepath, *args]
         else:
             raise ValueError("Unknown extension")
 
-        # Create execution record
+        directives = read_directives(filepath)
+        try:
+            limits = self.limits.tighten(ResourceLimits.parse(directives.get('limits', {})))
+        except ValueError as e:
+            raise ValueError(f"Invalid @limits in {filename}: {e}")
+        cache = None
+        if 'cache' in directives:
+            try:
+                ttl = parse_cache_ttl(directives['cache'])
+            except ValueError as e:
+                raise ValueError(f"Invalid @cache in {filename}: {e}")
+            if self.cache is not None:
+                with open(filepath, 'rb') as f:
+                    cache = {'key': cache_key(f.read(), args, env), 'ttl': ttl, 'hit': False}
+
+        # Create execution record (environment values may be secrets, keep only the names)
         execution = {
             'id': run_id,
             'filename': filename,
             'status': 'running',
             'started_at': datetime.now().isoformat(),
+            'args': args,
+            'env_keys': sorted(env),
             'output': '',
             'error': '',
             'return_code': None,
+            'limits': limits.to_dict() or None,
+            'resources': None,
+            'cache': cache,
+            'owner': owner,
+            'trigger': trigger,
             'process': None
         }
+        cached = self.cache.get(cache['key']) if cache and use_cache else None
+        if cached is not None:
+            execution.update(
+                status='completed',
+                output=cached['output'],
+                error=cached['error'],
+                return_code=cached['return_code'],
+                finished_at=datetime.now().isoformat(),
+            )
+            cache.update(hit=True, cached_at=datetime.fromtimestamp(cached['cached_at']).isoformat())
+            with self._lock:
+                self.running_scripts[run_id] = execution
+            return execution, None
 
         with self._lock:
+            if owner is not None and max_running is not None:
+                running = sum(
+                    1 for s in self.running_scripts.values()
+                    if s.get('owner') == owner and s['status'] == 'running'
+                )
+                if running >= max_running:
+                    raise QuotaExceededError(f"Quota of {max_running} running script(s) reached")
             self.running_scripts[run_id] = execution
-
-        # Run in background thread
-        def run_in_thread():
-            try:
-                process = subprocess.Popen(
-                    cmd,
+        return execution, cmd
+
+    def _execute(self, execution: Dict[str, Any], cmd: List[str], env: Dict[str, str],
+                 on_finish: Callable[[Dict[str, Any]], None] = None):
+        """Run the command to completion and fill in the execution record"""
+        try:
+            process = None
+            limits = ResourceLimits.from_dict(execution['limits'])
+            if cmd[0] == 'python3' and self.forkserver is not None:
+                try:
+                    # The forked child applies the limits itself before running the script
+                    process = self.forkserver.spawn(cmd[1], cwd=self.SCRIPTS_DIR, args=cmd[2:], env=env,
+                                                    limits=execution['limits'])
+                except ForkServerError as e:
+                    logger.warning(f"{e}; starting a new interpreter instead")
+            if process is None:
+                process = _AccountedPopen(
+                    limited_command(cmd, limits) if limits else cmd,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE,
                     cwd=self.SCRIPTS_DIR,
+                    env={**os.environ, **env} if env else None,
                     shell=False  # Prevent shell injection
                 )
-                execution['process'] = process
-                stdout, stderr = process.communicate(timeout=3600)  # 1 hour timeout
-
-                # Limit output size
-                execution['output'] = stdout.decode('utf-8', errors='replace')[:self.MAX_OUTPUT_SIZE]
-                execution['error'] = stderr.decode('utf-8', errors='replace')[:self.MAX_OUTPUT_SIZE]
-                execution['return_code'] = process.returncode
+            execution['process'] = process
+            stdout, stderr = process.communicate(timeout=3600)  # 1 hour timeout
+
+            # Limit output size
+            execution['output'] = stdout.decode('utf-8', errors='replace')[:self.MAX_OUTPUT_SIZE]
+            execution['error'] = stderr.decode('utf-8', errors='replace')[:self.MAX_OUTPUT_SIZE]
+            execution['return_code'] = process.returncode
+            execution['resources'] = process.resources
+            if process.returncode == -getattr(signal, 'SIGXCPU', 0):
+                execution['error'] += f"\nCPU time limit of {limits.cpu_seconds}s exceeded"
+            # Stored before the status flips so a caller polling for completion hits the cache
+            if execution['cache'] and execution['status'] == 'running' and process.returncode == 0:
+                self.cache.put(execution['cache']['key'], {
+                    'filename': execution['filename'],
+                    'output': execution['output'],
+                    'error': execution['error'],
+                    'return_code': execution['return_code'],
+                }, execution['cache']['ttl'])
+            if execution['status'] == 'running':  # keep 'stopped' set by stop_script
                 execution['status'] = 'completed' if process.returncode == 0 else 'failed'
-                execution['finished_at'] = datetime.now().isoformat()
-            except subprocess.TimeoutExpired:
-                execution['status'] = 'timeout'
-                execution['error'] = 'Script execution timed out'
-                execution['finished_at'] = datetime.now().isoformat()
-                if execution['process']:
-                    execution['process'].kill()
+            execution['finished_at'] = datetime.now().isoformat()
+        except subprocess.TimeoutExpired:
+            execution['status'] = 'timeout'
+            execution['error'] = 'Script execution timed out'
+            execution['finished_at'] = datetime.now().isoformat()
+            if execution['process']:
+                execution['process'].kill()
+        except Exception as e:
+            execution['status'] = 'error'
+            execution['error'] = str(e)[:1000]
+            execution['finished_at'] = datetime.now().isoformat()
+        finally:
+            execution['process'] = None
+            self._finish(execution, on_finish)
+
+    def _finish(self, execution: Dict[str, Any], on_finish: Callable[[Dict[str, Any]], None] = None):
+        """Record a finished execution in the history, notify on_finish and publish it"""
+        with self._lock:
+            # Limit history size
+            if len(self.script_history) >= 100:
+                self.script_history = self.script_history[-99:]
+            self.script_history.append(execution.copy())
+            # Forget the oldest finished runs
+            self._finished_runs.append(execution['id'])
+            while len(self._finished_runs) > MAX_FINISHED_RUNS:
+                self.running_scripts.pop(self._finished_runs.popleft(), None)
+            self._run_finished.notify_all()
+        self.bus.publish(SCRIPT_FINISHED, {
+            'run_id': execution['id'],
+            'filename': execution['filename'],
+            'status': execution['status'],
+            'return_code': execution['return_code'],
+            'trigger': execution['trigger'],
+        }, source='scripts')
+        if on_finish is not None:
+            try:
+                on_finish(execution)
             except Exception as e:
-                execution['status'] = 'error'
-                execution['error'] = str(e)[:1000]
-                execution['finished_at'] = datetime.now().isoformat()
-            finally:
-                execution['process'] = None
-                with self._lock:
-                    # Limit history size
-                    if len(self.script_history) >= 100:
-                        self.script_history = self.script_history[-99:]
-                    self.script_history.append(execution.copy())
-
-        thread = threading.Thread(target=run_in_thread, daemon=True)
-        thread.start()
-
-        return {'id': run_id, 'filename': filename, 'status': 'running'}
+                logger.error(f"Error after script {execution['filename']} finished: {e}")
 
     def get_script_status(self, run_id: str) -> Dict[str, Any]:
         """Get status of a running/completed script"""
@@ -209,3 +438,315 @@ class ScriptManager:
                     running.append(info)
             return running
 
+    # ============== BATCHES ==============
+
+    def run_batch(self, filename: str, params: List[Dict[str, Any]], concurrency: int = 4,
+                  owner: str = None, max_running: int = None) -> Dict[str, Any]:
+        """Run a script once per parameter set ({"args": [...], "env": {...}}),
+        at most `concurrency` at a time, and collect the results in one batch.
+        Each run counts against the owner's max_running and waits for a free slot"""
+        self._validate_script_path(filename)
+        if not isinstance(params, list) or not params or len(params) > MAX_BATCH_SIZE:
+            raise ValueError(f"params must be a list of 1-{MAX_BATCH_SIZE} parameter sets")
+        parsed = []
+        for index, entry in enumerate(params):
+            if not isinstance(entry, dict):
+                raise ValueError(f"params[{index}] must be an object with args and/or env")
+            try:
+                parsed.append(validate_params(entry.get('args'), entry.get('env')))
+            except ValueError as e:
+                raise ValueError(f"params[{index}]: {e}")
+        try:
+            concurrency = int(concurrency)
+        except (TypeError, ValueError):
+            raise ValueError("concurrency must be a number")
+        if not 1 <= concurrency <= MAX_BATCH_CONCURRENCY:
+            raise ValueError(f"concurrency must be between 1 and {MAX_BATCH_CONCURRENCY}")
+
+        with self._lock:
+            if owner is not None and max_running is not None:
+                # The batch may use whatever is left of the owner's quota
+                running = sum(
+                    1 for s in self.running_scripts.values()
+                    if s.get('owner') == owner and s['status'] == 'running'
+                )
+                if running >= max_running:
+                    raise QuotaExceededError(f"Quota of {max_running} running script(s) reached")
+                concurrency = min(concurrency, max_running - running)
+
+            batch = {
+                'id': str(uuid.uuid4())[:8],
+                'filename': filename,
+                'status': 'running',
+                'owner': owner,
+                '_max_running': max_running,
+                'concurrency': concurrency,
+                'total': len(parsed),
+                'finished': 0,
+                'succeeded': 0,
+                'failed': 0,
+                'cancelled': 0,
+                'exit_codes': {},
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'runs': [
+                    {'index': i, 'id': None, 'args': args, 'status': 'pending'}
+                    for i, (args, _) in enumerate(parsed)
+                ],
+                '_stop': threading.Event(),
+            }
+            self.batches[batch['id']] = batch
+            # Forget the oldest finished batches
+            finished = [b for b in self.batches.values() if b['status'] != 'running']
+            for old in finished[:max(0, len(self.batches) - MAX_BATCHES)]:
+                del self.batches[old['id']]
+            result = self._public_batch(batch)
+
+        threading.Thread(target=self._run_batch, args=(batch, parsed), daemon=True).start()
+        return result
+
+    def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                raise ValueError("Batch not found")
+            return self._public_batch(batch)
+
+    def stop_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Cancel the pending runs of a batch and stop the running ones"""
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                raise ValueError("Batch not found")
+            batch['_stop'].set()
+            self._run_finished.notify_all()  # wake runs waiting for a quota slot
+            running = [run['id'] for run in batch['runs'] if run['status'] == 'running']
+        for run_id in running:
+            self.stop_script(run_id)
+        return self.get_batch(batch_id)
+
+    def _public_batch(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Snapshot of a batch (lock held)"""
+        result = {k: v for k, v in batch.items() if not k.startswith('_')}
+        result['exit_codes'] = dict(batch['exit_codes'])
+        result['runs'] = [dict(run) for run in batch['runs']]
+        return result
+
+    def _run_batch(self, batch: Dict[str, Any], parsed: List[Tuple[List[str], Dict[str, str]]]):
+        with ThreadPoolExecutor(max_workers=batch['concurrency'],
+                                thread_name_prefix=f"batch-{batch['id']}") as pool:
+            for index, (args, env) in enumerate(parsed):
+                pool.submit(self._run_batch_item, batch, index, args, env)
+        with self._lock:
+            if batch['_stop'].is_set():
+                batch['status'] = 'stopped'
+            else:
+                batch['status'] = 'completed' if batch['failed'] == 0 else 'failed'
+            batch['finished_at'] = datetime.now().isoformat()
+
+    def _run_batch_item(self, batch: Dict[str, Any], index: int, args: List[str], env: Dict[str, str]):
+        """Run one parameter set of a batch (on a pool thread)"""
+        run = batch['runs'][index]
+        try:
+            while True:
+                if batch['_stop'].is_set():
+                    with self._lock:
+                        run['status'] = 'cancelled'
+                        batch['cancelled'] += 1
+                    return
+                try:
+                    execution, cmd = self._create_execution(batch['filename'], batch['owner'], batch['_max_running'],
+                                                            args, env, trigger={'batch': batch['id']})
+                    break
+                except QuotaExceededError:
+                    # Other runs of the owner took the slot: wait for one to finish
+                    with self._lock:
+                        if not batch['_stop'].is_set():
+                            self._run_finished.wait(timeout=1)
+        except Exception as e:
+            with self._lock:
+                run.update(status='error', error=str(e)[:1000])
+                batch['finished'] += 1
+                batch['failed'] += 1
+            return
+        with self._lock:
+            run.update(id=execution['id'], status='running')
+        if cmd is not None:
+            self._execute(execution, cmd, env)
+        else:
+            self._finish(execution)
+        with self._lock:
+            run.update(
+                status=execution['status'],
+                return_code=execution['return_code'],
+                output=execution['output'][:BATCH_OUTPUT_SIZE],
+                error=execution['error'][:BATCH_OUTPUT_SIZE],
+                cached=bool(execution['cache'] and execution['cache']['hit']),
+            )
+            batch['finished'] += 1
+            if execution['status'] == 'completed':
+                batch['succeeded'] += 1
+            else:
+                batch['failed'] += 1
+            code = str(execution['return_code'])
+            batch['exit_codes'][code] = batch['exit_codes'].get(code, 0) + 1
+
+    # ============== SCHEDULES ==============
+
+    def add_schedule(self, filename: str, cron: str, overlap: str = 'skip',
+                     catch_up: bool = False, owner: str = None, max_running: int = None) -> Dict[str, Any]:
+        """Run a script on a cron schedule
+
+        owner/max_running: scheduled runs count against this owner's quota like any other run
+        """
+        self._validate_script_path(filename)
+        expression = CronExpression(cron)
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"overlap must be one of: {', '.join(OVERLAP_POLICIES)}")
+
+        schedule = {
+            'id': str(uuid.uuid4())[:8],
+            'filename': filename,
+            'cron': expression.expression,
+            'overlap': overlap,
+            'catch_up': bool(catch_up),
+            'owner': owner,
+            'max_running': max_running,
+            'created_at': datetime.now().isoformat(),
+            'last_run': None,
+            'last_run_id': None,
+            'last_error': None,
+            'next_run': None,
+            'runs': 0,
+            'skipped': 0,
+        }
+        with self._schedule_lock:
+            self.schedules[schedule['id']] = schedule
+            self._arm_schedule(schedule)
+            self._save_schedules()
+            return self._public_schedule(schedule)
+
+    def remove_schedule(self, schedule_id: str):
+        """Delete a schedule (a run in progress continues)"""
+        with self._schedule_lock:
+            if self.schedules.pop(schedule_id, None) is None:
+                raise ValueError("Schedule not found")
+            self.scheduler.cancel(('script', schedule_id))
+            self._save_schedules()
+
+    def list_schedules(self) -> List[Dict[str, Any]]:
+        with self._schedule_lock:
+            return sorted(
+                (self._public_schedule(s) for s in self.schedules.values()),
+                key=lambda s: (s['filename'], s['id'])
+            )
+
+    def _public_schedule(self, schedule: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in schedule.items() if not k.startswith('_')}
+
+    def _arm_schedule(self, schedule: Dict[str, Any], after: datetime = None):
+        """Queue the next fire time (schedule lock held)"""
+        fire_at = CronExpression(schedule['cron']).next_after(after or datetime.now())
+        schedule['next_run'] = fire_at.isoformat()
+        self.scheduler.schedule(
+            ('script', schedule['id']), fire_at.timestamp(),
+            lambda: self._fire_schedule(schedule['id'], fire_at)
+        )
+
+    def _fire_schedule(self, schedule_id: str, fire_at: datetime):
+        """Start a scheduled run (on a scheduler worker thread)"""
+        with self._schedule_lock:
+            schedule = self.schedules.get(schedule_id)
+            if schedule is None:
+                return
+            # Next fire time follows the schedule, not the (slightly late) wall clock
+            self._arm_schedule(schedule, after=max(fire_at, datetime.now().replace(second=0, microsecond=0)))
+
+            previous = self._running_execution(schedule.get('last_run_id'))
+            if previous is not None:
+                if schedule['overlap'] == 'skip':
+                    schedule['skipped'] += 1
+                    logger.info(f"Skipping scheduled run of {schedule['filename']}: previous run still going")
+                    self._save_schedules()
+                    return
+                if schedule['overlap'] == 'queue':
+                    # At most one run waits; it starts when the current one ends
+                    schedule['_queued'] = fire_at
+                    return
+                self.stop_script(previous)
+            self._start_scheduled_run(schedule, fire_at)
+
+    def _start_scheduled_run(self, schedule: Dict[str, Any], fire_at: datetime):
+        """Run the schedule's script now (schedule lock held)"""
+        try:
+            result = self.run_script(
+                schedule['filename'], owner=schedule.get('owner'), max_running=schedule.get('max_running'),
+                trigger={'schedule': schedule['id']},
+                on_finish=lambda execution, schedule_id=schedule['id']: self._scheduled_run_finished(schedule_id)
+            )
+        except Exception as e:
+            logger.error(f"Scheduled run of {schedule['filename']} failed to start: {e}")
+            schedule['last_error'] = str(e)[:1000]
+            self._save_schedules()
+            return
+        schedule['last_run'] = fire_at.isoformat()
+        schedule['last_run_id'] = result['id']
+        schedule['last_error'] = None
+        schedule['runs'] += 1
+        self._save_schedules()
+
+    def _scheduled_run_finished(self, schedule_id: str):
+        with self._schedule_lock:
+            schedule = self.schedules.get(schedule_id)
+            if schedule is None:
+                return
+            queued = schedule.pop('_queued', None)
+            if queued is not None:
+                self._start_scheduled_run(schedule, queued)
+
+    def _running_execution(self, run_id: Optional[str]) -> Optional[str]:
+        with self._lock:
+            execution = self.running_scripts.get(run_id) if run_id else None
+            if execution is not None and execution['status'] == 'running':
+                return run_id
+        return None
+
+    def _load_schedules(self):
+        """Restore schedules and catch up on runs missed while the server was down"""
+        if not self.schedules_path or not os.path.exists(self.schedules_path):
+            return
+        try:
+            with open(self.schedules_path, encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load script schedules from {self.schedules_path}: {e}")
+            return
+
+        now = datetime.now()
+        with self._schedule_lock:
+            for schedule in stored.get('schedules', []):
+                try:
+                    expression = CronExpression(schedule['cron'])
+                except (KeyError, ValueError) as e:
+                    logger.error(f"Dropping invalid script schedule {schedule.get('id')}: {e}")
+                    continue
+                schedule.update(last_run_id=None, next_run=None)
+                self.schedules[schedule['id']] = schedule
+                since = datetime.fromisoformat(schedule['last_run'] or schedule['created_at'])
+                missed = expression.next_after(since)
+                if schedule.get('catch_up') and missed <= now:
+                    # Missed runs are coalesced into a single catch-up run
+                    logger.info(f"Catching up on missed run of {schedule['filename']} ({missed.isoformat()})")
+                    self._start_scheduled_run(schedule, missed)
+                self._arm_schedule(schedule, after=now)
+            self._save_schedules()
+
+    def _save_schedules(self):
+        """Write all schedules atomically (schedule lock held)"""
+        if not self.schedules_path:
+            return
+        os.makedirs(os.path.dirname(self.schedules_path) or '.', mode=0o755, exist_ok=True)
+        tmp_path = self.schedules_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'schedules': [self._public_schedule(s) for s in self.schedules.values()]}, f, indent=2)
+        os.replace(tmp_path, self.schedules_path)
@@ -0,0 +1,298 @@
+"""
+Socket.IO Message Queue - share Socket.IO events between server processes
+
+Every emit is published on a message queue so that all workers behind a
+load balancer deliver it to their own connected clients.
+
+Supported SOCKETIO_MESSAGE_QUEUE URLs:
+  memory://<name>        in-process hub (tests, several servers in one process)
+  unix:///path/to.sock   local broker over a Unix socket (see `broker` below)
+  redis://, amqp://, ... passed through to Flask-SocketIO (needs the backend package)
+
+Run a standalone Unix socket broker:
+  python socketio_queue.py broker /run/box/socketio.sock
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import socketio
+
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+OUTBOX_SIZE = 10000
+
+
+def _send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv_frame(sock: socket.socket) -> Optional[bytes]:
+    """Read one length-prefixed frame, None when the peer closed"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError("Frame too large")
+    return _recv_exact(sock, size)
+
+
+# ============== IN-MEMORY BACKEND ==============
+
+class _LocalHub:
+    """Channel -> subscriber queues, shared by all managers of one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+
+    def subscribe(self, channel: str) -> queue.Queue:
+        inbox = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(inbox)
+        return inbox
+
+    def publish(self, channel: str, message: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for inbox in subscribers:
+            inbox.put(message)
+
+
+_hubs: Dict[str, _LocalHub] = {}
+_hubs_lock = threading.Lock()
+
+
+def _get_hub(name: str) -> _LocalHub:
+    with _hubs_lock:
+        return _hubs.setdefault(name, _LocalHub())
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """Pub/sub manager backed by an in-process hub"""
+
+    name = 'memory'
+
+    def __init__(self, url: str = 'memory://default', channel: str = 'socketio',
+                 write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.hub = _get_hub(url.split('://', 1)[-1] or 'default')
+        self.inbox = None if write_only else self.hub.subscribe(channel)
+
+    def _publish(self, data):
+        self.hub.publish(self.channel, data)
+
+    def _listen(self):
+        while True:
+            yield self.inbox.get()
+
+
+# ============== UNIX SOCKET BACKEND ==============
+
+class UnixSocketBroker:
+    """Fan-out broker: every frame received from one connection is sent to all"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._outboxes: Dict[socket.socket, queue.Queue] = {}
+        self._server = None
+        self._stopped = threading.Event()
+
+    def start(self) -> 'UnixSocketBroker':
+        """Bind and serve in a background thread"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._server.listen(128)
+        threading.Thread(target=self._accept_loop, name='socketio-broker', daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self.start()
+        self._stopped.wait()
+
+    def stop(self):
+        self._stopped.set()
+        if self._server:
+            self._server.close()
+        with self._lock:
+            connections = list(self._outboxes)
+        for conn in connections:
+            self._drop(conn)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            outbox = queue.Queue(maxsize=OUTBOX_SIZE)
+            with self._lock:
+                self._outboxes[conn] = outbox
+            threading.Thread(target=self._reader, args=(conn,), daemon=True).start()
+            threading.Thread(target=self._writer, args=(conn, outbox), daemon=True).start()
+
+    def _reader(self, conn: socket.socket):
+        try:
+            while True:
+                frame = _recv_frame(conn)
+                if frame is None:
+                    break
+                with self._lock:
+                    outboxes = list(self._outboxes.items())
+                for peer, outbox in outboxes:
+                    try:
+                        outbox.put_nowait(frame)
+                    except queue.Full:
+                        # A subscriber that can't keep up is disconnected, not waited for
+                        logger.warning("Dropping slow Socket.IO queue subscriber")
+                        self._drop(peer)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._drop(conn)
+
+    def _writer(self, conn: socket.socket, outbox: queue.Queue):
+        try:
+            while True:
+                frame = outbox.get()
+                if frame is None:
+                    break
+                _send_frame(conn, frame)
+        except OSError:
+            self._drop(conn)
+
+    def _drop(self, conn: socket.socket):
+        with self._lock:
+            outbox = self._outboxes.pop(conn, None)
+        if outbox is None:
+            return
+        try:
+            outbox.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+
+class UnixSocketManager(socketio.PubSubManager):
+    """Pub/sub manager talking to a UnixSocketBroker"""
+
+    name = 'unix'
+
+    def __init__(self, url: str, channel: str = 'socketio', write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url.split('://', 1)[-1]
+        self._sock = None
+        self._sock_lock = threading.Lock()
+        self._connected = threading.Event()
+
+    def _connect(self) -> socket.socket:
+        """Return the broker connection, connecting if needed (lock held)"""
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            self._sock = sock
+            self._connected.set()
+        return self._sock
+
+    def _reset(self, sock):
+        with self._sock_lock:
+            if self._sock is sock:
+                self._sock = None
+                self._connected.clear()
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _publish(self, data):
+        payload = json.dumps({'channel': self.channel, 'data': data}).encode('utf-8')
+        for attempt in range(2):
+            with self._sock_lock:
+                try:
+                    sock = self._connect()
+                    _send_frame(sock, payload)
+                    return
+                except OSError as e:
+                    error = e
+                    sock = self._sock
+            if sock is not None:
+                self._reset(sock)
+        logger.error(f"Failed to publish Socket.IO message: {error}")
+
+    def _listen(self):
+        backoff = 0.1
+        while True:
+            try:
+                with self._sock_lock:
+                    sock = self._connect()
+                backoff = 0.1
+                while True:
+                    frame = _recv_frame(sock)
+                    if frame is None:
+                        raise ConnectionError("Broker closed the connection")
+                    message = json.loads(frame)
+                    if message.get('channel') == self.channel:
+                        yield message.get('data')
+            except (OSError, ValueError) as e:
+                logger.warning(f"Socket.IO queue connection lost: {e}")
+                with self._sock_lock:
+                    sock = self._sock
+                if sock is not None:
+                    self._reset(sock)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+
+
+def create_client_manager(url: Optional[str], channel: str = 'socketio', write_only: bool = False):
+    """Build a client manager for memory:// and unix:// URLs, None for others"""
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return LocalPubSubManager(url, channel=channel, write_only=write_only)
+    if url.startswith('unix://'):
+        return UnixSocketManager(url, channel=channel, write_only=write_only)
+    return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'broker':
+        print("Usage: python socketio_queue.py broker <socket-path>")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    broker = UnixSocketBroker(sys.argv[2])
+    logger.info(f"Socket.IO queue broker listening on {sys.argv[2]}")
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        broker.stop()
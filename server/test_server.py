@@ -6,10 +6,45 @@ Run this before starting the server to check for issues.
 
 import sys
 import os
+import atexit
+import shutil
+import tempfile
 
 # Set test environment variables
 os.environ.setdefault('API_KEY_REQUIRED', 'false')
 os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+# Never touch the real data directory (API keys, audit trail, logs, ...)
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='box-test-data-')
+atexit.register(shutil.rmtree, os.environ['DATA_DIR'], ignore_errors=True)
+
+
+def _make_process_automation_class():
+    """CPU-bound automation used by test_process_automation (module level for pickling)"""
+    from automations.base import BaseAutomation
+
+    class ProcessAutomation(BaseAutomation):
+        execution_mode = "process"
+
+        def get_name(self):
+            return "Process Test"
+
+        def get_description(self):
+            return "Runs in the process pool"
+
+        def get_config_schema(self):
+            return []
+
+        def run(self):
+            self.log("Started in pool process", pid=__import__('os').getpid())
+            while not self.stop_flag.is_set():
+                with self.track_iteration():
+                    sum(i * i for i in range(10000))
+                self.stop_flag.wait(0.01)
+
+    return ProcessAutomation
+
+
+ProcessAutomation = _make_process_automation_class()
 
 
 def test_imports():
@@ -177,34 +212,2111 @@ def test_script_manager_security():
         return False
 
 
-def main():
-    print("=" * 60)
-    print("Server Component & Security Test")
-    print("=" * 60)
-    print()
+def test_automation_metrics():
+    """Test per-iteration automation metrics"""
+    print("\nTesting automation metrics...")
 
-    all_passed = True
+    try:
+        from automation_manager import AutomationManager
 
-    # Test imports
-    if not test_imports():
-        all_passed = False
-        print("\n⚠ Install missing dependencies:")
-        print("  pip install -r requirements.txt")
+        manager = AutomationManager()
+        created = manager.create_automation('NewsMonitorAutomation')
+        automation = manager.get_automation(created['id'])
 
-    # Test automation classes
-    if not test_automation_classes():
-        all_passed = False
+        with automation.track_iteration():
+            pass
+        try:
+            with automation.track_iteration():
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
 
-    # Test automation manager
-    if not test_automation_manager():
-        all_passed = False
+        metrics = automation.get_status()['metrics']
+        assert metrics['iterations'] == 2
+        assert metrics['successes'] == 1
+        assert metrics['errors'] == 1
+        assert len(metrics['recent_durations']) == 2
+        print("  ✓ Iterations tracked in get_status()")
 
-    # Test security config
-    if not test_security_config():
-        all_passed = False
+        text = manager.render_metrics()
+        assert '# TYPE automation_iteration_duration_seconds histogram' in text
+        assert f'automation_iterations_total{{automation_id="{automation.id}",' \
+               f'type="NewsMonitorAutomation",outcome="error"}} 1' in text
+        assert 'le="+Inf"} 2' in text
+        print("  ✓ Prometheus output rendered")
 
-    # Test script manager security
-    if not test_script_manager_security():
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_metrics_registry():
+    """Test per-thread metrics aggregation"""
+    print("\nTesting metrics registry...")
+
+    try:
+        import threading
+        from metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        requests_total = registry.counter('test_requests_total', 'Test counter', ('route',))
+        latency = registry.histogram('test_latency_seconds', 'Test histogram', buckets=(0.1, 1.0))
+
+        def worker():
+            for _ in range(1000):
+                requests_total.inc('/a')
+            latency.observe(0.05)
+            latency.observe(5.0)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        requests_total.inc('/b', amount=2)
+
+        text = registry.render()
+        assert 'test_requests_total{route="/a"} 4000' in text
+        assert 'test_requests_total{route="/b"} 2' in text
+        assert 'test_latency_seconds_bucket{le="0.1"} 4' in text
+        assert 'test_latency_seconds_bucket{le="+Inf"} 8' in text
+        print("  ✓ Per-thread counters aggregated on scrape")
+
+        # Cells of finished threads are folded, totals stay the same
+        assert registry.render() == text
+        print("  ✓ Finished thread cells folded")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_request_profiler():
+    """Test sampling profiler collapsed stacks"""
+    print("\nTesting request profiler...")
+
+    try:
+        import time
+        from profiler import SamplingProfiler
+
+        profiler = SamplingProfiler(interval_ms=1)
+        assert profiler.should_profile('1') is False
+        profiler.configure(allow_header=True)
+        assert profiler.should_profile('1') is True
+        print("  ✓ Header opt-in respected")
+
+        def slow_endpoint():
+            time.sleep(0.1)
+
+        profiler.begin('slow_endpoint')
+        slow_endpoint()
+        profiler.end()
+
+        collapsed = profiler.collapsed('slow_endpoint')
+        assert collapsed.startswith('slow_endpoint;')
+        assert 'slow_endpoint (test_server.py' in collapsed
+        assert profiler.get_status()['endpoints']['slow_endpoint']['samples'] > 0
+        print("  ✓ Collapsed stacks captured")
+
+        profiler.reset()
+        assert profiler.collapsed() == ''
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_benchmark_helpers():
+    """Test benchmark statistics and regression detection"""
+    print("\nTesting benchmark helpers...")
+
+    try:
+        from benchmark import summarize, compare_results
+
+        stats = summarize([i / 1000.0 for i in range(1, 101)], wall_seconds=2.0)
+        assert stats['count'] == 100
+        assert stats['throughput_per_sec'] == 50.0
+        assert stats['p50_ms'] == 50.0
+        assert stats['p99_ms'] == 99.0
+        print("  ✓ Percentiles computed")
+
+        baseline = {'results': {'crud': {'p50_ms': 10.0, 'p99_ms': 20.0, 'throughput_per_sec': 100.0}}}
+        same = {'results': {'crud': {'p50_ms': 11.0, 'p99_ms': 21.0, 'throughput_per_sec': 95.0}}}
+        slower = {'results': {'crud': {'p50_ms': 15.0, 'p99_ms': 20.0, 'throughput_per_sec': 60.0}}}
+        assert compare_results(same, baseline, 0.2) == []
+        assert len(compare_results(slower, baseline, 0.2)) == 2
+        print("  ✓ Regressions detected")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_socketio_queue():
+    """Test Socket.IO message queue backends"""
+    print("\nTesting Socket.IO message queue...")
+
+    try:
+        import tempfile
+        import threading
+        import queue
+        from socketio_queue import create_client_manager, UnixSocketBroker
+
+        def listen(manager):
+            received = queue.Queue()
+            threading.Thread(
+                target=lambda: [received.put(m) for m in manager._listen()], daemon=True
+            ).start()
+            return received
+
+        message = {'method': 'emit', 'event': 'status_update', 'data': {'status': 'running'}}
+
+        # In-memory hub
+        publisher = create_client_manager('memory://test', channel='test')
+        subscriber = create_client_manager('memory://test', channel='test')
+        received = listen(subscriber)
+        publisher._publish(message)
+        assert received.get(timeout=2) == message
+        print("  ✓ In-memory hub delivers to other managers")
+
+        # Unix socket broker
+        path = os.path.join(tempfile.mkdtemp(), 'socketio.sock')
+        broker = UnixSocketBroker(path).start()
+        try:
+            publisher = create_client_manager(f'unix://{path}', channel='test')
+            subscriber = create_client_manager(f'unix://{path}', channel='test')
+            received = listen(subscriber)
+            subscriber._connected.wait(timeout=2)
+            publisher._publish(message)
+            assert received.get(timeout=2) == message
+            print("  ✓ Unix socket broker fans out messages")
+        finally:
+            broker.stop()
+
+        assert create_client_manager('redis://localhost:6379/0') is None
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_cluster_coordinator():
+    """Test automation leasing, balancing and failover"""
+    print("\nTesting cluster coordinator...")
+
+    try:
+        import time
+        from cluster import AutomationCoordinator
+        from automation_manager import AutomationManager
+        from automations.base import AutomationAlreadyRunningError
+
+        coordinator = AutomationCoordinator(lease_ttl=0.3, heartbeat_interval=0.1)
+        manager = AutomationManager(coordinator=coordinator)
+        ids = [manager.create_automation('TicketBuyerAutomation')['id'] for _ in range(4)]
+        for automation_id in ids:
+            assert manager.start_automation(automation_id, {})['status'] == 'running'
+        try:
+            manager.start_automation(ids[0], {})
+            assert False, "Second start accepted"
+        except AutomationAlreadyRunningError:
+            print("  ✓ Starting a running automation is a conflict")
+
+        def beat(worker_id, leases):
+            running = {
+                automation_id: {'status': 'running', 'epoch': epoch, 'last_run': 'now', 'metrics': {}}
+                for automation_id, epoch in leases.items()
+            }
+            plan = coordinator.heartbeat(worker_id, capacity=10, running=running)
+            for automation_id in plan['revoke']:
+                leases.pop(automation_id, None)
+            for assignment in plan['assignments']:
+                leases[assignment['id']] = assignment['epoch']
+            return plan
+
+        # The first worker takes everything, a new worker gets a share handed over
+        w1, w2 = {}, {}
+        beat('w2', w2)
+        assert len(w2) == 4
+        for _ in range(3):
+            beat('w1', w1)
+            beat('w2', w2)
+        assert len(w1) == 2 and len(w2) == 2
+        print("  ✓ Automations rebalanced onto a new worker")
+
+        assert manager.get_status(next(iter(w1)))['worker_id'] == 'w1'
+        print("  ✓ Status shows owning worker")
+
+        # w1 stops heartbeating, its leases expire and move to w2
+        for _ in range(5):
+            time.sleep(0.1)
+            beat('w2', w2)
+        assert len(w2) == 4
+        assert {a['worker_id'] for a in manager.list_automations()} == {'w2'}
+        print("  ✓ Leases of a dead worker rebalanced")
+
+        manager.stop_automation(ids[0])
+        assert ids[0] in beat('w2', w2)['revoke']
+        print("  ✓ Stopped automation revoked from its worker")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_process_automation():
+    """Test execution_mode = "process" automations"""
+    print("\nTesting process pool automations...")
+
+    try:
+        import time
+        from automations.process_pool import ProcessPoolFullError, get_process_pool
+
+        automation = ProcessAutomation()
+        statuses = []
+        automation.set_status_callback(statuses.append)
+        automation.start({})
+
+        deadline = time.time() + 30
+        while automation.metrics.count < 3 and time.time() < deadline:
+            time.sleep(0.05)
+        assert automation.metrics.count >= 3
+        print("  ✓ Iterations relayed from pool process")
+
+        logs = automation.logs.read()['logs']
+        assert logs and logs[0]['message'] == "Started in pool process"
+        assert logs[0]['pid'] != __import__('os').getpid()
+        print("  ✓ Log records relayed from pool process")
+
+        automation._handle_process_event('finished', None, 'earlier-run')
+        assert automation.status == 'running'
+        print("  ✓ Events of an earlier run ignored")
+
+        pool = get_process_pool()
+        max_workers, pool.max_workers = pool.max_workers, 1
+        try:
+            second = ProcessAutomation()
+            second.start({})
+            assert False, "Started beyond pool capacity"
+        except ProcessPoolFullError:
+            assert second.status == 'stopped'
+            print("  ✓ Automations beyond pool capacity refused")
+        finally:
+            pool.max_workers = max_workers
+
+        automation.stop()
+        assert automation.get_status()['status'] == 'stopped'
+        assert statuses[0]['status'] == 'running' and statuses[-1]['status'] == 'stopped'
+        print("  ✓ Stopped via shared stop flag")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_polling_schedule():
+    """Test jittered/adaptive intervals and the shared request budget"""
+    print("\nTesting polling schedule...")
+
+    try:
+        import time
+        from automations.scheduling import AdaptiveInterval, RequestBudget
+
+        interval = AdaptiveInterval(100, min_interval=25, max_interval=400, jitter=0)
+        waits = [interval.next(changed=False) for _ in range(6)]
+        assert waits[0] == 150 and waits[-1] == 400
+        assert interval.next(changed=True) == 200
+        print("  ✓ Backs off while unchanged, speeds up on changes")
+
+        jittered = AdaptiveInterval(100, jitter=0.1)
+        samples = [jittered.next() for _ in range(50)]
+        assert all(90 <= w <= 110 for w in samples) and len(set(samples)) > 1
+        assert 0 <= jittered.initial_delay() <= 10
+        print("  ✓ Waits jittered around the interval")
+
+        budget = RequestBudget(rate=50, burst=5)
+        started = time.monotonic()
+        for _ in range(15):
+            assert budget.acquire()
+        elapsed = time.monotonic() - started
+        assert 0.15 <= elapsed < 1.0, elapsed
+        print("  ✓ Request budget limits throughput")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_ticket_sniping():
+    """Test release-time sniping mode of the ticket buyer"""
+    print("\nTesting ticket sniping...")
+
+    try:
+        import threading
+        from datetime import datetime
+        from automations.ticket_buyer import TicketBuyerAutomation
+
+        class FakeTicketBuyer(TicketBuyerAutomation):
+            def __init__(self):
+                super().__init__()
+                self.calls = []
+                self.lock = threading.Lock()
+
+            def check_ticket_availability(self, date, time_start, time_end, from_station, to_station,
+                                          session=None, max_age=None, use_cache=True):
+                with self.lock:
+                    self.calls.append((time_start, time_end, use_cache))
+                    if len(self.calls) == 8:
+                        return {'train': 'IC 123', 'departure': '12:00'}
+                return None
+
+        buyer = FakeTicketBuyer()
+        buyer.config = {'snipe_lead_seconds': '0', 'snipe_interval_ms': '50',
+                        'snipe_parallelism': '3', 'snipe_duration': '10'}
+        found = buyer.snipe(datetime.now(), '2030-01-01', '09:00', '18:00', 'A', 'B')
+        assert found == {'train': 'IC 123', 'departure': '12:00'}
+        assert len(buyer.calls) == 9, buyer.calls
+        assert set(buyer.calls) == {('09:00', '18:00', False)}
+        print("  ✓ Parallel uncached requests, first hit wins")
+
+        snipe = buyer.get_status()['snipe']
+        assert snipe['phase'] == 'done'
+        assert snipe['attempts']['iterations'] == len(buyer.calls)
+        print("  ✓ Per-attempt latency recorded")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_ticket_providers():
+    """Test ticket provider adapters and the shared query cache"""
+    print("\nTesting ticket providers...")
+
+    try:
+        import json
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import urlparse, parse_qs
+        from automations.ticket_buyer import TicketBuyerAutomation
+        from automations.ticket_providers import TicketQueryCache, filter_trains, query_cache
+
+        hits = []
+
+        class FakeProvider(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                hits.append((query['from'][0], query['to'][0], query['date'][0]))
+                time.sleep(0.2)  # slow upstream, so concurrent lookups overlap
+                body = json.dumps({'trains': [
+                    {'train': 'IC 1', 'departure': '07:30', 'seats': 5},
+                    {'train': 'IC 2', 'departure': '10:15', 'seats': 0},
+                    {'train': 'IC 3', 'departure': '12:45', 'seats': 2},
+                ]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProvider)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        try:
+            buyers = []
+            for _ in range(5):
+                buyer = TicketBuyerAutomation()
+                buyer.config = {'provider': 'http_json', 'provider_url': url}
+                buyers.append(buyer)
+
+            results = [None] * len(buyers)
+
+            def check(i):
+                results[i] = buyers[i].check_ticket_availability('2030-01-01', '08:00', '18:00', 'A', 'B')
+
+            threads = [threading.Thread(target=check, args=(i,)) for i in range(len(buyers))]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert hits == [('A', 'B', '2030-01-01')], hits
+            assert all(r == [{'train': 'IC 3', 'departure': '12:45', 'seats': 2}] for r in results), results
+            print("  ✓ Concurrent lookups share one upstream query")
+
+            assert buyers[0].check_ticket_availability('2030-01-01', '06:00', '08:00', 'A', 'B')[0]['train'] == 'IC 1'
+            assert buyers[0].check_ticket_availability('2030-01-01', '09:00', '11:00', 'A', 'B') is None
+            assert len(hits) == 1
+            print("  ✓ Cached result filtered by time range locally")
+
+            buyers[0].check_ticket_availability('2030-01-02', '08:00', '18:00', 'A', 'B')
+            buyers[0].check_ticket_availability('2030-01-01', '08:00', '18:00', 'A', 'B', max_age=0)
+            assert len(hits) == 3
+            print("  ✓ Other dates and stale entries go upstream")
+        finally:
+            server.shutdown()
+            server.server_close()
+            query_cache._entries.clear()
+
+        cache = TicketQueryCache(ttl=60, max_entries=2)
+        calls = []
+        for key in ('a', 'b', 'c', 'a'):
+            cache.get_or_fetch(key, lambda: calls.append(1))
+        assert len(calls) == 4 and cache.stats()['entries'] == 2
+        try:
+            cache.get_or_fetch('x', lambda: 1 / 0)
+            assert False, "error should propagate"
+        except ZeroDivisionError:
+            pass
+        assert cache.get_or_fetch('x', lambda: 'ok') == 'ok'
+        print("  ✓ LRU bound, errors are not cached")
+
+        trains = [{'train': 'IC 4', 'departure': '09:00', 'seats': None},
+                  {'train': 'IC 5', 'departure': '09:10', 'seats': 'n/a'},
+                  {'train': 'IC 6', 'departure': '09:20', 'seats': '3'},
+                  {'train': 'IC 7', 'departure': '09:30'}]
+        assert [t['train'] for t in filter_trains(trains, '08:00', '10:00')] == ['IC 6', 'IC 7']
+        print("  ✓ Non-numeric seat counts treated as sold out")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_notification_dispatch():
+    """Test the asynchronous notification pipeline"""
+    print("\nTesting notification dispatch...")
+
+    try:
+        import contextlib
+        import io
+        import json
+        import socketserver
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from automations.notifications import (
+            NotificationDispatcher, NotificationChannel, EmailChannel, PushChannel
+        )
+
+        emails = []
+
+        class FakeSMTP(socketserver.StreamRequestHandler):
+            """Just enough SMTP to accept a message"""
+            def handle(self):
+                self.wfile.write(b"220 localhost ESMTP\r\n")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode().strip().upper()
+                    if command == 'DATA':
+                        self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                        data = []
+                        for body_line in iter(self.rfile.readline, b".\r\n"):
+                            data.append(body_line.decode())
+                        emails.append(''.join(data))
+                        self.wfile.write(b"250 OK\r\n")
+                    elif command == 'QUIT':
+                        self.wfile.write(b"221 Bye\r\n")
+                        return
+                    else:
+                        self.wfile.write(b"250 OK\r\n")
+
+        pushes = []
+        push_failures = [2]
+
+        class FakePush(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if push_failures[0] > 0:
+                    push_failures[0] -= 1
+                    self.send_response(503)
+                else:
+                    pushes.append(json.loads(body)['notifications'])
+                    self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        smtp_server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FakeSMTP)
+        push_server = ThreadingHTTPServer(('127.0.0.1', 0), FakePush)
+        for server in (smtp_server, push_server):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        class SlowChannel(NotificationChannel):
+            name = "console"
+
+            def send_batch(self, notifications):
+                time.sleep(0.5)
+
+        email = EmailChannel(host='127.0.0.1', port=smtp_server.server_address[1], use_tls=False,
+                             sender='box@localhost', recipients=['me@localhost'])
+        email.workers = 1  # one worker, so the batch can't be split between workers
+
+        try:
+            dispatcher = NotificationDispatcher([SlowChannel(), EmailChannel(), PushChannel()], retry_backoff=0.05)
+            # As the server does with the NOTIFY_* settings
+            dispatcher.configure(
+                [email, PushChannel(url=f"http://127.0.0.1:{push_server.server_address[1]}/push")],
+                batch_window=0.2, dedup_window=60
+            )
+
+            started = time.perf_counter()
+            assert dispatcher.notify("slow", 'console', source='a')
+            assert time.perf_counter() - started < 0.1
+            print("  ✓ notify() does not wait for delivery")
+
+            assert dispatcher.notify("Keywords found: x", 'email', source='a')
+            assert dispatcher.notify("Keywords found: y", 'email', source='a')
+            assert not dispatcher.notify("Keywords found: x", 'email', source='a')
+            assert dispatcher.notify("Keywords found: x", 'email', source='b')
+            assert dispatcher.flush(timeout=10)
+            assert len(emails) == 1, emails
+            assert 'Subject: 3 notifications' in emails[0]
+            assert dispatcher.get_stats()['email']['deduplicated'] == 1
+            print("  ✓ Email batched via SMTP, duplicates dropped")
+
+            assert dispatcher.notify("News content updated", 'push', source='a')
+            assert dispatcher.flush(timeout=10)
+            assert pushes and pushes[0][0]['message'] == "News content updated"
+            stats = dispatcher.get_stats()['push']
+            assert stats['retries'] == 2 and stats['sent'] == 1, stats
+            print("  ✓ Push retried with backoff until delivered")
+
+            try:
+                dispatcher.notify("x", 'pager')
+                assert False, "unknown method should be rejected"
+            except ValueError:
+                pass
+            dispatcher.shutdown()
+
+            full = NotificationDispatcher([SlowChannel()], queue_size=1, batch_window=0)
+            queued = [full.notify(f"message {i}", 'console') for i in range(4)]
+            dropped = queued.index(False)
+            assert full.get_stats()['console']['dropped'] >= 1
+            assert full.flush(timeout=10)
+            assert full.notify(f"message {dropped}", 'console'), "dropped message was deduplicated"
+            full.shutdown()
+            print("  ✓ Messages dropped on a full queue can be sent again")
+
+            printed = io.StringIO()
+            with contextlib.redirect_stdout(printed):
+                EmailChannel().send_batch([{'timestamp': 'now', 'message': 'to stdout'}])
+                PushChannel().send_batch([{'timestamp': 'now', 'message': 'to stdout'}])
+            assert printed.getvalue() == ("[EMAIL NOTIFICATION now] to stdout\n"
+                                          "[PUSH NOTIFICATION now] to stdout\n"), printed.getvalue()
+            print("  ✓ Unconfigured channels print instead of failing")
+        finally:
+            for server in (smtp_server, push_server):
+                server.shutdown()
+                server.server_close()
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_automation_logs():
+    """Test per-automation structured log capture"""
+    print("\nTesting automation logs...")
+
+    try:
+        import json
+        import os
+        import tempfile
+        from automations.logs import AutomationLog, LogSink
+        from automation_manager import AutomationManager
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = LogSink(tmp, flush_interval=0.05)
+            log = AutomationLog('abc', capacity=5, sink=sink)
+            for i in range(8):
+                log.write(f"line {i}", 'warning' if i == 7 else 'info', iteration=i)
+
+            page = log.read(since=0)
+            assert [r['seq'] for r in page['logs']] == [4, 5, 6, 7, 8]
+            assert page['missed'] == 3 and page['next'] == 8
+            assert page['logs'][-1]['level'] == 'warning' and page['logs'][-1]['iteration'] == 7
+            assert log.read(since=6, limit=1)['logs'][0]['message'] == "line 6"
+            assert log.read(since=8) == {'logs': [], 'next': 8, 'missed': 0}
+            print("  ✓ Ring buffer read with a cursor")
+
+            assert sink.flush(timeout=5)
+            with open(os.path.join(tmp, 'abc.jsonl')) as f:
+                records = [json.loads(line) for line in f]
+            assert [r['seq'] for r in records] == list(range(1, 9))
+            print("  ✓ All records appended to JSONL on disk")
+
+        manager = AutomationManager()
+        automation_id = manager.create_automation('TicketBuyerAutomation')['id']
+        manager.get_automation(automation_id).log("hello", extra=1)
+        logs = manager.get_logs(automation_id)['logs']
+        assert logs[0]['message'] == 'hello' and logs[0]['extra'] == 1
+        print("  ✓ Logs readable through the manager")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_audit_log():
+    """Test the queued audit trail"""
+    print("\nTesting audit log...")
+
+    try:
+        import os
+        import tempfile
+        import time
+        from audit import AuditLog, _lines_backwards
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'audit', 'audit.jsonl')
+            trail = AuditLog(flush_interval=60)
+            trail.configure(path, max_bytes=2000, backup_count=2)
+
+            started = time.perf_counter()
+            for i in range(50):
+                trail.record("RUN_SCRIPT", f"filename=s{i}.py", ip='10.0.0.1')
+            elapsed = time.perf_counter() - started
+            assert elapsed < 0.5, elapsed
+            print(f"  ✓ 50 events queued in {elapsed * 1000:.1f}ms")
+
+            assert trail.flush()
+            trail.record("STOP_SCRIPT", "run_id=1", ip='10.0.0.2')
+            assert trail.flush()
+            assert os.path.exists(path + '.1')
+            print("  ✓ Written to rotating JSONL file")
+
+            events = trail.query(limit=5)
+            assert events[0]['action'] == 'STOP_SCRIPT' and len(events) == 5
+            assert [e['details'] for e in trail.query(action='RUN_SCRIPT', limit=2)] == \
+                ['filename=s49.py', 'filename=s48.py']
+            assert trail.query(ip='10.0.0.2')[0]['details'] == 'run_id=1'
+            assert trail.query(since=events[0]['ts']) == []
+            print("  ✓ Query by action, ip and time")
+
+            with open(path, 'rb') as f:
+                lines = [line for line in f.read().split(b'\n') if line]
+            assert list(_lines_backwards(path, block_size=7)) == lines[::-1]
+            print("  ✓ Files read backwards in blocks")
+
+            trail.configure(None)
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_route_guard():
+    """Test the precompiled route guard and client IP resolution"""
+    print("\nTesting route guard...")
+
+    try:
+        from flask import Flask
+        from config import RateLimiter, RouteGuard, make_client_ip_resolver, public
+
+        resolve = make_client_ip_resolver(['10.0.0.0/8'])
+        assert resolve('203.0.113.9', '1.2.3.4') == '203.0.113.9'
+        assert resolve('10.0.0.2', '1.2.3.4, 198.51.100.7, 10.0.0.5') == '198.51.100.7'
+        assert resolve('10.0.0.2', '10.1.1.1') == '10.1.1.1'
+        assert make_client_ip_resolver([])('10.0.0.2', '1.2.3.4') == '10.0.0.2'
+        print("  ✓ X-Forwarded-For only honoured from trusted proxies")
+
+        app = Flask('guard_test')
+
+        @app.route('/open')
+        @public
+        def open_endpoint():
+            return 'ok'
+
+        @app.route('/guarded')
+        def guarded_endpoint():
+            return 'ok'
+
+        RouteGuard(api_key='secret', api_key_required=True, rate_limit_enabled=True,
+                   limiter=RateLimiter(3), trusted_proxies=[]).install(app)
+        client = app.test_client()
+
+        @app.route('/late')
+        def late_endpoint():
+            return 'ok'
+
+        assert client.get('/open').status_code == 200
+        assert client.get('/guarded').status_code == 401
+        assert client.get('/guarded', headers={'X-API-Key': 'wrong'}).status_code == 401
+        response = client.get('/guarded', headers={'X-API-Key': 'secret'})
+        assert response.status_code == 200
+        assert response.headers['X-Content-Type-Options'] == 'nosniff'
+        print("  ✓ API key required except on public routes")
+
+        for _ in range(2):
+            assert client.get('/guarded', headers={'X-API-Key': 'secret'}).status_code == 200
+        assert client.get('/guarded', headers={'X-API-Key': 'secret'}).status_code == 429
+        assert client.get('/guarded', headers={'X-API-Key': 'wrong'}).status_code == 401
+        assert client.get('/guarded', headers={'X-API-Key': 'wrong'}).status_code == 429
+        assert client.get('/open').status_code == 200
+        print("  ✓ Rate limited per key, failed attempts per client IP")
+
+        other = app.test_client()
+        other.environ_base['REMOTE_ADDR'] = '198.51.100.1'
+        assert other.get('/late').status_code == 401
+        assert other.get('/missing').status_code == 401
+        assert other.options('/guarded').status_code == 200
+        print("  ✓ Routes added after install() and unknown URLs guarded, preflight allowed")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_api_keys():
+    """Test hashed multi-key store, per-key limits and script quotas"""
+    print("\nTesting API keys...")
+
+    try:
+        import json
+        import os
+        import tempfile
+        import time
+        from flask import Flask, g, jsonify
+        from api_keys import ApiKeyStore, hash_key
+        from config import RateLimiter, RouteGuard
+        from script_manager import ScriptManager, QuotaExceededError
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'api_keys.json')
+
+            def write_keys(keys):
+                with open(path + '.tmp', 'w') as f:
+                    json.dump({'keys': keys}, f)
+                os.replace(path + '.tmp', path)
+
+            write_keys([
+                {'name': 'team-a', 'sha256': hash_key('key-a'), 'rate_limit_per_minute': 2},
+                {'name': 'team-b', 'sha256': hash_key('key-b'), 'max_running_scripts': 1},
+                {'name': 'frozen', 'sha256': hash_key('key-z'), 'rate_limit_per_minute': 0,
+                 'max_running_scripts': 0},
+            ])
+            store = ApiKeyStore(path, default_key='env-key', reload_interval=0)
+            assert store.lookup('key-a').name == 'team-a'
+            assert store.lookup('env-key').name == 'default'
+            assert store.lookup('nope') is None
+            frozen = store.lookup('key-z')
+            assert (frozen.rate_limit_per_minute, frozen.max_running_scripts) == (0, 0)
+            assert store.lookup('key-a').max_running_scripts is None
+            assert 'key-a' not in open(path).read()
+            print("  ✓ Keys looked up by hash")
+
+            app = Flask('keys_test')
+
+            @app.route('/whoami')
+            def whoami():
+                return jsonify({'key': g.api_key.name})
+
+            RouteGuard(api_key_required=True, rate_limit_enabled=True, limiter=RateLimiter(100),
+                       trusted_proxies=[], key_store=store).install(app)
+            client = app.test_client()
+            codes = [client.get('/whoami', headers={'X-API-Key': 'key-a'}).status_code for _ in range(3)]
+            assert codes == [200, 200, 429], codes
+            assert client.get('/whoami', headers={'X-API-Key': 'key-b'}).json == {'key': 'team-b'}
+            assert client.get('/whoami', headers={'X-API-Key': 'key-z'}).status_code == 429
+            print("  ✓ Per-key rate limits, 0 allows no requests")
+
+            time.sleep(0.01)  # make sure the file's mtime changes
+            write_keys([{'name': 'team-c', 'sha256': hash_key('key-c')}])
+            assert client.get('/whoami', headers={'X-API-Key': 'key-c'}).json == {'key': 'team-c'}
+            assert client.get('/whoami', headers={'X-API-Key': 'key-b'}).status_code == 401
+            assert client.get('/whoami', headers={'X-API-Key': 'env-key'}).status_code == 200
+            with open(path, 'w') as f:
+                f.write('{broken')
+            assert client.get('/whoami', headers={'X-API-Key': 'key-c'}).status_code == 200
+            print("  ✓ Key file hot-reloaded, invalid file ignored")
+
+            scripts_dir = os.path.join(tmp, 'scripts')
+            os.makedirs(scripts_dir)
+            with open(os.path.join(scripts_dir, 'wait.sh'), 'w') as f:
+                f.write('sleep 2\n')
+            scripts = ScriptManager()
+            scripts.SCRIPTS_DIR = os.path.realpath(scripts_dir)
+            first = scripts.run_script('wait.sh', owner='team-b', max_running=1)
+            try:
+                scripts.run_script('wait.sh', owner='team-b', max_running=1)
+                assert False, "quota should be enforced"
+            except QuotaExceededError:
+                pass
+            other = scripts.run_script('wait.sh', owner='team-a', max_running=1)
+            for run_id in (first['id'], other['id']):
+                scripts.stop_script(run_id)
+            try:
+                scripts.run_script('wait.sh', owner='frozen', max_running=0)
+                assert False, "a quota of 0 should allow no scripts"
+            except QuotaExceededError:
+                pass
+            print("  ✓ Running script quota per key")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_scheduler():
+    """Test cron parsing, the timer heap and scheduled automations"""
+    print("\nTesting scheduler...")
+
+    try:
+        import threading
+        import time
+        from datetime import datetime, timedelta
+        from automations.base import BaseAutomation
+        from automation_manager import AutomationManager
+        from scheduler import CronExpression, HeapScheduler
+
+        start = datetime(2030, 1, 31, 23, 59)  # a Thursday
+        assert CronExpression('*/15 * * * *').next_after(start) == datetime(2030, 2, 1, 0, 0)
+        assert CronExpression('30 8 * * 1-5').next_after(start) == datetime(2030, 2, 1, 8, 30)
+        assert CronExpression('0 9 * * 0').next_after(start) == datetime(2030, 2, 3, 9, 0)
+        assert CronExpression('0 0 29 2 *').next_after(start) == datetime(2032, 2, 29, 0, 0)
+        assert CronExpression('0 12 13 * 5').next_after(start) == datetime(2030, 2, 1, 12, 0)
+        assert CronExpression('@monthly').next_after(start) == datetime(2030, 2, 1, 0, 0)
+        for bad in ('* * *', '61 * * * *', '*/0 * * * *', 'a b c d e'):
+            try:
+                CronExpression(bad)
+                assert False, f"{bad!r} should be rejected"
+            except ValueError:
+                pass
+        print("  ✓ Cron next-fire times")
+
+        heap = HeapScheduler()
+        fired = []
+        now = time.time()
+        heap.schedule('b', now + 0.2, lambda: fired.append('b'))
+        heap.schedule('a', now + 0.1, lambda: fired.append('a'))
+        heap.schedule('c', now + 0.15, lambda: fired.append('c'))
+        heap.cancel('c')
+        heap.schedule('a', now + 0.3, lambda: fired.append('a2'))
+        time.sleep(0.5)
+        assert fired == ['b', 'a2'], fired
+        assert heap.pending() == 0
+        print("  ✓ Heap fires in order, cancel and reschedule")
+
+        now = time.time()
+        heap.schedule('slow', now + 0.05, lambda: time.sleep(1))
+        heap.schedule('quick', now + 0.1, lambda: fired.append(time.time()))
+        time.sleep(0.4)
+        assert len(fired) == 3 and fired[-1] - now < 0.3, fired
+        print("  ✓ A slow callback does not hold up other jobs")
+
+        ran = threading.Event()
+
+        class QuickAutomation(BaseAutomation):
+            def get_name(self):
+                return "Quick"
+
+            def get_description(self):
+                return "Runs until stopped"
+
+            def get_config_schema(self):
+                return []
+
+            def run(self):
+                ran.set()
+                self.stop_flag.wait(30)
+
+        manager = AutomationManager(scheduler=heap)
+        manager.automation_classes['QuickAutomation'] = QuickAutomation
+        statuses = []
+        manager.set_status_callback(lambda status: statuses.append(status['status']))
+        automation_id = manager.create_automation('QuickAutomation')['id']
+
+        at = (datetime.now() + timedelta(seconds=0.3)).isoformat()
+        status = manager.schedule_automation(automation_id, {'at': at, 'duration': 1})
+        assert status['status'] == 'scheduled' and status['schedule']['at'] == at
+        assert ran.wait(5)
+        assert manager.get_status(automation_id)['status'] == 'running'
+        deadline = time.time() + 5
+        while manager.get_status(automation_id)['status'] == 'running' and time.time() < deadline:
+            time.sleep(0.05)
+        status = manager.get_status(automation_id)
+        assert status['status'] == 'stopped' and 'schedule' not in status, status
+        print("  ✓ One-shot run started on time and stopped after its duration")
+
+        ran.clear()
+        manager.schedule_automation(automation_id, {'cron': '0 3 * * *', 'duration': 1})
+        assert manager.get_status(automation_id)['schedule']['next_run'].endswith('T03:00:00')
+        manager._fire(automation_id)  # as if 03:00 had come
+        assert ran.wait(5)
+        deadline = time.time() + 5
+        while manager.get_status(automation_id)['status'] == 'running' and time.time() < deadline:
+            time.sleep(0.05)
+        assert manager.get_status(automation_id)['status'] == 'scheduled'
+        assert heap.pending() == 1
+        assert manager.unschedule_automation(automation_id)['status'] == 'stopped'
+        assert heap.pending() == 0
+        assert statuses[:3] == ['scheduled', 'running', 'stopped'], statuses
+        print("  ✓ Recurring run returns to SCHEDULED")
+
+        try:
+            manager.schedule_automation(automation_id, {'cron': '* * * * *', 'at': at})
+            assert False, "cron and at together should be rejected"
+        except ValueError:
+            pass
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_script_schedules():
+    """Test cron schedules for scripts: overlap policies, persistence, catch-up"""
+    print("\nTesting script schedules...")
+
+    try:
+        import json
+        import os
+        import tempfile
+        import time
+        from datetime import datetime, timedelta
+        from scheduler import HeapScheduler
+        from script_manager import ScriptManager
+
+        def wait_idle(manager, timeout=10):
+            deadline = time.time() + timeout
+            while manager.get_running_scripts() and time.time() < deadline:
+                time.sleep(0.05)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            scripts_dir = os.path.join(tmp, 'scripts')
+            os.makedirs(scripts_dir)
+            with open(os.path.join(scripts_dir, 'slow.sh'), 'w') as f:
+                f.write('sleep 0.5\n')
+            path = os.path.join(tmp, 'data', 'script_schedules.json')
+
+            class TempScriptManager(ScriptManager):
+                SCRIPTS_DIR = os.path.realpath(scripts_dir)
+
+            heap = HeapScheduler()
+            manager = TempScriptManager(scheduler=heap, schedules_path=path)
+            policies = {}
+            for overlap in ('skip', 'queue', 'kill'):
+                # Fired by hand below; yearly so the timer never fires during the test
+                policies[overlap] = manager.add_schedule('slow.sh', '0 0 1 1 *', overlap=overlap)['id']
+            assert heap.pending() == 3
+            assert datetime.fromisoformat(manager.list_schedules()[0]['next_run']) > datetime.now()
+
+            for overlap, schedule_id in policies.items():
+                manager._fire_schedule(schedule_id, datetime.now())
+                first = manager.schedules[schedule_id]['last_run_id']
+                time.sleep(0.2)  # let the first run's process start
+                manager._fire_schedule(schedule_id, datetime.now())
+                if overlap == 'kill':
+                    assert manager.get_script_status(first)['status'] == 'stopped'
+                wait_idle(manager)
+                schedule = manager.schedules[schedule_id]
+                expected = {'skip': (1, 1), 'queue': (2, 0), 'kill': (2, 0)}[overlap]
+                assert (schedule['runs'], schedule['skipped']) == expected, (overlap, schedule)
+            print("  ✓ Overlap policies skip, queue and kill")
+
+            frozen = manager.add_schedule('slow.sh', '0 0 1 1 *', owner='ops', max_running=0)['id']
+            manager._fire_schedule(frozen, datetime.now())
+            schedule = manager.schedules[frozen]
+            assert schedule['runs'] == 0 and 'Quota of 0' in schedule['last_error'], schedule
+            assert manager.get_running_scripts() == []
+            with open(path) as f:
+                assert next(s for s in json.load(f)['schedules'] if s['id'] == frozen)['max_running'] == 0
+            manager.remove_schedule(frozen)
+            print("  ✓ Scheduled runs count against the owner's quota")
+
+            manager.remove_schedule(policies['queue'])
+            manager.remove_schedule(policies['kill'])
+            catch_up = manager.add_schedule('slow.sh', '0 * * * *', catch_up=True)['id']
+            with open(path) as f:
+                stored = json.load(f)
+            assert len(stored['schedules']) == 2
+            for schedule in stored['schedules']:
+                schedule['last_run'] = (datetime.now() - timedelta(hours=3)).isoformat()
+            with open(path, 'w') as f:
+                json.dump(stored, f)
+
+            restarted = TempScriptManager(scheduler=HeapScheduler(), schedules_path=path)
+            assert restarted.schedules[catch_up]['runs'] == 1
+            assert restarted.schedules[policies['skip']]['runs'] == manager.schedules[policies['skip']]['runs']
+            assert len(restarted.get_running_scripts()) == 1
+            assert restarted.scheduler.pending() == 2
+            wait_idle(restarted)
+            print("  ✓ Persisted, missed runs caught up once after restart")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_forkserver():
+    """Test running .py scripts through the warm fork server"""
+    print("\nTesting fork server...")
+
+    try:
+        import os
+        import tempfile
+        import time
+        from forkserver import ForkServer
+        from script_manager import ScriptManager
+
+        if not ForkServer.supported():
+            print("  - Skipped: fork() or descriptor passing unavailable")
+            return True
+
+        def wait_done(manager, run_id, timeout=10):
+            deadline = time.time() + timeout
+            while manager.get_script_status(run_id)['status'] == 'running' and time.time() < deadline:
+                time.sleep(0.02)
+            return manager.get_script_status(run_id)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            scripts = {
+                'report.py': "import os, sys\nprint('email.mime.text' in sys.modules, os.getcwd())\n"
+                             "print('warn', file=sys.stderr)\nsys.exit(3)\n",
+                'crash.py': "raise RuntimeError('boom')\n",
+                'params.py': "import os, sys\nprint(sys.argv[1:], os.environ['GREETING'])\n",
+                'slow.py': "import time\ntime.sleep(30)\n",
+            }
+            for name, body in scripts.items():
+                with open(os.path.join(tmp, name), 'w') as f:
+                    f.write(body)
+
+            class TempScriptManager(ScriptManager):
+                SCRIPTS_DIR = os.path.realpath(tmp)
+
+            forkserver = ForkServer(preload=['email.mime.text'])
+            manager = TempScriptManager(forkserver=forkserver)
+            try:
+                status = wait_done(manager, manager.run_script('report.py')['id'])
+                assert status['output'] == f"True {os.path.realpath(tmp)}\n", status
+                assert status['error'] == 'warn\n'
+                assert status['return_code'] == 3 and status['status'] == 'failed'
+                print("  ✓ Script forked from warm interpreter (preloaded modules, cwd, exit code)")
+
+                run_id = manager.run_script('params.py', args=['a', 2], env={'GREETING': 'hi'})['id']
+                status = wait_done(manager, run_id)
+                assert status['output'] == "['a', '2'] hi\n", status
+                print("  ✓ Arguments and environment passed to forked script")
+
+                status = wait_done(manager, manager.run_script('crash.py')['id'])
+                assert status['return_code'] == 1
+                assert status['error'].startswith('Traceback') and 'RuntimeError: boom' in status['error']
+                assert 'forkserver' not in status['error']
+                print("  ✓ Uncaught exception reported like a cold run")
+
+                run_id = manager.run_script('slow.py')['id']
+                time.sleep(0.3)
+                manager.stop_script(run_id)
+                status = wait_done(manager, run_id)
+                assert status['status'] == 'stopped'
+                print("  ✓ Forked script stopped")
+
+                forkserver._process.kill()
+                forkserver._process.wait()
+                status = wait_done(manager, manager.run_script('report.py')['id'])
+                assert status['return_code'] == 3
+                print("  ✓ Fork server restarted after it died")
+            finally:
+                forkserver.stop()
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_script_batches():
+    """Test script arguments/environment and fan-out batches"""
+    print("\nTesting script batches...")
+
+    try:
+        import os
+        import tempfile
+        import time
+        import script_manager
+        from script_manager import ScriptManager, QuotaExceededError
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, 'echo.sh'), 'w') as f:
+                f.write('echo "$1 $GREETING"\nsleep 0.2\nexit "$2"\n')
+
+            class TempScriptManager(ScriptManager):
+                SCRIPTS_DIR = os.path.realpath(tmp)
+
+            manager = TempScriptManager()
+            for args, env in ((['x'] * 100, None), ('x', None), ([{'a': 1}], None),
+                              (None, {'LD_PRELOAD': '/tmp/x.so'}), (None, {'PATH': '/tmp'}),
+                              (None, {'1BAD': 'x'}), (['a\x00b'], None)):
+                try:
+                    manager.run_script('echo.sh', args=args, env=env)
+                    raise AssertionError(f"Accepted args={args!r} env={env!r}")
+                except ValueError:
+                    pass
+            print("  ✓ Invalid args and env rejected")
+
+            run_id = manager.run_script('echo.sh', args=['world', 0], env={'GREETING': 'hi'})['id']
+            while manager.get_script_status(run_id)['status'] == 'running':
+                time.sleep(0.02)
+            status = manager.get_script_status(run_id)
+            assert status['output'] == 'world hi\n' and status['return_code'] == 0
+            assert status['args'] == ['world', '0'] and status['env_keys'] == ['GREETING']
+            print("  ✓ Script run with args and env")
+
+            params = [{'args': [f'item{i}', i % 3], 'env': {'GREETING': 'hey'}} for i in range(6)]
+            started = time.time()
+            batch = manager.run_batch('echo.sh', params, concurrency=3)
+            assert batch['total'] == 6 and batch['status'] == 'running'
+            while manager.get_batch(batch['id'])['status'] == 'running':
+                time.sleep(0.02)
+            elapsed = time.time() - started
+            batch = manager.get_batch(batch['id'])
+            assert batch['status'] == 'failed'
+            assert (batch['finished'], batch['succeeded'], batch['failed']) == (6, 2, 4)
+            assert batch['exit_codes'] == {'0': 2, '1': 2, '2': 2}
+            assert [run['output'] for run in batch['runs']] == [f'item{i} hey\n' for i in range(6)]
+            # 6 runs of 0.2s, 3 at a time: ~2 rounds
+            assert 0.35 < elapsed < 1.2, elapsed
+            print("  ✓ Batch fanned out on a bounded pool and aggregated exit codes")
+
+            try:
+                manager.run_batch('echo.sh', [{'env': {'PATH': '/'}}])
+                raise AssertionError("Accepted invalid batch params")
+            except ValueError as e:
+                assert 'params[0]' in str(e)
+
+            batch = manager.run_batch('echo.sh', [{'args': ['a', 0]}] * 3, concurrency=4,
+                                      owner='team', max_running=1)
+            assert batch['concurrency'] == 1
+            try:
+                manager.run_script('echo.sh', owner='team', max_running=1)
+                time.sleep(0.05)
+                manager.run_batch('echo.sh', [{}], owner='team', max_running=1)
+                raise AssertionError("Quota not enforced")
+            except QuotaExceededError:
+                pass
+            manager.stop_batch(batch['id'])
+            while manager.get_batch(batch['id'])['status'] == 'running':
+                time.sleep(0.02)
+            batch = manager.get_batch(batch['id'])
+            assert batch['status'] == 'stopped' and batch['cancelled'] >= 1, batch
+            print("  ✓ Batch limited by owner quota and stopped")
+
+            batches = [manager.run_batch('echo.sh', [{'args': ['a', 0]}] * 3, concurrency=2,
+                                         owner='ops', max_running=2) for _ in range(2)]
+            most = 0
+            while any(manager.get_batch(b['id'])['status'] == 'running' for b in batches):
+                most = max(most, sum(1 for s in manager.get_running_scripts() if s['owner'] == 'ops'))
+                time.sleep(0.01)
+            assert most == 2, most
+            assert all(manager.get_batch(b['id'])['succeeded'] == 3 for b in batches)
+            print("  ✓ Concurrent batches share the owner's quota, runs wait for a slot")
+
+            limit, script_manager.MAX_FINISHED_RUNS = script_manager.MAX_FINISHED_RUNS, 2
+            try:
+                small = TempScriptManager()
+                batch = small.run_batch('echo.sh', [{'args': ['a', 0]}] * 5, concurrency=5)
+                while small.get_batch(batch['id'])['status'] == 'running':
+                    time.sleep(0.02)
+                runs = small.get_batch(batch['id'])['runs']
+                assert len(small.running_scripts) == 2
+                assert sum(1 for run in runs if run['id'] in small.running_scripts) == 2
+            finally:
+                script_manager.MAX_FINISHED_RUNS = limit
+            print("  ✓ Only the latest finished runs are kept")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_script_limits():
+    """Test per-script resource limits, priority and resource usage"""
+    print("\nTesting script resource limits...")
+
+    try:
+        import os
+        import tempfile
+        import time
+        from forkserver import ForkServer
+        from script_directives import ResourceLimits, read_directives
+        from script_manager import ScriptManager
+
+        defaults = ResourceLimits.parse('cpu=60 memory=1G nice=2 io=best-effort:5')
+        script = ResourceLimits.parse({'cpu': '2m', 'memory': '2G', 'nice': '10', 'io': 'idle', 'files': '64'})
+        effective = defaults.tighten(script).to_dict()
+        assert effective == {'cpu_seconds': 60, 'memory_bytes': 1024 ** 3, 'open_files': 64,
+                             'nice': 10, 'io_class': 3, 'io_level': 0}, effective
+        for bad in ('cpu=fast', 'memory=1T', 'nice=40', 'io=realtime', 'swap=1'):
+            try:
+                ResourceLimits.parse(bad)
+                raise AssertionError(f"Accepted {bad}")
+            except ValueError:
+                pass
+        print("  ✓ Limits parsed; scripts can only tighten server defaults")
+
+        if not hasattr(os, 'wait4'):
+            print("  - Skipped runs: wait4() unavailable")
+            return True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            scripts = {
+                'burn.py': "#!/usr/bin/env python3\n# @limits cpu=1 nice=7 files=32\n"
+                           "import os, resource\n"
+                           "print(os.getpriority(os.PRIO_PROCESS, 0),\n"
+                           "      resource.getrlimit(resource.RLIMIT_NOFILE)[0], flush=True)\n"
+                           "while True:\n    pass\n",
+                'bad.sh': "# @limits cpu=soon\necho never\n",
+                'late.sh': "echo hi\n# @limits cpu=1\n",
+            }
+            for name, body in scripts.items():
+                with open(os.path.join(tmp, name), 'w') as f:
+                    f.write(body)
+            assert read_directives(os.path.join(tmp, 'late.sh')) == {}
+
+            class TempScriptManager(ScriptManager):
+                SCRIPTS_DIR = os.path.realpath(tmp)
+
+            launchers = [None] + ([ForkServer()] if ForkServer.supported() else [])
+            for forkserver in launchers:
+                manager = TempScriptManager(forkserver=forkserver, limits=ResourceLimits.parse('cpu=30'))
+                try:
+                    run_id = manager.run_script('burn.py')['id']
+                    deadline = time.time() + 15
+                    while manager.get_script_status(run_id)['status'] == 'running' and time.time() < deadline:
+                        time.sleep(0.05)
+                    status = manager.get_script_status(run_id)
+                    assert status['status'] == 'failed' and 'CPU time limit of 1s exceeded' in status['error'], status
+                    assert status['output'] == '7 32\n', status['output']
+                    assert status['limits'] == {'cpu_seconds': 1, 'open_files': 32, 'nice': 7}
+                    assert status['resources']['user_time'] + status['resources']['system_time'] >= 0.9
+                    assert status['resources']['max_rss_kb'] > 0
+                finally:
+                    if forkserver is not None:
+                        forkserver.stop()
+            print(f"  ✓ CPU limit, nice and open files enforced; rusage recorded ({len(launchers)} launcher(s))")
+
+            # Limits that cannot be set fail the run before the script starts
+            with open(os.path.join(tmp, 'hello.sh'), 'w') as f:
+                f.write("echo started\n")
+            launchers = [None] + ([ForkServer()] if ForkServer.supported() else [])
+            for forkserver in launchers:
+                manager = TempScriptManager(forkserver=forkserver, limits=ResourceLimits(open_files=-5))
+                try:
+                    for name in ('hello.sh', 'burn.py'):
+                        run_id = manager.run_script(name)['id']
+                        deadline = time.time() + 15
+                        while manager.get_script_status(run_id)['status'] == 'running' and time.time() < deadline:
+                            time.sleep(0.05)
+                        status = manager.get_script_status(run_id)
+                        assert status['status'] == 'failed' and status['return_code'] == 126, status
+                        assert 'Could not apply resource limits' in status['error'], status
+                        assert status['output'] == '', status['output']
+                finally:
+                    if forkserver is not None:
+                        forkserver.stop()
+            print("  ✓ Run fails when its limits cannot be applied")
+
+            try:
+                manager.run_script('bad.sh')
+                raise AssertionError("Accepted invalid @limits")
+            except ValueError as e:
+                assert 'bad.sh' in str(e)
+            print("  ✓ Invalid @limits directive rejected")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_script_cache():
+    """Test result memoization of @cache scripts"""
+    print("\nTesting script result cache...")
+
+    try:
+        import os
+        import tempfile
+        import time
+        from script_cache import ScriptResultCache, cache_key
+        from script_manager import ScriptManager
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = os.path.join(tmp, 'cache')
+            cache = ScriptResultCache(cache_dir, max_bytes=700)
+            keys = [cache_key(b'echo', [str(i)], {}) for i in range(4)]
+            assert cache_key(b'echo', ['1'], {}) != cache_key(b'echo ', ['1'], {})
+            for key in keys[:3]:
+                cache.put(key, {'output': 'x' * 100, 'error': '', 'return_code': 0}, ttl=60)
+                time.sleep(0.01)
+            assert cache.get(keys[0]) is not None  # now most recently used
+            cache.put(keys[3], {'output': 'x' * 100, 'error': '', 'return_code': 0}, ttl=60)
+            assert cache.get(keys[1]) is None and cache.get(keys[0]) is not None
+            assert cache.stats()['bytes'] <= 700
+            cache.put(keys[2], {'output': '', 'error': '', 'return_code': 0}, ttl=0)
+            assert cache.get(keys[2]) is None
+            reloaded = ScriptResultCache(cache_dir, max_bytes=700)
+            assert reloaded.get(keys[0]) is not None and reloaded.get(keys[3]) is not None
+            print("  ✓ LRU eviction by size, TTL expiry, index rebuilt from disk")
+
+            scripts_dir = os.path.join(tmp, 'scripts')
+            os.makedirs(scripts_dir)
+            report = os.path.join(scripts_dir, 'report.sh')
+            with open(report, 'w') as f:
+                f.write('# @cache ttl=60\necho run >> runs.log\necho "report $1"\n')
+            with open(os.path.join(scripts_dir, 'flaky.sh'), 'w') as f:
+                f.write('# @cache ttl=60\necho run >> runs.log\nexit 1\n')
+
+            class TempScriptManager(ScriptManager):
+                SCRIPTS_DIR = os.path.realpath(scripts_dir)
+
+            manager = TempScriptManager(cache=ScriptResultCache(os.path.join(tmp, 'results')))
+
+            def run(filename, **kwargs):
+                result = manager.run_script(filename, **kwargs)
+                while manager.get_script_status(result['id'])['status'] == 'running':
+                    time.sleep(0.02)
+                return result, manager.get_script_status(result['id'])
+
+            def runs():
+                with open(os.path.join(scripts_dir, 'runs.log')) as f:
+                    return len(f.readlines())
+
+            run('report.sh', args=['a'])
+            result, status = run('report.sh', args=['a'])
+            assert result['cached'] and result['output'] == 'report a\n' and runs() == 1
+            assert status['status'] == 'completed' and status['cache']['hit']
+            run('report.sh', args=['b'])
+            assert runs() == 2
+            result, _ = run('report.sh', args=['a'], use_cache=False)
+            assert 'cached' not in result and runs() == 3
+            print("  ✓ Repeated runs served from cache, keyed by parameters")
+
+            with open(report, 'a') as f:
+                f.write('echo changed\n')
+            result, status = run('report.sh', args=['a'])
+            assert 'cached' not in result and status['output'] == 'report a\nchanged\n' and runs() == 4
+            run('flaky.sh')
+            run('flaky.sh')
+            assert runs() == 6
+            batch = manager.run_batch('report.sh', [{'args': ['a']}, {'args': ['c']}])
+            while manager.get_batch(batch['id'])['status'] == 'running':
+                time.sleep(0.02)
+            assert [r['cached'] for r in manager.get_batch(batch['id'])['runs']] == [True, False]
+            print("  ✓ Edited scripts and failed runs are not served from cache")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_hooks():
+    """Test the event bus and webhook delivery"""
+    print("\nTesting webhooks and event bus...")
+
+    try:
+        import json
+        import os
+        import tempfile
+        import threading
+        import time
+        from api_keys import ApiKeyStore, hash_key
+        from events import EventBus
+        from hooks import HookRegistry
+        from script_manager import ScriptManager
+
+        bus = EventBus()
+        release = threading.Event()
+        seen = []
+        bus.subscribe('hook.*', lambda event: seen.append(event.type))
+        bus.subscribe('hook.slow', lambda event: release.wait(5), queue_size=1, name='slow')
+        results = [bus.publish('hook.slow') for _ in range(4)]
+        bus.publish('other.event')
+        # One event is being handled, one waits in the queue, the rest are dropped
+        assert sum(r['dropped'] for r in results) >= 2
+        assert all(r['queued'] >= 1 for r in results)
+        release.set()
+        deadline = time.time() + 5
+        while len(seen) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        assert seen == ['hook.slow'] * 4
+        slow = next(s for s in bus.stats()['subscriptions'] if s['name'] == 'slow')
+        assert slow['dropped'] >= 2
+        bus.shutdown()
+        print("  ✓ Bounded per-subscriber queues drop instead of blocking publishers")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            scripts_dir = os.path.join(tmp, 'scripts')
+            os.makedirs(scripts_dir)
+            with open(os.path.join(scripts_dir, 'deploy.sh'), 'w') as f:
+                f.write('cat "$HOOK_PAYLOAD_FILE"; echo " $HOOK_NAME $1"\n')
+
+            class TempScriptManager(ScriptManager):
+                SCRIPTS_DIR = os.path.realpath(scripts_dir)
+
+            class FakeAutomations:
+                def __init__(self):
+                    self.calls = []
+
+                def get_automation(self, automation_id):
+                    if automation_id != 'auto-1':
+                        raise ValueError("Automation not found")
+
+                def start_automation(self, automation_id, config):
+                    self.calls.append(('start', automation_id, config))
+
+                def stop_automation(self, automation_id):
+                    self.calls.append(('stop', automation_id))
+
+            scripts = TempScriptManager()
+            automations = FakeAutomations()
+            path = os.path.join(tmp, 'hooks.json')
+            bus = EventBus()
+            registry = HookRegistry(path, automations, scripts, bus=bus)
+
+            deploy = {'script': 'deploy.sh', 'args': ['prod']}
+            hook, token = registry.define('deploy', deploy, owner='ops')
+            assert token and 'token_sha256' not in hook
+            _, same = registry.define('deploy', deploy, owner='ops')
+            assert same is None and registry.authenticate('deploy', token)
+            assert not registry.authenticate('deploy', 'wrong') and not registry.authenticate('nope', token)
+            _, start_token = registry.define('nightly', {'automation': 'auto-1', 'config': {'a': 1}})
+            for bad in ({'script': 'deploy.sh', 'automation': 'auto-1'}, {'automation': 'auto-1', 'action': 'pause'}):
+                try:
+                    registry.define('bad', bad)
+                    assert False, "invalid hook accepted"
+                except ValueError:
+                    pass
+            try:
+                registry.define('bad', {'script': 'missing.sh'})
+                assert False, "missing script accepted"
+            except FileNotFoundError:
+                pass
+            print("  ✓ Hook definitions validated, tokens issued once and checked")
+
+            result = registry.receive('deploy', {'ref': 'main'})
+            registry.receive('nightly', {})
+            assert result['queued'] == 1 and result['dropped'] == 0
+            deadline = time.time() + 5
+            while time.time() < deadline and not (
+                    automations.calls and scripts.running_scripts
+                    and all(e['status'] != 'running' for e in scripts.running_scripts.values())):
+                time.sleep(0.02)
+            execution = next(iter(scripts.running_scripts.values()))
+            assert execution['status'] == 'completed', execution
+            assert execution['output'] == json.dumps({'ref': 'main'}) + ' deploy prod\n'
+            assert execution['owner'] == 'ops'
+            assert automations.calls == [('start', 'auto-1', {'a': 1})]
+            while os.listdir(registry.payload_dir) and time.time() < deadline:
+                time.sleep(0.02)  # removed by on_finish, just after the status flips
+            assert os.listdir(registry.payload_dir) == []
+            print("  ✓ Calls trigger scripts with the payload file and start automations")
+
+            bus.shutdown()
+            assert oct(os.stat(path).st_mode & 0o777) == '0o600'
+            reloaded = HookRegistry(path, automations, scripts, bus=EventBus())
+            assert reloaded.authenticate('nightly', start_token)
+            assert [h['received'] for h in reloaded.list_hooks()] == [0, 0]
+            assert reloaded.hooks['deploy']['owner'] == 'ops'
+            reloaded.remove('nightly')
+            assert [h['name'] for h in reloaded.list_hooks()] == ['deploy']
+            print("  ✓ Hooks persisted without plaintext tokens")
+
+            reloaded.bus.shutdown()
+
+            keys_path = os.path.join(tmp, 'api_keys.json')
+
+            def set_ops_quota(quota):
+                keys = [{'name': 'ops', 'sha256': hash_key('key-ops'), 'max_running_scripts': quota}]
+                with open(keys_path, 'w') as f:
+                    json.dump({'keys': keys if quota is not None else []}, f)
+
+            set_ops_quota(0)
+            store = ApiKeyStore(keys_path, reload_interval=0)
+            quota_bus = EventBus()
+            limited = HookRegistry(path, automations, scripts, bus=quota_bus, key_store=store)
+            limited.define('frozen', {'script': 'deploy.sh'}, owner='ops')
+
+            def deliver(hook):
+                limited.hooks[hook]['last_error'] = ''
+                triggered = limited.hooks[hook]['triggered']
+                limited.receive(hook, {})
+                deadline = time.time() + 5
+                while time.time() < deadline and limited.hooks[hook]['last_error'] == '' and \
+                        limited.hooks[hook]['triggered'] == triggered:
+                    time.sleep(0.02)
+                return limited.hooks[hook]['last_error']
+
+            assert 'Quota of 0' in deliver('frozen') and len(scripts.running_scripts) == 1
+            set_ops_quota(10)
+            assert deliver('frozen') is None and len(scripts.running_scripts) == 2
+            set_ops_quota(None)
+            assert 'no longer exists' in deliver('frozen')
+            quota_bus.shutdown()
+            print("  ✓ Hook scripts run under the defining key's current quota")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_rules():
+    """Test typed events and rules chaining automations, scripts and containers"""
+    print("\nTesting event rules...")
+
+    try:
+        import json
+        import os
+        import tempfile
+        import time
+        from api_keys import ApiKeyStore, hash_key
+        from automation_manager import AutomationManager
+        from automations.base import BaseAutomation
+        from events import EventBus, KEYWORD_MATCH, CONTAINER_DIED
+        from rules import RuleEngine, MAX_CHAIN_DEPTH
+        from script_manager import ScriptManager
+
+        def wait_for(condition, timeout=10):
+            deadline = time.time() + timeout
+            while not condition() and time.time() < deadline:
+                time.sleep(0.02)
+            return condition()
+
+        class KeywordAutomation(BaseAutomation):
+            def get_name(self):
+                return "Keyword"
+
+            def get_description(self):
+                return "Emits one keyword match"
+
+            def get_config_schema(self):
+                return []
+
+            def run(self):
+                self.emit(KEYWORD_MATCH, url='http://news', keywords=['outage', 'db'])
+
+        class FakeNotifier:
+            channels = ['console']
+
+            def __init__(self):
+                self.messages = []
+
+            def notify(self, message, method='console', source=None):
+                self.messages.append((message, source))
+                return True
+
+        class FakeDocker:
+            def __init__(self):
+                self.restarted = []
+
+            def restart_container(self, container_id):
+                self.restarted.append(container_id)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            scripts_dir = os.path.join(tmp, 'scripts')
+            os.makedirs(scripts_dir)
+            for name, body in (('first.sh', 'echo first'), ('second.sh', 'echo "after $1 $EVENT_TYPE"'),
+                               ('loop.sh', 'echo loop >> loops.log')):
+                with open(os.path.join(scripts_dir, name), 'w') as f:
+                    f.write(body + '\n')
+
+            class TempScriptManager(ScriptManager):
+                SCRIPTS_DIR = os.path.realpath(scripts_dir)
+
+            bus = EventBus()
+            seen = []
+            bus.subscribe('*', lambda event: seen.append((event.type, event.payload)), name='collector')
+            scripts = TempScriptManager(bus=bus)
+            manager = AutomationManager(bus=bus)
+            manager.automation_classes['KeywordAutomation'] = KeywordAutomation
+            automation_id = manager.create_automation('KeywordAutomation')['id']
+            notifier = FakeNotifier()
+            docker = FakeDocker()
+            path = os.path.join(tmp, 'rules.json')
+            engine = RuleEngine(path, manager, scripts, docker, bus=bus, notifier=notifier)
+
+            for bad in ({'on': 'automation.exploded', 'do': {'action': 'notify', 'message': 'x'}},
+                        {'on': 'script.finished', 'when': {'colour': 'red'},
+                         'do': {'action': 'notify', 'message': 'x'}},
+                        {'on': 'container.died', 'do': {'action': 'restart_container', 'container': 'a;rm'}},
+                        {'on': 'container.died', 'do': {'action': 'reboot'}}):
+                try:
+                    engine.define('bad', bad)
+                    assert False, f"invalid rule accepted: {bad}"
+                except ValueError:
+                    pass
+            print("  ✓ Rules validated against event types and their fields")
+
+            engine.define('page', {'on': 'automation.keyword_match', 'when': {'keywords': 'outage'},
+                                   'do': {'action': 'notify', 'message': '$keywords at $url'}})
+            engine.define('ignored', {'on': 'automation.keyword_match', 'when': {'keywords': ['fire', 'flood']},
+                                      'do': {'action': 'notify', 'message': 'never'}})
+            engine.define('revive', {'on': 'container.died', 'when': {'exit_code': 137},
+                                     'do': {'action': 'restart_container', 'container': '$container_id'}})
+            manager.start_automation(automation_id, {})
+            died = {'container_id': 'abc123', 'name': 'web', 'image': 'nginx', 'exit_code': 137}
+            bus.publish(CONTAINER_DIED, died)
+            bus.publish(CONTAINER_DIED, {**died, 'container_id': 'def456', 'name': 'job', 'exit_code': 0})
+            assert wait_for(lambda: notifier.messages and docker.restarted)
+            assert notifier.messages == [('outage, db at http://news', 'rule:page')]
+            assert docker.restarted == ['abc123']
+            statuses = ['running', 'stopped']
+            assert wait_for(lambda: [p['status'] for t, p in seen if t == 'automation.status'] == statuses)
+            print("  ✓ Keyword matches, status changes and container deaths trigger actions")
+
+            engine.define('chain', {'on': 'script.finished', 'when': {'filename': 'first.sh', 'status': 'completed'},
+                                    'do': {'action': 'run_script', 'script': 'second.sh', 'args': ['$filename']}},
+                          owner='ops')
+            scripts.run_script('first.sh')
+            assert wait_for(lambda: any(p['filename'] == 'second.sh' for t, p in seen if t == 'script.finished'))
+            second = next(e for e in scripts.running_scripts.values() if e['filename'] == 'second.sh')
+            assert second['output'] == 'after first.sh script.finished\n'
+            assert second['trigger']['rule'] == 'chain' and second['trigger']['depth'] == 1
+            assert second['owner'] == 'ops'
+
+            engine.define('loop', {'on': 'script.finished', 'when': {'filename': 'loop.sh'}, 'cooldown': 0,
+                                   'do': {'action': 'run_script', 'script': 'loop.sh'}})
+            scripts.run_script('loop.sh')
+
+            def loop_rule():
+                return next(r for r in engine.list_rules() if r['name'] == 'loop')
+
+            assert wait_for(lambda: loop_rule()['last_error'] is not None)
+            with open(os.path.join(scripts_dir, 'loops.log')) as f:
+                assert len(f.readlines()) == MAX_CHAIN_DEPTH + 1
+            assert loop_rule()['fired'] == MAX_CHAIN_DEPTH
+            print("  ✓ Scripts chained on script.finished, runaway chains stopped")
+
+            engine.shutdown()
+            reloaded = RuleEngine(path, manager, scripts, docker, bus=EventBus(), notifier=notifier)
+            assert [r['name'] for r in reloaded.list_rules()] == ['chain', 'ignored', 'loop', 'page', 'revive']
+            chain = next(r for r in reloaded.list_rules() if r['name'] == 'chain')
+            assert chain['owner'] == 'ops' and 'max_running' not in chain
+            reloaded.remove('loop')
+            assert 'loop' not in [r['name'] for r in reloaded.list_rules()]
+            reloaded.shutdown()
+            print("  ✓ Rules persisted and removed")
+
+            keys_path = os.path.join(tmp, 'api_keys.json')
+            with open(keys_path, 'w') as f:
+                json.dump({'keys': [{'name': 'ops', 'sha256': hash_key('key-ops'), 'max_running_scripts': 0}]}, f)
+            store = ApiKeyStore(keys_path, reload_interval=0)
+            engine = RuleEngine(None, manager, scripts, docker, bus=bus, key_store=store)
+            engine.define('frozen', {'on': 'container.died', 'cooldown': 0,
+                                     'do': {'action': 'run_script', 'script': 'first.sh'}}, owner='ops')
+            runs = len(scripts.running_scripts)
+            bus.publish(CONTAINER_DIED, died)
+            assert wait_for(lambda: engine.list_rules()[0]['last_error'] is not None)
+            assert 'Quota of 0' in engine.list_rules()[0]['last_error'] and len(scripts.running_scripts) == runs
+            with open(keys_path, 'w') as f:
+                json.dump({'keys': []}, f)
+            bus.publish(CONTAINER_DIED, died)
+            assert wait_for(lambda: 'no longer exists' in engine.list_rules()[0]['last_error'])
+            assert len(scripts.running_scripts) == runs
+            engine.shutdown()
+            bus.shutdown()
+            print("  ✓ Rule scripts run under the defining key's current quota")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_news_items():
+    """Test item extraction and the bounded seen-set of the news monitor"""
+    print("\nTesting news item detection...")
+
+    try:
+        import tempfile
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from automations.news_items import BloomFilter, SeenItemStore, SeenItems, extract_items, seen_items
+        from automations.news_monitor import NewsMonitorAutomation
+
+        rss = b"""<?xml version="1.0"?><rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">
+            <channel><title>Feed</title>
+            <item><title>Outage in region A</title><link>/a</link><guid>id-a</guid>
+              <content:encoded>Databases down</content:encoded></item>
+            <item><title>Release 2.0</title><link>https://news.test/b</link></item>
+            </channel></rss>"""
+        items = extract_items(rss, 'application/rss+xml', 'https://news.test/feed')
+        assert [(i.id, i.title, i.link) for i in items] == [
+            ('id-a', 'Outage in region A', 'https://news.test/a'),
+            ('https://news.test/b', 'Release 2.0', 'https://news.test/b')]
+        assert items[0].summary == 'Databases down'
+        atom = b"""<feed xmlns="http://www.w3.org/2005/Atom"><entry><id>tag:1</id><title>Atom  entry</title>
+            <link rel="self" href="/self"/><link href="/entry1"/><summary>S</summary></entry></feed>"""
+        items = extract_items(atom, 'text/xml', 'https://news.test/')
+        assert [(i.id, i.title, i.link) for i in items] == [('tag:1', 'Atom entry', 'https://news.test/entry1')]
+        html = b"""<html><script>var a = "<h2><a href='/x'>fake</a></h2>";</script>
+            <div class="ad"><a href="/ad?rotation=5">Buy now</a> 12:03:44</div>
+            <h2><a href="/story-1#top">First story</a></h2><h3><a href="/story-2"><span>Second</span> story</a></h3>
+            <h2><a href="/story-1">First story</a></h2></html>"""
+        items = extract_items(html, 'text/html; charset=utf-8', 'https://news.test/')
+        assert [(i.id, i.title) for i in items] == [
+            ('https://news.test/story-1', 'First story'), ('https://news.test/story-2', 'Second story')]
+        assert extract_items(b'<rss><item><title>broken', 'application/rss+xml') == []
+        print("  ✓ Items extracted from RSS, Atom and HTML headlines")
+
+        bloom = BloomFilter(1000, 0.01)
+        keys = [SeenItems._digest(f"key-{i}") for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        assert all(key in bloom for key in keys)
+        false_positives = sum(SeenItems._digest(f"other-{i}") in bloom for i in range(10000))
+        assert false_positives < 300, false_positives
+        seen = SeenItems(recent_size=10, capacity=50)
+        assert seen.filter_new(extract_items(rss, 'application/rss+xml')) != []
+        assert all(seen.add(f"item-{i}") for i in range(200))
+        assert not seen.add('item-120') and not seen.add('item-150') and not seen.add('item-199')
+        assert seen.add('item-5')  # two generations ago: forgotten
+        assert seen.add('item-new')
+        restored = SeenItems(recent_size=10, capacity=50)
+        restored.load(seen.to_bytes())
+        assert not restored.add('item-150') and not restored.add('item-new') and restored.add('item-201')
+        assert len(seen.to_bytes()) == len(SeenItems(recent_size=10, capacity=50).to_bytes()) + 16 * 10
+        print("  ✓ Seen-set bounded, no false negatives, survives a save/load")
+
+        feed = {'items': ['<item><title>Old news</title><guid>1</guid></item>']}
+
+        class FakeFeed(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = ('<rss><channel>' + ''.join(feed['items']) + '</channel></rss>').encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/rss+xml')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeFeed)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/feed"
+        with tempfile.TemporaryDirectory() as tmp:
+            seen_items.configure(tmp)
+            try:
+                monitor = NewsMonitorAutomation()
+                notifications = []
+                monitor.send_notification = lambda message, method: notifications.append(message)
+                monitor.start({'url': url, 'keywords': 'outage', 'check_interval': '1', 'adaptive_interval': 'no'})
+                time.sleep(0.5)
+                feed['items'] = ['<item><title>Weather report</title><guid>2</guid></item>',
+                                 '<item><title>Power outage downtown</title><guid>3</guid></item>'] + feed['items']
+                deadline = time.time() + 5
+                while not notifications and time.time() < deadline:
+                    time.sleep(0.05)
+                feed['items'] = feed['items'][1:]  # dropping an item is not news
+                time.sleep(1.3)
+                monitor.stop()
+                assert notifications == ['Keywords found: outage - Power outage downtown'], notifications
+                store = SeenItemStore(tmp)
+                assert not store.get(f"{url}\noutage").add('3')
+                print("  ✓ Monitor reports only new items, seen-set saved per URL")
+            finally:
+                seen_items.configure(None)
+                server.shutdown()
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_snapshots():
+    """Test the compressed page version history"""
+    print("\nTesting page snapshots...")
+
+    try:
+        import json
+        import os
+        import random
+        import tempfile
+        import time
+        from automations.snapshots import SnapshotStore, apply_delta, encode_delta, page_key
+
+        rng = random.Random(7)
+        words = [''.join(rng.choice('abcdefghijklmnop') for _ in range(7)) for _ in range(2000)]
+        headlines = [' '.join(rng.sample(words, 8)) for _ in range(400)]
+
+        def page(version, first=0):
+            items = ''.join(f'<li><a href="/s{i}">{headlines[i]}</a></li>' for i in range(first, first + 300))
+            return (f'<html><div class="ad">ad {version}</div><time>{version * 37}</time><ul>{items}</ul></html>'
+                    ).encode()
+
+        base = page(0)
+        for new in (page(1), page(1, first=3), b'', base + b'\ntrailer', b'<x>' * 5000):
+            assert apply_delta(base, encode_delta(base, new)) == new
+        print("  ✓ Deltas rebuild the exact page")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp, max_versions=10, max_age_days=30)
+            url = 'https://news.test/'
+            key = page_key(url)
+            first = store.record(url, page(0), 'text/html')
+            assert first['keyframe'] == first['id'] and store.record(url, page(0)) is None
+            for version in range(1, 8):
+                snapshot = store.record(url, page(version), 'text/html')
+                assert snapshot['keyframe'] == first['id']
+                assert snapshot['stored'] < len(page(version)) * 0.02, snapshot
+            moved = store.record(url, page(8, first=5))
+            assert moved['keyframe'] == first['id'] and moved['stored'] < len(page(8, first=5)) * 0.05
+            assert store.get(key, moved['id']) == page(8, first=5)
+            assert store.get(key, 3) == page(2)
+            diff = store.diff(key, 2, 3)
+            assert '-ad 1</div>' in diff and '+ad 2</div>' in diff and 'href="/s10"' not in diff
+            print("  ✓ Versions stored as small deltas, fetched and diffed")
+
+            unrelated = b'<feed>' + os.urandom(20000).hex().encode() + b'</feed>'
+            assert store.record(url, unrelated)['keyframe'] == 10  # delta too large: new keyframe
+            for version in range(20, 35):
+                store.record(url, page(version))
+            versions = store.list_versions(key)['versions']
+            assert len(versions) == 10 and versions[-1]['id'] == 25
+            needed = {f"k{v['keyframe']}.z" for v in versions}
+            needed |= {f"d{v['id']}.z" for v in versions if v['keyframe'] != v['id']}
+            assert set(os.listdir(os.path.join(tmp, key))) == needed | {'index.json'}
+            assert all(store.get(key, v['id']) for v in versions)
+            try:
+                store.get(key, 1)
+                assert False, "pruned version returned"
+            except ValueError:
+                pass
+
+            store.max_age_days = 1
+            index_path = os.path.join(tmp, key, 'index.json')
+            old = store.list_versions(key)['versions']
+            for v in old[:-1]:
+                v['time'] = time.time() - 3 * 86400
+            with open(index_path) as f:
+                index = json.load(f)
+            index['versions'] = old
+            with open(index_path, 'w') as f:
+                json.dump(index, f)
+            store.record(url, page(99))
+            assert [v['id'] for v in store.list_versions(key)['versions']] == [old[-1]['id'], old[-1]['id'] + 1]
+            pages = store.list_pages()
+            assert [p['url'] for p in pages] == [url] and pages[0]['stored_bytes'] < pages[0]['page_bytes']
+            for bad in ('../etc', 'f' * 32):
+                try:
+                    store.list_versions(bad)
+                    assert False, "unknown history returned"
+                except ValueError:
+                    pass
+            print("  ✓ Retention by count and age removes unneeded files")
+
+        return True
+    except Exception as e:
+        print(f"  ✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def main():
+    print("=" * 60)
+    print("Server Component & Security Test")
+    print("=" * 60)
+    print()
+
+    all_passed = True
+
+    # Test imports
+    if not test_imports():
+        all_passed = False
+        print("\n⚠ Install missing dependencies:")
+        print("  pip install -r requirements.txt")
+
+    # Test automation classes
+    if not test_automation_classes():
+        all_passed = False
+
+    # Test automation manager
+    if not test_automation_manager():
+        all_passed = False
+
+    # Test security config
+    if not test_security_config():
+        all_passed = False
+
+    # Test script manager security
+    if not test_script_manager_security():
+        all_passed = False
+
+    # Test automation metrics
+    if not test_automation_metrics():
+        all_passed = False
+
+    # Test metrics registry
+    if not test_metrics_registry():
+        all_passed = False
+
+    # Test request profiler
+    if not test_request_profiler():
+        all_passed = False
+
+    # Test benchmark helpers
+    if not test_benchmark_helpers():
+        all_passed = False
+
+    # Test Socket.IO message queue
+    if not test_socketio_queue():
+        all_passed = False
+
+    # Test cluster coordinator
+    if not test_cluster_coordinator():
+        all_passed = False
+
+    # Test process pool automations
+    if not test_process_automation():
+        all_passed = False
+
+    # Test polling schedule
+    if not test_polling_schedule():
+        all_passed = False
+
+    # Test ticket sniping
+    if not test_ticket_sniping():
+        all_passed = False
+
+    # Test ticket providers
+    if not test_ticket_providers():
+        all_passed = False
+
+    # Test notification dispatch
+    if not test_notification_dispatch():
+        all_passed = False
+
+    # Test automation logs
+    if not test_automation_logs():
+        all_passed = False
+
+    # Test audit log
+    if not test_audit_log():
+        all_passed = False
+
+    # Test route guard
+    if not test_route_guard():
+        all_passed = False
+
+    # Test API keys
+    if not test_api_keys():
+        all_passed = False
+
+    # Test scheduler
+    if not test_scheduler():
+        all_passed = False
+
+    # Test script schedules
+    if not test_script_schedules():
+        all_passed = False
+
+    # Test fork server
+    if not test_forkserver():
+        all_passed = False
+
+    # Test script batches
+    if not test_script_batches():
+        all_passed = False
+
+    # Test script resource limits
+    if not test_script_limits():
+        all_passed = False
+
+    # Test script result cache
+    if not test_script_cache():
+        all_passed = False
+
+    # Test webhooks
+    if not test_hooks():
+        all_passed = False
+
+    # Test event rules
+    if not test_rules():
+        all_passed = False
+
+    # Test news item detection
+    if not test_news_items():
+        all_passed = False
+
+    # Test page snapshots
+    if not test_snapshots():
         all_passed = False
 
     print()